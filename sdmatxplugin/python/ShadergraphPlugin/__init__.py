@@ -24,6 +24,7 @@ class PollState:
 
 
 _pollState = PollState()
+_pollHandle = None
 
 
 def initializeShaderGraph():
@@ -37,6 +38,7 @@ def initializeShaderGraph():
         from . import materialxToolbar
         import functools
         global _graphViewCreatedCallbackID
+        global _pollHandle
         logger.info("Registering materialx toolbar")
         _graphViewCreatedCallbackID = uiMgr.registerGraphViewCreatedCallback(
             functools.partial(
@@ -60,3 +62,4 @@ def uninitializeShaderGraph():
         logger.info("Clearing materialx toolbar")
         uiMgr.unregisterCallback(_graphViewCreatedCallbackID)
         uninstall_export_poll(_pollHandle)
+        _pollHandle = None
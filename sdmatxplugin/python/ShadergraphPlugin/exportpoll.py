@@ -10,6 +10,7 @@
 
 import enum
 import logging
+import threading
 from functools import partial
 from subprocess import CalledProcessError
 
@@ -18,6 +19,7 @@ from PySide2 import QtCore
 logger = logging.getLogger("SDMaterialX")
 
 _last_hash_digest = None
+_last_selection = None
 
 
 class PollMode(enum.Enum):
@@ -26,6 +28,126 @@ class PollMode(enum.Enum):
     SELECTION = 2
 
 
+class _ExportRequest:
+    '''
+    Everything needed to export a graph without touching the SD API
+    '''
+
+    def __init__(self, graph, package, selected_node_id, dirty_nodes,
+                 search_path_string, search_path_list):
+        self.graph = graph
+        self.package = package
+        self.selected_node_id = selected_node_id
+        # None means everything needs converting
+        self.dirty_nodes = dirty_nodes
+        self.search_path_string = search_path_string
+        self.search_path_list = search_path_list
+        self.cancelled = False
+
+    def mergeDirtyNodes(self, older_request):
+        '''
+        Makes this request include the changes of a request that was replaced
+        before being built
+        '''
+        if self.dirty_nodes is None or older_request.dirty_nodes is None:
+            self.dirty_nodes = None
+        else:
+            self.dirty_nodes = self.dirty_nodes | older_request.dirty_nodes
+
+
+class _ExportResult:
+    def __init__(self, glslfx_output=None, error=None, parameters_only=False):
+        self.glslfx_output = glslfx_output
+        # Only the uniforms of the GLSLFX file changed
+        self.parameters_only = parameters_only
+        # Tuple of title and message
+        self.error = error
+        self.error_shader = None
+
+
+class _ExportWorker(QtCore.QObject):
+    '''
+    Builds export requests on a background thread. Only the latest request is
+    kept, submitting a request cancels the one being built. Results are
+    delivered on the main thread through the finished signal and the next
+    build waits until the result has been acknowledged.
+    '''
+    finished = QtCore.Signal(object)
+
+    def __init__(self, build_function, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self._build_function = build_function
+        self._condition = threading.Condition()
+        self._pending = None
+        self._current = None
+        self._awaiting_result = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='SDMaterialXExport')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, request):
+        with self._condition:
+            if self._pending is not None:
+                request.mergeDirtyNodes(self._pending)
+            if self._current is not None:
+                self._current.cancelled = True
+            self._pending = request
+            self._condition.notify()
+
+    def stop(self):
+        '''
+        Cancels the request being built and ends the thread once it's done
+        '''
+        with self._condition:
+            self._stopped = True
+            self._pending = None
+            if self._current is not None:
+                self._current.cancelled = True
+            self._condition.notify()
+
+    def acknowledge(self):
+        with self._condition:
+            self._awaiting_result = False
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and \
+                        (self._pending is None or self._awaiting_result):
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                request = self._pending
+                self._pending = None
+                self._current = request
+            try:
+                result = self._build_function(request)
+            except BaseException as e:
+                logger.error(str(e))
+                result = None
+            with self._condition:
+                self._current = None
+                if self._stopped:
+                    return
+                if result is not None:
+                    self._awaiting_result = True
+            if result is not None:
+                self.finished.emit(result)
+
+
+class _ExportPollHandle:
+    '''
+    What uninstall_export_poll needs to stop a poll
+    '''
+
+    def __init__(self, timer, worker):
+        self.timer = timer
+        self.worker = worker
+
+
 def install_export_poll(ui_mgr, poll_rate, pollState):
     import sdmatx
     import substance_codegen
@@ -37,104 +159,145 @@ def install_export_poll(ui_mgr, poll_rate, pollState):
     def _isMaterialXGraph(graph):
         return sdmatx.isMtlxGraph(graph)
 
-    def _hasChanged(graph, selected_node):
-        import hashlib as sd_hashes
-
-        # Keeping around for reload support for hashing for fast iteration
-        from importlib import reload
-        sd_hashes = reload(sd_hashes)
+    export_state = sdmatx.IncrementalExportState()
+    graph_hasher = sdmatx.MerkleGraphHasher()
 
+    def _hasChanged(graph, selected_node):
+        '''
+        :return: Tuple with a bool telling if the graph changed and the set of
+        identifiers of the changed nodes. The set is None if anything but
+        the nodes changed
+        '''
         global _last_hash_digest
-        new_hash = sd_hashes.sha3_256()
-        sdmatx.hash_graph(graph, new_hash)
-        if selected_node:
-            # Hash the selected node to trigger updates
-            # when changing selection too
-            new_hash.update(selected_node.getIdentifier().encode('utf-8'))
-        new_digest = new_hash.hexdigest()
-        if new_digest != _last_hash_digest:
-            # print('mismatching hashes old: %s, old: %s' % (_last_hash_digest,
-            #                                                new_digest))
-            _last_hash_digest = new_digest
-            return True
-        return False
-
-    def _exportGraph(graph, selected_node, pollState):
-        current_package = sdmatx.getPackageFromResource(graph)
+        global _last_selection
+        graph_digest = graph_hasher.update(graph)
+        selection = selected_node.getIdentifier() if selected_node else None
+        selection_changed = selection != _last_selection
+        _last_selection = selection
+        if graph_digest == _last_hash_digest and not selection_changed:
+            return False, None
+        first_export = _last_hash_digest is None
+        _last_hash_digest = graph_digest
+        if first_export or selection_changed or \
+                graph_hasher.interface_changed:
+            return True, None
+        return True, set(graph_hasher.modified_nodes)
+
+    def _exportGraph(request):
+        '''
+        Converts a graph snapshot and generates the viewport shader. Runs on
+        the export worker thread so it can't use the SD API
+        :type request: _ExportRequest
+        :return: _ExportResult or None if the request was cancelled
+        '''
+        graph = request.graph
         material_name = graph.getIdentifier()
         try:
             mtlx_document = None
-            if not selected_node:
+            if request.selected_node_id is None:
+                # The incremental export keeps the document around so work
+                # on a copy of it
                 mtlx_document = \
-                    sdmatx.mdl2mtlx_material(graph,
-                                             material_name=material_name,
-                                             sd_package=current_package,
-                                             materialx_searchpaths=
-                                             sdmatx.getMatxSearchPathString())
+                    sdmatx.mdl2mtlx_material_incremental(
+                        graph,
+                        material_name=material_name,
+                        sd_package=request.package,
+                        materialx_searchpaths=request.search_path_string,
+                        export_state=export_state,
+                        dirty_nodes=request.dirty_nodes).copy()
             else:
+                export_state.reset()
                 mtlx_document = \
-                    sdmatx.mdl2mtlx_custom_root(graph,
-                                                node_name=material_name,
-                                                sd_package=current_package,
-                                                materialx_searchpaths=
-                                                sdmatx.getMatxSearchPathString(),
-                                                custom_root=selected_node)
+                    sdmatx.mdl2mtlx_custom_root(
+                        graph,
+                        node_name=material_name,
+                        sd_package=request.package,
+                        materialx_searchpaths=request.search_path_string,
+                        custom_root=graph.getNodeFromId(
+                            request.selected_node_id))
+            if request.cancelled:
+                return None
             # Designer doesn't support sRGB samplers so add explicit gamma
             # to linear conversions on affected nodes
             sdmatx.convertSRGBToLinear(mtlx_document,
-                                       sdmatx.getMatxSearchPathString())
+                                       request.search_path_string)
 
             glslfx_output_files = sdmatx.getGLSLFXOutputFiles(mtlx_document)
+            if request.cancelled:
+                return None
 
-            substance_codegen.mtlx2GLSLFX(
+            parameters_only = substance_codegen.mtlx2GLSLFX(
                 mtlx_document,
                 glslfx_output_files['glsl_output'],
                 glslfx_output_files['glslfx_output'],
                 glslfx_output_files['glslfx_template'],
-                sdmatx.getMatxSearchPathList(),
+                request.search_path_list,
                 root_material=material_name,
-                force_constants=True)
+                force_constants=True,
+                allow_parameter_fast_path=True)
 
-            sdmatx.reloadViewport(glslfx_output_files['glslfx_output'])
-            pollState.status_bar.set_status(True)
-            return
+            return _ExportResult(glslfx_output=
+                                 glslfx_output_files['glslfx_output'],
+                                 parameters_only=parameters_only)
         except sdmatx.UnsupportedMDLType as e:
             error_message = sdmatx.isKnownMDLIssue(e)
             if error_message:
-                logger.error('Failed to convert MaterialX to MDL')
-                pollState.status_bar.set_status(False, 'Failed to convert MaterialX to MDL', error_message)
-                logger.error(error_message)
+                result = _ExportResult(
+                    error=('Failed to convert MaterialX to MDL',
+                           error_message))
             else:
-                logger.error('Failed to convert MaterialX to MDL')
-                pollState.status_bar.set_status(False, 'Failed to convert MaterialX to MDL', str(e))
-                logger.error(str(e))
+                result = _ExportResult(
+                    error=('Failed to convert MaterialX to MDL', str(e)))
         except sdmatx.MDLToMaterialXException as e:
-            logger.error('Failed to convert MaterialX to MDL')
-            pollState.status_bar.set_status(False, 'Failed to convert MaterialX to MDL', str(e))
-            logger.error(str(e))
+            result = _ExportResult(
+                error=('Failed to convert MaterialX to MDL', str(e)))
         except CalledProcessError as e:
-            logger.error('GLSLFX processing failed')
-            pollState.status_bar.set_status(False, 'GLSLFX processing failed', str(e))
-            logger.error(str(e))
+            result = _ExportResult(error=('GLSLFX processing failed', str(e)))
         except BaseException as e:
             logger.error('General error')
-            pollState.status_bar.set_status(False, 'General Error', str(e))
-            logger.error(str(e))
+            result = _ExportResult(error=('General Error', str(e)))
 
         # This code sets the error viewport for all exceptions but not for
         # success
         try:
             root_name = 'standard_surface'
-            if not selected_node:
+            if request.selected_node_id is None:
                 root_node = sdmatx.findRootNode(graph)
                 if root_node:
                     if root_node.getDefinition() is not None:
                         root_name = root_node.getDefinition().getId()
             shader_name = root_name.split('::')[-1]
-            shader_path = sdmatx.getGLSLFXOutputShaderFromUbershader(shader_name)
-            sdmatx.setErrorViewport(shader_path)
+            result.error_shader = \
+                sdmatx.getGLSLFXOutputShaderFromUbershader(shader_name)
         except BaseException as e:
             logger.error(str(e))
+        return result
+
+    def _onExportFinished(result):
+        '''
+        Applies the result of an export on the main thread
+        :type result: _ExportResult
+        '''
+        try:
+            if result.error is None:
+                # The shader itself is unchanged on parameter only edits so
+                # don't switch shaders through the reset shader
+                sdmatx.reloadViewport(
+                    result.glslfx_output,
+                    reset_shader=not result.parameters_only)
+                pollState.status_bar.set_status(True)
+            else:
+                title, message = result.error
+                logger.error(title)
+                logger.error(message)
+                pollState.status_bar.set_status(False, title, message)
+                if result.error_shader:
+                    sdmatx.setErrorViewport(result.error_shader)
+        except BaseException as e:
+            logger.error(str(e))
+        finally:
+            # The next build may overwrite the shader files
+            worker.acknowledge()
 
     def _pollFunction(pollState):
         app = sd.getContext().getSDApplication()
@@ -155,10 +318,28 @@ def install_export_poll(ui_mgr, poll_rate, pollState):
                         if len(selected_nodes) > 0:
                             selected_node = selected_nodes[0]
                     # Compare it with the previous export in a nimble way
-                    if not _hasChanged(currentGraph, selected_node):
+                    changed, dirty_nodes = _hasChanged(currentGraph,
+                                                       selected_node)
+                    if not changed:
                         return
-                    # Export and reset the viewport
-                    _exportGraph(currentGraph, selected_node, pollState)
+                    # Copy the graph here since the SD API is only available
+                    # on the main thread and export it in the background
+                    api_call = sdmatx.SDApiCallCounter()
+                    graph = sdmatx.snapshotGraph(currentGraph, api_call)
+                    package = sdmatx.snapshotPackage(
+                        sdmatx.getPackageFromResource(currentGraph), graph,
+                        api_call)
+                    logger.debug('Export of {} read the graph with {} SD API '
+                                 'calls'.format(graph.getIdentifier(),
+                                                api_call.count))
+                    worker.submit(_ExportRequest(
+                        graph,
+                        package,
+                        selected_node.getIdentifier()
+                        if selected_node else None,
+                        dirty_nodes,
+                        sdmatx.getMatxSearchPathString(),
+                        sdmatx.getMatxSearchPathList()))
         except APIException as e:
             if e.mErrorCode == SDApiError.InvalidArgument:
                 # This is what happens if we don't have any graphs at all
@@ -166,13 +347,24 @@ def install_export_poll(ui_mgr, poll_rate, pollState):
             else:
                 raise e
 
+    worker = _ExportWorker(_exportGraph, ui_mgr.getMainWindow())
+    worker.finished.connect(_onExportFinished)
+
     timer = QtCore.QTimer(ui_mgr.getMainWindow())
     timer.connect(timer, QtCore.SIGNAL("timeout()"), partial(_pollFunction,
                                                              pollState))
     timer.setInterval(poll_rate)
     timer.start(poll_rate)
+    return _ExportPollHandle(timer, worker)
 
 
-def uninstall_export_poll(timer):
+def uninstall_export_poll(handle):
+    '''
+    :param handle: What install_export_poll returned
+    :type handle: _ExportPollHandle
+    '''
     logger.info('Uninstalling export poll')
-    del timer
+    if handle is None:
+        return
+    handle.timer.stop()
+    handle.worker.stop()
@@ -132,7 +132,10 @@ def exportSubgraphs(graphs, package):
             mtlx_path = os.path.join(mtlx_dir,
                                      name + '.mtlx')
 
-            mx.writeToXmlFile(mtlx_doc, mtlx_path)
+            # Leave unchanged documents alone to keep the module hash
+            # and build cache valid
+            sdmatx.writeFileIfChanged(mtlx_path,
+                                      mx.writeToXmlString(mtlx_doc))
             exported_file = True
             results[name] = {
                 'result': True,
@@ -145,19 +148,14 @@ def exportSubgraphs(graphs, package):
             }
     if exported_file:
         try:
-            mdl_content = sdmatx.mtlx2mdl_library(
+            mdl_output_file = os.path.join(sdmatx.getMdlSubgraphDirectory(),
+                                           mdl_user_module_name + '.mdl')
+            sdmatx.getMdlBuildCache().buildModule(
                 mdl_user_module_name,
                 'shared',
+                mdl_output_file,
                 sdmatx.getMatxSearchPathString(),
                 exception_on_omissions=True)
-            mdl_output_file = os.path.join(sdmatx.getMdlSubgraphDirectory(),
-                                           mdl_user_module_name + '.mdl')
-            mdl_output_dir = os.path.dirname(mdl_output_file)
-            if not os.path.isdir(mdl_output_dir):
-                os.makedirs(mdl_output_dir)
-            with open(mdl_output_file,
-                      'w') as f:
-                f.write(mdl_content)
         except BaseException as e:
             results[mdl_user_module_name + '.mdl'] = {
                 'result': False,
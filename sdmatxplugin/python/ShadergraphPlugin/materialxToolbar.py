@@ -60,6 +60,12 @@ class MaterialXToolbar(QtWidgets.QToolBar):
                                       "compatible glsl file")
         export_painter_act.triggered.connect(self.__onExportPainter)
 
+        save_snapshot_act = self.addAction('Save Snapshot')
+        save_snapshot_act.setToolTip("Saves the current graph to a file that "
+                                     "can be converted to materialx outside "
+                                     "of Designer")
+        save_snapshot_act.triggered.connect(self.__onSaveSnapshot)
+
         # Set up poll state button/menu
         self.pollState = pollState
         self.enableAutoExport = QtWidgets.QToolButton(self)
@@ -116,6 +122,9 @@ class MaterialXToolbar(QtWidgets.QToolBar):
     def __onExportPainter(self):
         self.__runExportPainter(sd.getContext())
 
+    def __onSaveSnapshot(self):
+        self.__runSaveSnapshot(sd.getContext())
+
     def __onPollStateChanged(self, newState):
         self.pollState.mode = newState
 
@@ -135,7 +144,7 @@ class MaterialXToolbar(QtWidgets.QToolBar):
         success_dialog.setIcon(QtWidgets.QMessageBox.Information)
         success_dialog.exec()
 
-    def __export_textures(self, mtlx_document, graph, target_directory, doc_root=None):
+    def __export_textures(self, mtlx_document, graph, target_directory, doc_root=None, link_files=False):
         all_image_nodes = sdmatx.findImageNodes(mtlx_document)
         texture_export_map = {}
         for image_node in all_image_nodes:
@@ -149,7 +158,8 @@ class MaterialXToolbar(QtWidgets.QToolBar):
             if not os.path.isdir(target_directory):
                 os.makedirs(target_directory)
             # Export all files
-            exported_maps = sdmatx.exportOutputByUsage(graph, texture_export_map)
+            exported_maps = sdmatx.exportOutputByUsage(graph, texture_export_map,
+                                                       link_files=link_files)
             # Bind texture files to the filename property of the nodes
             for image_node in all_image_nodes:
                 usage = image_node.getAttribute('GLSLFX_usage')
@@ -211,7 +221,6 @@ class MaterialXToolbar(QtWidgets.QToolBar):
 
     def __run_view(self, aContext):
         import ShadergraphPlugin.matxviewdialog as matx_export
-        import tempfile
         logger.info('launching materialx view')
         view_dialog = matx_export.MatxViewDialog(
             aContext.getSDApplication().getQtForPythonUIMgr())
@@ -241,10 +250,15 @@ class MaterialXToolbar(QtWidgets.QToolBar):
                 # Export the textures for the document
                 export_data = state['comp_graph_to_export']
                 if export_data:
-                    texture_dir = tempfile.mkdtemp(prefix='matx_tex')
+                    # Same directory for every view of the material so
+                    # unchanged textures are reused from the texture cache
+                    texture_dir = os.path.join(sdmatx.getTempDirectory(),
+                                               'matx_view_textures',
+                                               material_name)
                     texture_graph, texture_package = export_data
                     if texture_graph != '':
-                        self.__export_textures(mtlx_document, texture_graph, texture_dir)
+                        self.__export_textures(mtlx_document, texture_graph, texture_dir,
+                                               link_files=True)
                 progress.setValue(2)
 
                 sdmatx.showMatxView(mtlx_document)
@@ -410,6 +424,24 @@ class MaterialXToolbar(QtWidgets.QToolBar):
             self.__errorDialog('General Error',
                                str(e))
 
+    def __runSaveSnapshot(self, aContext):
+        current_graph = \
+            aContext.getSDApplication().getUIMgr().getCurrentGraph()
+        current_package = sdmatx.getPackageFromResource(current_graph)
+        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self.__uiMgr.getMainWindow(),
+            'Save Graph Snapshot',
+            current_graph.getIdentifier() + '.json',
+            'Graph Snapshot (*.json)')
+        if not file_path:
+            return
+        try:
+            sdmatx.saveGraphSnapshot(file_path, current_graph,
+                                     current_package)
+        except BaseException as e:
+            self.__errorDialog('General Error',
+                               str(e))
+
 
 def onNewGraphViewCreated(graphViewID, uiMgr, pollState):
     logger.info('Adding toolbar')
@@ -42,30 +42,24 @@ def _updateMDLFiles(logger):
     logger.info('Generating shared.mdl')
     shared_content = sdmatx.mtlx2mdl_shared()
     shared_filename = os.path.join(mdl_root, 'shared.mdl')
-    with open(shared_filename, 'w') as f:
-        f.write(shared_content)
+    sdmatx.writeFileIfChanged(shared_filename, shared_content)
     modules = ['stdlib', 'bxdf', 'alglib']
     mtlx_search_path = sdmatx.getMatxSearchPathString()
 
     mdl_root = os.path.join(sdmatx.getMdlDirectories()[0], 'mtlx')
+    build_cache = sdmatx.getMdlBuildCache()
+    # Generating a module doesn't change the search path so it is only
+    # hashed once for all modules
+    search_path_hash = build_cache.hashSearchPath(mtlx_search_path)
     for m in modules:
         mdl_path = os.path.join(mdl_root, m + '.mdl')
-        if os.path.isfile(mdl_path):
-            logger.info('Found existing module: {}'.format(m))
-            old_content_hash = sdmatx.getMdlSourceHash(mdl_path)
-            new_content_hash = sdmatx.hashMtlxDocsForModule(m, sdmatx.getMatxSearchPathString())
-            if old_content_hash == new_content_hash:
-                logger.info('Hash matching for module {}, keeping'.format(m))
-                # This mdl file exits and has a content hash matching the previous version
-                continue
-            else:
-                logger.info('Hash mismatch for module {} old:{}, new:{}, rebuilding'.format(m, old_content_hash,
-                                                                                            new_content_hash))
+        # The build cache only regenerates the module if its sources, the
+        # search path or the generator changed
+        if build_cache.buildModule(m, 'shared', mdl_path, mtlx_search_path,
+                                   search_path_hash=search_path_hash):
+            logger.info('Updated module {}'.format(m))
         else:
-            logger.info('Module {} missing, building'.format(m))
-        content = sdmatx.mtlx2mdl_library(m, 'shared', mtlx_search_path)
-        with open(mdl_path, 'w') as f:
-            f.write(content)
+            logger.info('Module {} up to date, keeping'.format(m))
 
 
 def _setupSdmatxPath(logger):
@@ -145,6 +139,11 @@ def initializeSDPlugin():
 
         logger.info("SDMaterialX version {}".format(sdmatx.get_version_string()))
 
+        # Keep generated shaders with the rest of the plugin's temp files
+        import substance_codegen
+        substance_codegen.set_shader_cache_directory(
+            os.path.join(sdmatx.getTempDirectory(), 'shader_cache'))
+
         app = ctx.getSDApplication()
 
         # Check for mdl documents and build them if not present
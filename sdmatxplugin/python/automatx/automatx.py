@@ -8,6 +8,9 @@
 #OF ANY KIND, either express or implied. See the License for the specific language
 #governing permissions and limitations under the License.
 
+import math
+import operator
+
 import MaterialX as mx
 
 
@@ -113,8 +116,58 @@ def createConstantNetwork(shader_ref, node_graph, input_name, type_, constant):
     bi.setConnectedOutput(op)
 
 
+# Nodes folded into a constant when both inputs are constant floats
+_FOLDABLE_NODES = {
+    'add': operator.add,
+    'subtract': operator.sub,
+    'multiply': operator.mul,
+    'divide': operator.truediv,
+    'min': min,
+    'max': max,
+    'power': pow
+}
+
+
+def _isScalar(value):
+    return value.__class__ in (float, int)
+
+
+def _callSignature(kwargs):
+    """
+    Identifies the arguments of a node function call
+    :return: Hashable signature or None if an argument can't be identified
+    """
+    items = []
+    for name, value in kwargs.items():
+        if isinstance(value, Op):
+            value = value.node
+        if isinstance(value, mx.Element):
+            items.append((name, 'element', value.getNamePath()))
+        elif value.__class__ in (float, int, str, bool):
+            items.append((name, value.__class__.__name__, value))
+        else:
+            return None
+    return tuple(sorted(items))
+
+
 class Library:
-    def __init__(self, databaseDoc):
+    def __init__(self, databaseDoc, hashConsing=False):
+        """
+
+        :param databaseDoc: Document with the node defs to create functions for
+        :type databaseDoc: mx.Document
+        :param hashConsing: Reuse the node made by an earlier call with the
+        same arguments in the same graph and fold operations on float
+        constants into a constant
+        :type hashConsing: bool
+        """
+        self.hashConsing = hashConsing
+        # id of a document to the document, the map of graph, node def and
+        # call signature to the name of the node made and the set of name
+        # paths of the float constant nodes made.
+        # The document is kept so its id isn't reused and getDocument keeps
+        # returning the same object for it
+        self._documentNodes = {}
         allDefs = {}
         nodeDefs = databaseDoc.getNodeDefs()
         for nd in nodeDefs:
@@ -145,56 +198,190 @@ class Library:
         :type dict[string, f()
         :return:
         """
+        index = _PolyDispatchIndex(polyFuns)
+        nodeDefs = {f: n for n, f in polyFuns}
 
         def _invoke(graph=None, _outputType=None, **kwargs):
-            def _matchType(input_, value):
-                if isinstance(input_, mx.Input) and isinstance(value, mx.Node):
-                    return input_.getType() == value.getType()
-                elif isinstance(input_, mx.Input) and isinstance(value, mx.Input):
-                    return input_.getType() == value.getType()
-                elif isinstance(input_, mx.Input) and isinstance(value, Op):
-                    return input_.getType() == value.node.getType()
-                elif isinstance(input_, mx.Input) and isinstance(value, mx.Parameter):
-                    return input_.getType() == value.getType()
-                elif isinstance(input_, mx.Parameter) and isinstance(value, mx.Parameter):
-                    return input_.getType() == value.getType()
-                elif isinstance(input_, mx.Parameter) or \
-                        isinstance(input_, mx.Input):
-                    if value.__class__ in TYPE_MAP:
-                        return input_.getType() == TYPE_MAP[value.__class__]
-                return False
-
-            def _typeMatching(node):
-                for i in node.getInputs():
-                    if i.getName() in kwargs:
-                        nodeInput = kwargs[i.getName()]
-                        if not _matchType(i, nodeInput):
-                            return False
-                for i in node.getParameters():
-                    if i.getName() in kwargs:
-                        nodeInput = kwargs[i.getName()]
-                        if not _matchType(i, nodeInput):
-                            return False
-                if _outputType:
-                    if _outputType != node.getType() or not node.getName().endswith(_outputType):
-                        return False
-                return True
-
             # Type check
             kwargs = correct_kw(kwargs)
-            imp = None
-            for node, f in polyFuns:
-                if _typeMatching(node):
-                    if imp is not None:
-                        raise AutoMaterialXException('Multiple matching functions')
-                    imp = f
-
-            if not imp:
+            matches = index.find(kwargs, _outputType)
+            if len(matches) > 1:
+                raise AutoMaterialXException('Multiple matching functions')
+            if not matches:
                 raise AutoMaterialXException('No suitable implementation found for the inputs provided')
-            return Op(self, graph, imp(graph, **kwargs))
+            f = matches[0]
+            if not self.hashConsing or graph is None:
+                return Op(self, graph, f(graph, **kwargs))
+            return Op(self, graph, self._makeSharedNode(graph, nodeDefs[f], f, kwargs))
 
         return _invoke
 
+    def _getDocumentNodes(self, element):
+        """
+        :return: Tuple of the shared nodes and constant nodes of the document
+        of element
+        """
+        doc = element.getDocument()
+        entry = self._documentNodes.get(id(doc))
+        if entry is None:
+            entry = (doc, {}, set())
+            self._documentNodes[id(doc)] = entry
+        return entry[1], entry[2]
+
+    def _constantValue(self, value):
+        if isinstance(value, Op):
+            value = value.node
+        if isinstance(value, mx.Node):
+            _, constantNodes = self._getDocumentNodes(value)
+            if value.getNamePath() not in constantNodes:
+                return None
+            # The node may have been edited or replaced since it was made so
+            # the value is read back from it
+            if value.getCategory() != 'constant' or \
+                    value.getType() != 'float':
+                return None
+            # value is a parameter of the stdlib constant but may be an input
+            valueElement = value.getParameter('value')
+            if valueElement is None:
+                valueElement = value.getInput('value')
+                if valueElement is not None and \
+                        valueElement.getConnectedNode() is not None:
+                    return None
+            if valueElement is None or valueElement.hasInterfaceName():
+                return None
+            current = valueElement.getValue()
+            if not _isScalar(current):
+                return None
+            return float(current)
+        if _isScalar(value):
+            return float(value)
+        return None
+
+    def _fold(self, graph, nodeDef, kwargs):
+        """
+        :return: A constant node with the result of the operation or None if
+        it can't be folded
+        """
+        fold = _FOLDABLE_NODES.get(nodeDef.getAttribute('node'))
+        if fold is None or nodeDef.getType() != 'float' or \
+                set(kwargs.keys()) != {'in1', 'in2'}:
+            return None
+        in1 = self._constantValue(kwargs['in1'])
+        in2 = self._constantValue(kwargs['in2'])
+        if in1 is None or in2 is None:
+            return None
+        try:
+            result = fold(in1, in2)
+        except (ArithmeticError, ValueError):
+            return None
+        # Leave results the shader would compute differently to the shader
+        if not _isScalar(result) or not math.isfinite(result):
+            return None
+        return self.constant(graph, value=float(result)).node
+
+    def _makeSharedNode(self, graph, nodeDef, f, kwargs):
+        folded = self._fold(graph, nodeDef, kwargs)
+        if folded is not None:
+            return folded
+        signature = _callSignature(kwargs)
+        if signature is None:
+            return f(graph, **kwargs)
+        sharedNodes, constantNodes = self._getDocumentNodes(graph)
+        key = (graph.getNamePath(), nodeDef.getName(), signature)
+        nodeName = sharedNodes.get(key)
+        if nodeName is not None:
+            node = graph.getNode(nodeName)
+            if node is not None and \
+                    node.getCategory() == nodeDef.getAttribute('node'):
+                return node
+        node = f(graph, **kwargs)
+        sharedNodes[key] = node.getName()
+        if nodeDef.getAttribute('node') == 'constant' and \
+                nodeDef.getType() == 'float' and _isScalar(kwargs.get('value')):
+            constantNodes.add(node.getNamePath())
+        return node
+
+
+# Kinds of values passed to node functions as far as overload resolution
+# is concerned
+_CONNECTION_VALUE = 'connection'
+_PARAMETER_VALUE = 'parameter'
+_LITERAL_VALUE = 'literal'
+_OTHER_VALUE = 'other'
+
+
+def _classifyValue(value):
+    """
+    :return: Tuple of the kind and the MaterialX type of a value
+    """
+    if isinstance(value, mx.Node) or isinstance(value, mx.Input):
+        return _CONNECTION_VALUE, value.getType()
+    elif isinstance(value, Op):
+        return _CONNECTION_VALUE, value.node.getType()
+    elif isinstance(value, mx.Parameter):
+        return _PARAMETER_VALUE, value.getType()
+    elif value.__class__ in TYPE_MAP:
+        return _LITERAL_VALUE, TYPE_MAP[value.__class__]
+    return _OTHER_VALUE, None
+
+
+class _PolyDispatchIndex:
+    """
+    Finds the overloads of a node accepting the arguments of a call.
+    Inputs accept connections, parameters and literals of their type while
+    parameters only accept parameters and literals. Arguments an overload has
+    no input or parameter for are ignored. Results are memoized by the kinds
+    and types of the arguments.
+    """
+
+    def __init__(self, polyFuns):
+        self._functions = [f for n, f in polyFuns]
+        self._all = frozenset(range(len(polyFuns)))
+        # Argument name to the overloads having it
+        self._byName = {}
+        # (name, value kind, type) to the overloads accepting it
+        self._accepting = {}
+        # Output type to the overloads producing it
+        self._byOutputType = {}
+        for index, (nodeDef, f) in enumerate(polyFuns):
+            for i in nodeDef.getInputs():
+                self._add(i.getName(), i.getType(), index,
+                          [_CONNECTION_VALUE, _PARAMETER_VALUE, _LITERAL_VALUE])
+            for i in nodeDef.getParameters():
+                self._add(i.getName(), i.getType(), index,
+                          [_PARAMETER_VALUE, _LITERAL_VALUE])
+            outputType = nodeDef.getType()
+            if nodeDef.getName().endswith(outputType):
+                self._byOutputType.setdefault(outputType, set()).add(index)
+        self._memo = {}
+
+    def _add(self, name, type_, index, valueKinds):
+        self._byName.setdefault(name, set()).add(index)
+        for kind in valueKinds:
+            self._accepting.setdefault((name, kind, type_), set()).add(index)
+
+    def find(self, kwargs, outputType=None):
+        """
+        :param kwargs: Arguments of the call
+        :param outputType: Output type the overload must have if not None
+        :return: The functions of the matching overloads
+        """
+        signature = tuple(sorted(
+            (name,) + _classifyValue(value) for name, value in kwargs.items()
+            if name in self._byName)) + (outputType,)
+        matches = self._memo.get(signature)
+        if matches is None:
+            candidates = set(self._all)
+            for name, kind, type_ in signature[:-1]:
+                rejecting = self._byName[name] - \
+                    self._accepting.get((name, kind, type_), set())
+                candidates -= rejecting
+            if outputType:
+                candidates &= self._byOutputType.get(outputType, set())
+            matches = [self._functions[i] for i in sorted(candidates)]
+            self._memo[signature] = matches
+        return matches
+
 
 def _promoteInput(input, node_graph, lib):
     if isinstance(input, Op):
@@ -89,38 +89,29 @@ def main():
             temp_dir = sdmatx.paths.getTempDirectory()
             mtlx_output_file = os.path.join(temp_dir, 'test.mtlx')
             res, log = mtlxdoc.validate()
-            mx.writeToXmlFile(mtlxdoc, mtlx_output_file)
             if not res:
+                mx.writeToXmlFile(mtlxdoc, mtlx_output_file)
                 raise BaseException(log)
             try:
                 if not os.path.isdir(temp_dir):
                     os.mkdir(temp_dir)
-                with sdmatx.Benchmark('mtlx2GLSLFX_python'):
-                    substance_codegen.mtlx2GLSLFX(
+                with sdmatx.Benchmark('export_targets_python'):
+                    substance_codegen.export_targets(
                         mtlxdoc,
-                        glslfx_output_files['glsl_output'],
-                        glslfx_output_files['glslfx_output'],
-                        glslfx_output_files['glslfx_template'],
+                        [substance_codegen.MtlxTarget(mtlx_output_file),
+                         substance_codegen.DesignerTarget(
+                             glslfx_output_files['glsl_output'],
+                             glslfx_output_files['glslfx_output'],
+                             glslfx_output_files['glslfx_template']),
+                         substance_codegen.PainterTarget(
+                             os.path.join(sdmatx.getTempDirectory(),
+                                          'painter_test.glsl'),
+                             sdmatx.getPainterTemplateDirectory())],
                         sdmatx.getMatxSearchPathList(),
                         root_material=material_name)
             except subprocess.CalledProcessError as e:
                 logger.error(str(e))
                 return
-
-            try:
-                if not os.path.isdir(temp_dir):
-                    os.mkdir(temp_dir)
-                with sdmatx.Benchmark('mtlx2PainterGLSL_python'):
-                    substance_codegen.mtlx2PainterGLSL(
-                        mtlxdoc,
-                        os.path.join(sdmatx.getTempDirectory(),
-                                     'painter_test.glsl'),
-                        sdmatx.getMatxSearchPathList(),
-                        root_material=material_name,
-                        painter_template_directory=sdmatx.getPainterTemplateDirectory())
-            except subprocess.CalledProcessError as e:
-                logger.error(str(e))
-                return
     finally:
         sdmatx.dump_benchmarks()
     # Enable to pop up results in materialx view
@@ -0,0 +1,122 @@
+#Copyright 2020 Adobe. All rights reserved.
+#This file is licensed to you under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License. You may obtain a copy
+#of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software distributed under
+#the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+#OF ANY KIND, either express or implied. See the License for the specific language
+#governing permissions and limitations under the License.
+
+# Converts graph snapshots saved from Designer to MaterialX documents without
+# Designer. See sdmatx/snapshot.py for the snapshot format.
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import logging
+logger = logging.getLogger("SDMaterialX")
+
+
+def _initWorker():
+    # Import once per worker so every job reuses the parsed libraries
+    logging.basicConfig(level=logging.INFO,
+                        format='[%(levelname)s]%(message)s')
+    import sdmatx
+
+
+def _convertSnapshot(snapshot_file,
+                     output_directory,
+                     subgraph=False,
+                     resource_root=None,
+                     materialx_search_path=None):
+    import MaterialX as mx
+    import sdmatx
+    graph, package = sdmatx.loadGraphSnapshot(snapshot_file)
+    name = graph.getIdentifier()
+    if materialx_search_path is None:
+        materialx_search_path = sdmatx.getMatxSearchPathString()
+    if subgraph:
+        doc = sdmatx.mdl2mtlx_subgraph(graph,
+                                       name,
+                                       package,
+                                       materialx_search_path,
+                                       resource_root)
+    else:
+        doc = sdmatx.mdl2mtlx_material(graph,
+                                       name,
+                                       package,
+                                       materialx_search_path,
+                                       resource_root)
+    val_res, val_log = doc.validate()
+    if not val_res:
+        logging.getLogger("SDMaterialX").warning(val_log)
+    target_file = os.path.join(output_directory, name + '.mtlx')
+    sdmatx.writeFileIfChanged(target_file, mx.writeToXmlString(doc))
+    return target_file
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Convert graph snapshots saved from Designer to '
+                    'MaterialX documents.')
+    parser.add_argument('snapshot_files',
+                        nargs='+',
+                        help='Graph snapshot files to convert')
+    parser.add_argument('--output-directory', '-o',
+                        required=True,
+                        help='Directory to write the MaterialX documents to')
+    parser.add_argument('--subgraph',
+                        action='store_true',
+                        help='Convert the graphs as subgraphs rather than '
+                             'materials')
+    parser.add_argument('--resource-root',
+                        default=None,
+                        help='Directory to make resource paths relative to, '
+                             'resource paths are absolute if not set')
+    parser.add_argument('--materialx-search-path',
+                        default=None,
+                        help='Search path for MaterialX documents, defaults '
+                             'to the plugin search path')
+    parser.add_argument('--jobs', '-j',
+                        type=int,
+                        default=None,
+                        help='Number of worker processes, defaults to the '
+                             'number of cores')
+    args = parser.parse_args()
+
+    output_directory = os.path.abspath(args.output_directory)
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.jobs,
+                             initializer=_initWorker) as executor:
+        futures = {
+            executor.submit(_convertSnapshot,
+                            os.path.abspath(snapshot_file),
+                            output_directory,
+                            args.subgraph,
+                            args.resource_root,
+                            args.materialx_search_path): snapshot_file
+            for snapshot_file in args.snapshot_files}
+        for future in as_completed(futures):
+            snapshot_file = futures[future]
+            try:
+                logger.info('Converted {}: {}'.format(snapshot_file,
+                                                      future.result()))
+            except BaseException as e:
+                logger.error('Failed converting {}: {}'.format(snapshot_file,
+                                                               str(e)))
+                failed.append(snapshot_file)
+    if failed:
+        logger.error('{} of {} graphs failed to convert'.format(
+            len(failed), len(args.snapshot_files)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s]%(message)s')
+    sys.exit(main())
@@ -63,27 +63,21 @@ def main():
                     os.makedirs(mtlx_dir)
                 mtlx_path = os.path.join(mtlx_dir,
                                          name + '.mtlx')
-                mx.writeToXmlFile(doc,
-                                  mtlx_path)
+                sdmatx.writeFileIfChanged(mtlx_path,
+                                          mx.writeToXmlString(doc))
                 exported_file = True
             except BaseException as e:
                 logger.error(str(e))
 
     if exported_file:
-        mdl_content = sdmatx.mtlx2mdl_library(
+        mdl_output_file = os.path.join(sdmatx.getMdlSubgraphDirectory(),
+                                       mdl_user_module_name + '.mdl')
+        sdmatx.getMdlBuildCache().buildModule(
             mdl_user_module_name,
             'shared',
+            mdl_output_file,
             sdmatx.getMatxSearchPathString(),
             exception_on_omissions=True)
-        mdl_output_file = os.path.join(sdmatx.getMdlSubgraphDirectory(),
-                                       mdl_user_module_name + '.mdl')
-        mdl_output_dir = os.path.dirname(mdl_output_file)
-        if not os.path.isdir(mdl_output_dir):
-            os.makedirs(mdl_output_dir)
-
-        with open(mdl_output_file,
-                  'w') as f:
-            f.write(mdl_content)
 
 
 if __name__ == '__main__':
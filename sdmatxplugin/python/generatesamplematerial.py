@@ -27,7 +27,7 @@ def main():
 
     mx.readFromXmlFile(stdLib, filename='stdlib_defs.mtlx', searchPath=stdlib_path)
     mx.readFromXmlFile(stdLib, filename='stdlib_ng.mtlx', searchPath=stdlib_path)
-    lib = ax.Library(stdLib)
+    lib = ax.Library(stdLib, hashConsing=True)
     mDoc = mx.createDocument()
     docs_to_include = [os.path.join('stdlib', 'stdlib_defs.mtlx'),
                        os.path.join('bxdf', 'standard_surface.mtlx')]
@@ -9,99 +9,123 @@
 #governing permissions and limitations under the License.
 
 import os
-import subprocess
-import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 import logging
 logger = logging.getLogger("SDMaterialX")
 
 
-def invoke_mtlx2mdl(mtlx2mdl_script,
-                    module_name,
-                    python_executable,
-                    mdl_root,
-                    generate_shared=False,
-                    mdl_shared_name=None,
-                    materialx_search_path=None):
+def _initWorker():
+    # Import once per worker so every job reuses the parsed libraries
+    logging.basicConfig(level=logging.INFO,
+                        format='[%(levelname)s]%(message)s')
+    import sdmatx
+
+
+def _generateAlglib(alglib_defs_path, alglib_graph_path, mtlx_search_path):
+    import io
+    import generatealglib
+    import sdmatx
+    dest_dir = os.path.dirname(alglib_defs_path)
+    if not os.path.isdir(dest_dir):
+        os.makedirs(dest_dir)
+    declaration_stream = io.StringIO()
+    definition_stream = io.StringIO()
+    generatealglib.generate_library(declaration_stream, definition_stream,
+                                    mtlx_search_path)
+    sdmatx.writeFileIfChanged(alglib_defs_path,
+                              declaration_stream.getvalue())
+    sdmatx.writeFileIfChanged(alglib_graph_path,
+                              definition_stream.getvalue())
+    return alglib_defs_path
+
+
+def _generateMdlModule(module_name,
+                       mdl_root,
+                       generate_shared=False,
+                       mdl_shared_name=None,
+                       materialx_search_path=None,
+                       cache_directory=None):
+    import sdmatx
+    target_file = os.path.join(mdl_root, module_name + '.mdl')
+    logging.getLogger("SDMaterialX").info("Generating %s." % target_file)
     if generate_shared:
-        cmd = [python_executable,
-               mtlx2mdl_script,
-               '--module_name', module_name,
-               '--generate_shared',
-               '--mdl_root', mdl_root]
+        mdl = sdmatx.mtlx2mdl_shared()
     else:
         if mdl_shared_name is None:
             raise BaseException('Shared module name must be provided when '
                                 'converting a module')
-        cmd = [python_executable,
-               mtlx2mdl_script,
-               '--module_name', module_name,
-               '--mdl_shared_name', mdl_shared_name,
-               '--mdl_root', mdl_root]
-    if materialx_search_path:
-        cmd += ['--mtlx_search_path', materialx_search_path]
-
-    target_file = os.path.join(mdl_root, module_name + '.mdl')
-    with open(target_file, 'w') as target:
-        logger.info("Generating %s." % target_file)
-        logger.info('Command: ' + ' '.join(cmd))
-        p = subprocess.Popen(cmd, stdout=target, stderr=subprocess.PIPE)
-        stdout_data, stderr_data = p.communicate()
-        p.wait()
-
-        if p.returncode != 0:
-            logger.error('Failed')
-            if stdout_data:
-                logger.error('stdout:')
-                logger.error(stdout_data.decode('utf-8'))
-            if stderr_data:
-                logger.error('stderr:')
-                logger.error(stderr_data.decode('utf-8'))
-            sys.stdout.flush()
-            raise subprocess.CalledProcessError(
-                cmd=subprocess.list2cmdline(cmd), returncode=p.returncode)
-
-
-def createAlglib(alglib_defs_file, alglib_graph_file, alglib_script, data_path,
-                 mtlx_search_path, python_executable):
-    cmd = [python_executable,
-           alglib_script,
-           '--declaration-file', os.path.join(data_path,
-                                              'mtlx',
-                                              alglib_defs_file),
-           '--definition-file', os.path.join(data_path,
-                                             'mtlx',
-                                             alglib_graph_file),
-           '--materialx-search-path', mtlx_search_path]
-    logger.info("Generating Alglib.")
-    dest_dir = os.path.join(data_path, 'mtlx', 'alglib')
-    if not os.path.isdir(dest_dir):
-        os.makedirs(dest_dir)
-
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout_data, stderr_data = p.communicate()
-    p.wait()
-    if p.returncode != 0:
-        logger.error('Failed')
-        if stdout_data:
-            logger.error('stdout:')
-            logger.error(stdout_data.decode('utf-8'))
-        if stderr_data:
-            logger.error('stderr:')
-            logger.error(stderr_data.decode('utf-8'))
-        sys.stdout.flush()
-        raise subprocess.CalledProcessError(
-            cmd=subprocess.list2cmdline(cmd), returncode=p.returncode)
-    logger.info('Done')
+        build_cache = sdmatx.MdlBuildCache(cache_directory) \
+            if cache_directory else sdmatx.getMdlBuildCache()
+        mdl = build_cache.getModule(module_name,
+                                    mdl_shared_name,
+                                    materialx_search_path)
+    # Same layout as printing the result from run_mtlx2mdl.py
+    sdmatx.writeFileIfChanged(target_file, mdl.strip('\n') + '\n')
+    return target_file
+
+
+def _runJobs(jobs, max_workers):
+    '''
+    Runs jobs in a process pool as soon as their dependencies are done
+    :param jobs: dict of job name to a tuple of function, arguments and the
+    names of the jobs it depends on
+    :param max_workers: Number of worker processes, None for one per core
+    '''
+    remaining = dict(jobs)
+    done = set()
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_initWorker) as executor:
+        running = {}
+        while remaining or running:
+            for name, (function, args, dependencies) in \
+                    list(remaining.items()):
+                if set(dependencies).issubset(done):
+                    running[executor.submit(function, *args)] = name
+                    del remaining[name]
+            if not running:
+                raise BaseException('Unresolvable job dependencies: '
+                                    '{}'.format(', '.join(remaining)))
+            finished, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except BaseException:
+                    logger.error('Failed building {}'.format(name))
+                    for f in running.keys():
+                        f.cancel()
+                    raise
+                logger.info('Done building {}: {}'.format(name, result))
+                done.add(name)
 
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Rebuild the alglib materialX library and the mdl '
+                    'modules generated from the standard libraries.')
+    parser.add_argument('mdl_output_path',
+                        nargs='?',
+                        default=None,
+                        help='Directory to write the mdl modules to')
+    parser.add_argument('--cache-directory',
+                        default=None,
+                        help='Directory to cache generated mdl modules in, '
+                             'defaults to the plugin temp directory')
+    parser.add_argument('--jobs', '-j',
+                        type=int,
+                        default=None,
+                        help='Number of worker processes, defaults to the '
+                             'number of cores')
+    args = parser.parse_args()
+
     # Figure out paths and names
     import sdmatx
     script_path = os.path.abspath(os.path.dirname(__file__))
     data_path = os.path.abspath(os.path.join(script_path, '..', '..', 'data'))
-    if len(sys.argv) > 1:
-        mdl_output_path = os.path.abspath(sys.argv[1])
+    if args.mdl_output_path:
+        mdl_output_path = os.path.abspath(args.mdl_output_path)
 
     else:
         mdl_output_path = os.path.abspath(
@@ -112,7 +136,6 @@ def main():
 
     # We can't use the standard search paths here since it's meant to be run
     # in-source
-    script_path = os.path.dirname(__file__)
     # Note alglib before standard surface to make sure our version of standard
     # surface is being used
     # TODO: Redo paths so this is done explicitly rather than include order
@@ -133,45 +156,43 @@ def main():
                                      'MaterialX')),
     ])
 
-    alglib_defs_file = os.path.join('alglib', 'alglib_defs.mtlx')
-    alglib_graph_file = os.path.join('alglib', 'alglib_ng.mtlx')
+    alglib_defs_path = os.path.join(data_path, 'mtlx', 'alglib',
+                                    'alglib_defs.mtlx')
+    alglib_graph_path = os.path.join(data_path, 'mtlx', 'alglib',
+                                     'alglib_ng.mtlx')
 
     mdl_shared_name = 'shared'
 
-    python_executable = sys.executable
-
-    alglib_script = os.path.join(script_path, 'generatealglib.py')
-    mtlx2mdl_script = os.path.join(script_path, 'run_mtlx2mdl.py')
     logger.info('Script Path:       %s' % script_path)
     logger.info('Data Path:         %s' % data_path)
     logger.info('MDL output path:   %s' % mdl_output_path)
-    logger.info('Python Executable: %s' % python_executable)
-
-    # Create the alglib
-    createAlglib(alglib_defs_file, alglib_graph_file, alglib_script, data_path,
-                 mtlx_search_path, python_executable)
-
-    # Create shared mdl lib
-    invoke_mtlx2mdl(mtlx2mdl_script,
-                    mdl_shared_name,
-                    python_executable,
-                    generate_shared=True,
-                    mdl_root=mdl_output_path)
 
+    jobs = {
+        # Create the alglib
+        'alglib_mtlx': (_generateAlglib,
+                        (alglib_defs_path, alglib_graph_path,
+                         mtlx_search_path),
+                        []),
+        # Create shared mdl lib
+        mdl_shared_name: (_generateMdlModule,
+                          (mdl_shared_name, mdl_output_path, True),
+                          []),
+    }
+
+    # Create mdl modules from our materialx modules. Every module imports
+    # all modules in the search path so they all depend on the alglib
     modules_to_build = [
         'stdlib',
         'alglib',
         'bxdf'
     ]
-
-    # Create mdl modules from our materialx modules
     for module in modules_to_build:
-        invoke_mtlx2mdl(mtlx2mdl_script,
-                        module,
-                        python_executable,
-                        mdl_shared_name=mdl_shared_name,
-                        mdl_root=mdl_output_path,
-                        materialx_search_path=mtlx_search_path)
+        jobs[module] = (_generateMdlModule,
+                        (module, mdl_output_path, False, mdl_shared_name,
+                         mtlx_search_path, args.cache_directory),
+                        ['alglib_mtlx'])
+
+    _runJobs(jobs, args.jobs)
 
 
 if __name__ == '__main__':
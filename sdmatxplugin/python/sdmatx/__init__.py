@@ -32,18 +32,30 @@ from .paths import getDataDirectory, \
     initPaths
 from .utilities import getGLSLFXOutputFiles, \
     getPackageFromResource, \
+    clearPackageIndex, \
     reloadViewport, \
     extractReferenceUid, \
     setErrorViewport, \
     isMtlxGraph, \
     getGLSLFXOutputShaderFromUbershader, \
     isKnownMDLIssue
-from .sd_hashes import hash_graph
+from .sd_hashes import hash_graph, hash_graph_interface, hash_comp_graph, \
+    hash_graph_nodes, MerkleGraphHasher
+from .snapshot import snapshotGraph, snapshotPackage, SDApiCallCounter, \
+    saveGraphSnapshot, \
+    loadGraphSnapshot, \
+    graphSnapshotToDict, \
+    graphSnapshotFromDict, \
+    GraphSnapshotException, \
+    PropertyCategory
 from .mdl2mtlx import \
     mdl2mtlx_material, \
+    mdl2mtlx_material_incremental, \
+    IncrementalExportState, \
     mdl2mtlx_subgraph, \
     mdl2mtlx_custom_root, \
     exportDependentFiles, \
+    DependencyExportMode, \
     forwardOutputs, \
     convertSRGBToLinear, \
     MDLToMaterialXException, \
@@ -59,7 +71,12 @@ from .mtlx2mdl import mtlx2mdl_library, \
 from .matx_view import showMatxView
 from .benchmark import perf_measure, dump_benchmarks, Benchmark
 from .export import exportOutputByUsage
-from .modules import getMdlSourceHash, hashMtlxDocsForModule
+from .modules import getMdlSourceHash, \
+    hashMtlxDocsForModule, \
+    getModuleLibrary, \
+    clearModuleLibraryCache, \
+    getModuleNodeDefIndex
+from .buildcache import MdlBuildCache, getMdlBuildCache, writeFileIfChanged
 from .config import Config, ConfigException
 try:
     from .version import get_version_string
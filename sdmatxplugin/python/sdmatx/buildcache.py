@@ -0,0 +1,250 @@
+#Copyright 2020 Adobe. All rights reserved.
+#This file is licensed to you under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License. You may obtain a copy
+#of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software distributed under
+#the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+#OF ANY KIND, either express or implied. See the License for the specific language
+#governing permissions and limitations under the License.
+
+# Cache for mdl modules generated from materialx modules.
+# A generated module depends on the documents of the module, every other
+# module in the search path (they are imported to resolve clashing symbols),
+# the shared module name, the generation flags and the generator itself.
+# All of these are hashed into a key and the generated mdl is stored on disk
+# under that key so a module is only generated once for a given set of inputs.
+# Only the most recently used modules are kept on disk.
+import hashlib
+import logging
+import os
+import threading
+
+from .modules import hashMtlxDocsForModule, getAllMtlxModules
+from .paths import getTempDirectory, getMatxSearchPathString
+
+logger = logging.getLogger("SDMaterialX")
+
+# Packages whose sources affect the generated mdl. Every source is hashed
+# rather than picking the files mtlx2mdl imports so a new dependency can't
+# be missed
+_generator_packages = ['sdmatx', 'mx_utils']
+_generator_hash = None
+_generator_hash_lock = threading.Lock()
+# Number of generated modules kept in the cache directory
+DEFAULT_MAX_CACHED_MODULES = 64
+
+
+def _getGeneratorSources():
+    '''
+    :return: List of the relative and absolute path of every source of the
+    generator
+    '''
+    source_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sources = []
+    for package in _generator_packages:
+        package_dir = os.path.join(source_root, package)
+        if not os.path.isdir(package_dir):
+            continue
+        for name in sorted(os.listdir(package_dir)):
+            if name.endswith('.py'):
+                sources.append(('{}/{}'.format(package, name),
+                                os.path.join(package_dir, name)))
+    return sources
+
+
+def _getGeneratorHash():
+    global _generator_hash
+    with _generator_hash_lock:
+        if _generator_hash is None:
+            try:
+                from .version import get_version_string
+                version = get_version_string()
+            except ImportError:
+                version = 'development_build'
+            hasher = hashlib.md5(version.encode())
+            for source, source_path in _getGeneratorSources():
+                hasher.update(source.encode())
+                with open(source_path, 'rb') as f:
+                    hasher.update(f.read())
+            _generator_hash = hasher.hexdigest()
+        return _generator_hash
+
+
+def _writeAtomic(target_file, content):
+    tmp_file = '{}.{}.tmp'.format(target_file, os.getpid())
+    with open(tmp_file, 'w') as f:
+        f.write(content)
+    os.replace(tmp_file, target_file)
+
+
+def writeFileIfChanged(target_file, content):
+    '''
+    Writes content to a file unless the file already has that content
+    :return: True if the file was written
+    '''
+    if os.path.isfile(target_file):
+        with open(target_file, 'r') as f:
+            if f.read() == content:
+                return False
+    target_dir = os.path.dirname(target_file)
+    if target_dir and not os.path.isdir(target_dir):
+        os.makedirs(target_dir)
+    _writeAtomic(target_file, content)
+    return True
+
+
+class MdlBuildCache:
+    '''
+    Generates mdl modules from materialx modules, reusing previously
+    generated modules when none of their inputs changed
+    '''
+
+    def __init__(self, cache_directory=None,
+                 max_cached_modules=DEFAULT_MAX_CACHED_MODULES):
+        '''
+        :param cache_directory: Where to store generated modules. Defaults to
+        a directory in the plugin temp directory
+        :type cache_directory: str
+        :param max_cached_modules: Number of generated modules to keep, the
+        least recently used ones are removed first
+        :type max_cached_modules: int
+        '''
+        if cache_directory is None:
+            cache_directory = os.path.join(getTempDirectory(),
+                                           'mdl_build_cache')
+        self.cache_directory = cache_directory
+        self.max_cached_modules = max_cached_modules
+
+    def hashSearchPath(self, mtlx_search_path):
+        '''
+        Computes the fingerprint of every module in the search path. When
+        building several modules compute it once and pass it to buildModule
+        to avoid hashing the search path for every module
+        :return: str
+        '''
+        hasher = hashlib.md5()
+        for module in getAllMtlxModules(mtlx_search_path):
+            hasher.update(module.encode())
+            hasher.update(hashMtlxDocsForModule(
+                module, mtlx_search_path).encode())
+        return hasher.hexdigest()
+
+    def buildKey(self,
+                 module_name,
+                 shared_name,
+                 mtlx_search_path,
+                 exception_on_omissions=False,
+                 search_path_hash=None):
+        '''
+        Computes the key identifying the inputs of a generated module
+        :param search_path_hash: Result of hashSearchPath for
+        mtlx_search_path, computed if None
+        :return: str
+        '''
+        if search_path_hash is None:
+            search_path_hash = self.hashSearchPath(mtlx_search_path)
+        hasher = hashlib.md5()
+        hasher.update(_getGeneratorHash().encode())
+        hasher.update(module_name.encode())
+        hasher.update(shared_name.encode())
+        hasher.update(str(exception_on_omissions).encode())
+        # The module itself is part of the search path fingerprint
+        hasher.update(search_path_hash.encode())
+        return hasher.hexdigest()
+
+    def _cachePath(self, key):
+        return os.path.join(self.cache_directory, key + '.mdl')
+
+    def _trim(self):
+        '''
+        Removes the least recently used modules past max_cached_modules
+        '''
+        entries = []
+        try:
+            for name in os.listdir(self.cache_directory):
+                if name.endswith('.mdl'):
+                    path = os.path.join(self.cache_directory, name)
+                    entries.append((os.stat(path).st_mtime, path))
+        except OSError:
+            return
+        if len(entries) <= self.max_cached_modules:
+            return
+        entries.sort()
+        for mtime, path in entries[:len(entries) - self.max_cached_modules]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def getModule(self,
+                  module_name,
+                  shared_name,
+                  mtlx_search_path=None,
+                  exception_on_omissions=False,
+                  search_path_hash=None):
+        '''
+        Gets the generated mdl for a module, generating it if not cached
+        :param search_path_hash: See buildKey
+        :return: str
+        '''
+        from .mtlx2mdl import mtlx2mdl_library
+        if mtlx_search_path is None:
+            mtlx_search_path = getMatxSearchPathString()
+        key = self.buildKey(module_name, shared_name, mtlx_search_path,
+                            exception_on_omissions, search_path_hash)
+        cache_path = self._cachePath(key)
+        if os.path.isfile(cache_path):
+            logger.info('Using cached mdl for module {}'.format(module_name))
+            with open(cache_path, 'r') as f:
+                content = f.read()
+            # The modification time tells when the module was last used
+            try:
+                os.utime(cache_path)
+            except OSError:
+                pass
+            return content
+        logger.info('Generating mdl for module {}'.format(module_name))
+        content = mtlx2mdl_library(module_name,
+                                   shared_name,
+                                   mtlx_search_path,
+                                   exception_on_omissions=
+                                   exception_on_omissions)
+        if not os.path.isdir(self.cache_directory):
+            os.makedirs(self.cache_directory)
+        _writeAtomic(cache_path, content)
+        self._trim()
+        return content
+
+    def buildModule(self,
+                    module_name,
+                    shared_name,
+                    target_file,
+                    mtlx_search_path=None,
+                    exception_on_omissions=False,
+                    search_path_hash=None):
+        '''
+        Writes the generated mdl for a module to a file. The file is left
+        untouched if its content is up to date
+        :param search_path_hash: See buildKey
+        :return: True if the file was written
+        '''
+        content = self.getModule(module_name,
+                                 shared_name,
+                                 mtlx_search_path,
+                                 exception_on_omissions,
+                                 search_path_hash)
+        return writeFileIfChanged(target_file, content)
+
+
+_default_cache = None
+
+
+def getMdlBuildCache():
+    '''
+    :return: The build cache stored in the plugin temp directory
+    '''
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MdlBuildCache()
+    return _default_cache
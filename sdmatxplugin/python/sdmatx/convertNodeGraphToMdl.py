@@ -11,26 +11,53 @@
 import MaterialX as mx
 from sdmatx.common import *
 
+def _getUpstreamElements(element):
+    result = []
+    for i in range(element.getUpstreamEdgeCount()):
+        edge = element.getUpstreamEdge(None, i)
+        parent = edge.getUpstreamElement()
+        if parent != None:
+            result.append(parent)
+    return result
+
 def _getOrderedNodes(root, nodegraph, placed_nodes):
     """
     Follows a node to the inputs and outputs a list of nodes that is unique and ordered so any node in the
-    list is independent of anything below it
+    list is independent of anything below it.
+    Each node is visited once and the traversal is iterative so deep graphs don't hit the recursion limit
     :param root:
     :type root: MaterialX.Node
-    :param placed_nodes:
+    :param placed_nodes: Name paths of the nodes already in a list, updated with the nodes added
     :type placed_nodes: set
 
     """
-    if root in placed_nodes:
+    if root.getNamePath() in placed_nodes:
         # This node has already been visited
         return []
     node_list = []
-    for i in range(root.getUpstreamEdgeCount()):
-        edge = root.getUpstreamEdge(None, i)
-        parent = edge.getUpstreamElement()
-        if parent != None:
-            node_list += _getOrderedNodes(parent, nodegraph, placed_nodes)
-    return node_list + [root]
+    # Stack of elements along with their upstream elements still to visit
+    stack = [(root, iter(_getUpstreamElements(root)))]
+    on_stack = {root.getNamePath()}
+    while stack:
+        element, upstream_elements = stack[-1]
+        for parent in upstream_elements:
+            parent_path = parent.getNamePath()
+            if parent_path in placed_nodes:
+                continue
+            if parent_path in on_stack:
+                raise BaseException('Cycle found in node graph {} at {}'.format(
+                    nodegraph.getName(), parent.getName()))
+            on_stack.add(parent_path)
+            stack.append((parent, iter(_getUpstreamElements(parent))))
+            break
+        else:
+            # All upstream elements are placed
+            stack.pop()
+            element_path = element.getNamePath()
+            on_stack.discard(element_path)
+            placed_nodes.add(element_path)
+            node_list.append(element)
+    return node_list
 
 def _getMdlIntefaceName(node):
     ifs = node.getInterfaceName()
@@ -8,7 +8,11 @@
 #OF ANY KIND, either express or implied. See the License for the specific language
 #governing permissions and limitations under the License.
 
+import hashlib
 import os
+import shutil
+
+from .paths import getTempDirectory
 
 def _findAllOutputUsages(graph):
     from sd.api.sdproperty import SDPropertyCategory
@@ -26,15 +30,7 @@ def _findAllOutputUsages(graph):
                 result[usage_name] = node
     return result
 
-def exportOutputByUsage(graph, texture_export_map):
-    '''
-    Export an output as an image by usage
-    Raises an exception if the usage is missing
-    :param graph:  sd.api.sbs.sdsbscompgraph.SDSBSCompGraph
-    :param usage:
-    :param filename:
-    :return:
-    '''
+def _saveOutputsByUsage(graph, texture_export_map):
     from sd.api.sdproperty import SDPropertyCategory
     graph.compute()
     all_usages = _findAllOutputUsages(graph)
@@ -55,4 +51,139 @@ def exportOutputByUsage(graph, texture_export_map):
                     result[usage] = filename
     return result
 
+# Least recently used textures are removed once the cache grows past this
+TEXTURE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+def getTextureCacheDirectory():
+    return os.path.join(getTempDirectory(), 'texture_cache')
+
 
+def _touchFile(file_path):
+    try:
+        os.utime(file_path)
+    except OSError:
+        pass
+
+
+def _trimTextureCache(cache_directory, max_bytes=TEXTURE_CACHE_MAX_BYTES):
+    '''
+    Removes the least recently used files until the cache fits in max_bytes
+    '''
+    entries = []
+    total_size = 0
+    for f in os.listdir(cache_directory):
+        file_path = os.path.join(cache_directory, f)
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, file_path))
+        total_size += st.st_size
+    if total_size <= max_bytes:
+        return
+    entries.sort()
+    for mtime, size, file_path in entries:
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(file_path)
+            total_size -= size
+        except OSError:
+            pass
+
+def _getCompGraphKey(graph):
+    '''
+    Identifies the content of a compositing graph. Besides the graph itself
+    the package file is part of the key to catch changes in resources and
+    graphs it depends on once they are saved
+    '''
+    from .sd_hashes import hash_comp_graph
+    from .utilities import getPackageFromResource
+    hasher = hashlib.md5()
+    hash_comp_graph(graph, hasher)
+    package = getPackageFromResource(graph)
+    package_file = package.getFilePath() if package else ''
+    hasher.update(package_file.encode('utf-8'))
+    if package_file and os.path.isfile(package_file):
+        hasher.update(str(os.stat(package_file).st_mtime_ns).encode('utf-8'))
+    return hasher.hexdigest()
+
+def _placeFile(source, target, link):
+    '''
+    Makes target have the content of source, preferring links over copies if
+    link is set
+    '''
+    if os.path.lexists(target):
+        if os.path.isfile(target) and os.path.samefile(source, target):
+            return
+        os.remove(target)
+    if not link:
+        shutil.copyfile(source, target)
+        return
+    try:
+        os.link(source, target)
+        return
+    except OSError:
+        pass
+    try:
+        os.symlink(source, target)
+        return
+    except OSError:
+        pass
+    shutil.copyfile(source, target)
+
+def exportOutputByUsage(graph, texture_export_map, use_cache=True,
+                        link_files=False):
+    '''
+    Export an output as an image by usage
+    Missing usages are reported as warnings and left out of the result.
+    Textures are cached by the content of the graph and the usage, the graph
+    is only computed if a texture is missing from the cache. The least
+    recently used textures are removed when the cache grows past
+    TEXTURE_CACHE_MAX_BYTES
+    :param graph:  sd.api.sbs.sdsbscompgraph.SDSBSCompGraph
+    :param texture_export_map: dict of usage to the filename to export to
+    :param use_cache: Reuse textures exported from the same graph content
+    :param link_files: Link cached textures to the filenames rather than
+    copying them. Only meant for temporary files since modifying a linked
+    file modifies the cache
+    :return: dict of usage to the exported filename
+    '''
+    if not use_cache:
+        return _saveOutputsByUsage(graph, texture_export_map)
+    cache_directory = getTextureCacheDirectory()
+    if not os.path.isdir(cache_directory):
+        os.makedirs(cache_directory)
+    graph_key = _getCompGraphKey(graph)
+    cache_files = {}
+    for usage, filename in texture_export_map.items():
+        extension = os.path.splitext(filename)[1]
+        key = hashlib.md5('{}:{}:{}'.format(graph_key, usage, extension).encode(
+            'utf-8')).hexdigest()
+        cache_files[usage] = os.path.join(cache_directory, key + extension)
+    # Usages the graph doesn't have are marked so they don't trigger a compute
+    missing_markers = {usage: f + '.missing' for usage, f in cache_files.items()}
+    to_compute = {usage: f for usage, f in cache_files.items()
+                  if not os.path.isfile(f) and
+                  not os.path.isfile(missing_markers[usage])}
+    if to_compute:
+        computed = _saveOutputsByUsage(graph, to_compute)
+        for usage in to_compute.keys():
+            if usage not in computed:
+                open(missing_markers[usage], 'w').close()
+    result = {}
+    for usage, filename in texture_export_map.items():
+        cache_file = cache_files[usage]
+        if not os.path.isfile(cache_file):
+            if usage not in to_compute:
+                _touchFile(missing_markers[usage])
+                print('Warning: missing usage in graph: {}'.format(usage))
+            continue
+        _touchFile(cache_file)
+        _placeFile(cache_file, filename, link_files)
+        result[usage] = filename
+    if to_compute:
+        # After placing so the textures just computed are never removed
+        _trimTextureCache(cache_directory)
+    return result
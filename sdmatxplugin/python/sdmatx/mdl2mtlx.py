@@ -10,7 +10,12 @@
 
 from .paths import makeConsistentPath
 from .modules import moduleFromMdlNamespace, \
-    importMtlxDocsForModule, getMtlxModuleDocs, mtlxDocContainsModule
+    importMtlxDocsForModule, getMtlxModuleDocs, mtlxDocContainsModule, \
+    getModuleNodeDefIndex, ModuleError
+from .snapshot import SnapshotValue, sdApiValueToString, isValueCall, \
+    isExposedConstant, isUniformType, isSnapshot, snapshotGraph, \
+    snapshotPackage, SDApiCallCounter, PropertyCategory
+import enum
 import logging
 import os
 import shutil
@@ -113,11 +118,10 @@ def check_and_remove_substring_left(s, pattern):
 
 def _computeMinMaxValues(valueType, valueString, sd_node):
     import math
-    from sd.api.sdproperty import SDPropertyCategory
 
     def _getPropertyVal(prop_name):
         prop = sd_node.getPropertyFromId(
-            prop_name, SDPropertyCategory.Annotation)
+            prop_name, PropertyCategory.Annotation)
         if prop:
             property_value = sd_node.getPropertyValue(prop)
             if property_value:
@@ -158,56 +162,13 @@ def _computeMinMaxValues(valueType, valueString, sd_node):
 
 def _sdValueToString(sdValue):
     # expect values in the form of: "1.0, 2.0, 3.0" or "foobar"
-
-    # Hack to return something from constructors we don't understand
-    # Specifically added to support texture_2d constructor with parameters
-    value_strings = []
-    full_type_name = sdValue.getType().getId()
-    type_name = full_type_name.split('::')[-1]
-    if type_name in ['color2', 'color3', 'color4', 'ColorRGB']:
-
-        if 'SDTypeStruct' in str(sdValue.getType()):
-            fields = ['r', 'g', 'b', 'a']
-            for field in fields:
-                member = sdValue.getPropertyValueFromId(field)
-                if member:
-                    value_strings.append(str(member.get()))
-                else:
-                    break
-        else:
-            # TODO verify standard color/color3
-            # string coming in is: r: ..., g: ..., etc...
-            tokens = str(sdValue.get()).split(',')
-            for token in tokens:
-                value_strings.append(token.split(":")[-1])
-    elif type_name in ['float2', 'float3', 'float4']:
-        # string coming in is: x: ..., y: ..., etc...
-        tokens = str(sdValue.get()).split(',')
-        for token in tokens:
-            value_strings.append(token.split(":")[-1])
-    elif type_name == 'bool':
-        value_strings = [str(sdValue.get()).lower()]
-    elif type_name == 'texture_2d':
-        # If there is a string, set it as filename
-        return sdValue.getValue()
-    elif type_name.startswith('matrix'):
-        # Matrices are in row major order
-        values = []
-        for r in range(sdValue.getRowCount()):
-            for c in range(sdValue.getColumnCount()):
-                # Todo: are row and column swapped in getItem?
-                values.append(str(sdValue.getItem(r, c).get()))
-        return ','.join(values)
-    else:
-        value_strings = str(sdValue.get()).split(';')
-
-    if 'color' in type_name or 'float' in type_name:
-        for i in range(len(value_strings)):
-            # ensure this is a decimal
-            if not '.' in value_strings[i]:
-                value_strings[i] += ".0"
-
-    return ','.join(value_strings)
+    if isinstance(sdValue, SnapshotValue):
+        if sdValue.value_string is None:
+            raise MDLToMaterialXException(
+                'Unsupported value of type {}'.format(
+                    sdValue.getType().getId()))
+        return sdValue.value_string
+    return sdApiValueToString(sdValue)
 
 
 def _resolveSDPath(resource_path, sd_package, resource_root):
@@ -227,8 +188,7 @@ def _resolveSDPath(resource_path, sd_package, resource_root):
 
 
 def _setMtlxValue(sdValue, mtlxInput, sd_package, resource_root):
-    from sd.api.mdl.sdmdlvaluecall import SDMDLValueCall
-    if isinstance(sdValue, SDMDLValueCall):
+    if isValueCall(sdValue):
         # This is a bound call as opposed to a value
         v = sdValue.getValue()
         if 'getGeomPropDef' in v:
@@ -259,9 +219,8 @@ def __getSamplerUsage(sd_node):
     :type sd_node: class SDNode
     :return: str
     '''
-    from sd.api.sdproperty import SDPropertyCategory
     vs = sd_node.getPropertyValueFromId(
-        'sampler_usage', SDPropertyCategory.Annotation)
+        'sampler_usage', PropertyCategory.Annotation)
     return vs.get()
 
 
@@ -273,6 +232,19 @@ class _Mdl2MtlxCaches:
     def __init__(self):
         self.uniqueNodeNameMap = {}
         self.nodeDefCache = {}
+        # Modules imported in the document, in import order
+        self.importedModules = []
+
+
+def _importModule(module, mtlx_document, mdl2mtlx_caches):
+    '''
+    Imports a module in the document unless it has already been imported
+    during the export
+    '''
+    if module in mdl2mtlx_caches.importedModules:
+        return
+    importMtlxDocsForModule(module, mtlx_document)
+    mdl2mtlx_caches.importedModules.append(module)
 
 
 def _getUniqueNodeName(mdl2mtlx_caches, sd_node=None):
@@ -302,11 +274,10 @@ def _getUniqueNodeName(mdl2mtlx_caches, sd_node=None):
 
 
 def _getInterfaceName(sd_node):
-    from sd.api.sdproperty import SDPropertyCategory
-    name_property = sd_node.getPropertyFromId('name', SDPropertyCategory.Input)
+    name_property = sd_node.getPropertyFromId('name', PropertyCategory.Input)
     if not name_property:
         name_property = sd_node.getPropertyFromId('identifier',
-                                                  SDPropertyCategory.Annotation)
+                                                  PropertyCategory.Annotation)
     # name_property = next(x for x in input_properties if x.getId() == "name")
     mtlx_interface_name = str(sd_node.getPropertyValue(name_property).get())
     if mtlx_interface_name == "":
@@ -322,9 +293,8 @@ def _getMtlxNameAndType(sd_node, mtlx_document, mdl2mtlx_caches):
     :param mdl2mtlx_caches:
     :return:
     '''
-    from sd.api.sdproperty import SDPropertyCategory
     sd_node_id = sd_node.getDefinition().getId()
-    output_properties = sd_node.getProperties(SDPropertyCategory.Output)
+    output_properties = sd_node.getProperties(PropertyCategory.Output)
     if len(output_properties) != 1:
         raise UnsupportedMDLType('Multiple output properties on MDL node '
                                  'not supported')
@@ -358,15 +328,13 @@ def _getMtlxNameAndType(sd_node, mtlx_document, mdl2mtlx_caches):
                 # This is just a node that happens to have _ in its name
                 mtlx_name = mtlx_full_name
     elif _isMdlConstructor(sd_node_id):
-        from sd.api.mdl.sdmdlconstantnode import SDMDLConstantNode
         # This is a constructor
         modifier_prop = sd_node.getPropertyValueFromId('type_modifier',
-                                                       SDPropertyCategory.Annotation)
-        isExposed = isinstance(sd_node,
-                               SDMDLConstantNode) and sd_node.isExposed()
+                                                       PropertyCategory.Annotation)
+        isExposed = isExposedConstant(sd_node)
         mtlx_type = mdlToMtlx_types[mdl_type_id]
         if isExposed:
-            prop = sd_node.getProperties(SDPropertyCategory.Annotation)
+            prop = sd_node.getProperties(PropertyCategory.Annotation)
             usage = __getSamplerUsage(sd_node)
             # This parameter is bound as a texture
             if mtlx_type == 'filename':
@@ -387,7 +355,7 @@ def _getMtlxNameAndType(sd_node, mtlx_document, mdl2mtlx_caches):
                 raise MDLToMaterialXException(
                     'Unknown exposed input type for exposed node {}'.format(sd_node_id))
         else:
-            input_properties = sd_node.getProperties(SDPropertyCategory.Input)
+            input_properties = sd_node.getProperties(PropertyCategory.Input)
             if sd_node_id.startswith('mdl::texture_2d'):
                 # We have special case treatment for mdl::texture_2d
                 # constructors
@@ -414,7 +382,7 @@ def _getMtlxNameAndType(sd_node, mtlx_document, mdl2mtlx_caches):
         raise UnsupportedMDLType('Input and parameter nodes are deprecated')
 
     valid_parameters = [p for p in
-                        sd_node.getProperties(SDPropertyCategory.Input) if
+                        sd_node.getProperties(PropertyCategory.Input) if
                         not p.getId().startswith('attr_')]
     parameter_types = [mdlToMtlx_types[p.getType().getId()] for p in
                        valid_parameters]
@@ -481,9 +449,7 @@ def _connectNodeGraphOutput(mtlx_element, sd_node, mtlx_document,
 
 
 def _isInput(mdl_property):
-    from sd.api.mdl.sdmdltype import SDTypeModifier
-    type_modifier = mdl_property.getType().getModifier()
-    if type_modifier is SDTypeModifier.Uniform:
+    if isUniformType(mdl_property.getType()):
         return False
     return True
 
@@ -542,32 +508,62 @@ def _mkNodeDefParamCacheEntries(node_defs):
 
 def _findMtlxParameterTypes(sd_node_id, mtlx_name, mtlx_out_type,
                             mtlx_param_types, mtlx_document, mdl2mtlx_caches):
-    def _implementation():
+    signature = (mtlx_out_type, tuple(mtlx_param_types))
+
+    def _fromIndex(module):
+        signatures = getModuleNodeDefIndex(module).get(mtlx_name, None)
+        if not signatures:
+            return None
+        entry = signatures.get(signature, None)
+        if not entry:
+            return None
+        _, out_type, input_count, parameter_count = entry
+        return (out_type,
+                ([INPUT_MODIFIER] * input_count) + (
+                    [PARAM_MODIFIER] * parameter_count))
+
+    def _fromDocument():
         if mtlx_name in mdl2mtlx_caches.nodeDefCache:
             matching_node_defs = mdl2mtlx_caches.nodeDefCache[mtlx_name]
         else:
             matching_node_defs = _mkNodeDefParamCacheEntries(
                 mtlx_document.getMatchingNodeDefs(mtlx_name))
-        d = matching_node_defs.get(
-            (mtlx_out_type, tuple(mtlx_param_types)), None)
+        d = matching_node_defs.get(signature, None)
         if not d:
-            raise MissingMaterialXType('No MaterialX type found for '
-                                       'function {}'.format(mtlx_name))
+            return None
         mdl2mtlx_caches.nodeDefCache[mtlx_name] = matching_node_defs
         return (d.getType(),
                 ([INPUT_MODIFIER] * len(d.getInputs())) + (
             [PARAM_MODIFIER] * len(d.getParameters())))
 
+    # Try to find the implementation given what is already imported.
+    # Modules imported later take precedence like the nodedefs appended last
+    # to the document do when it is scanned
+    for module in reversed(mdl2mtlx_caches.importedModules):
+        result = _fromIndex(module)
+        if result:
+            return result
+    # Not finding it is a sign of us missing an implementation
+    # this can mean either we actually miss the implementation or need to
+    # import the library document and try again
     try:
-        # Try to find the implementation given what is already imported
-        return _implementation()
-    except MissingMaterialXType:
-        # This is a sign of us missing an implementation
-        # this can mean either we actually miss the implementation or need to
-        # import the library document and try again
         node_dir = moduleFromMdlNamespace(sd_node_id)
-        importMtlxDocsForModule(node_dir, mtlx_document)
-        return _implementation()
+    except ModuleError:
+        node_dir = None
+    if node_dir is not None:
+        _importModule(node_dir, mtlx_document, mdl2mtlx_caches)
+        result = _fromIndex(node_dir)
+        if result:
+            return result
+    # Nodedefs that were added to the document outside of the export
+    result = _fromDocument()
+    if result:
+        return result
+    if node_dir is None:
+        # Report the namespace error as before
+        moduleFromMdlNamespace(sd_node_id)
+    raise MissingMaterialXType('No MaterialX type found for '
+                               'function {}'.format(mtlx_name))
 
 
 def _bindMaterial(sd_node,
@@ -582,15 +578,12 @@ def _bindMaterial(sd_node,
     :param sd_node: The node
     :type sd_node: class SDNode
     """
-    from sd.api.sdproperty import SDPropertyCategory
 
     def _getBoundInputCount(node):
-        from sd.api.mdl.sdmdlvaluecall import SDMDLValueCall
         count = 0
-        for mdl_property in node.getProperties(SDPropertyCategory.Input):
+        for mdl_property in node.getProperties(PropertyCategory.Input):
             if len(sd_node.getPropertyConnections(mdl_property)) > 0 or \
-                    isinstance(sd_node.getPropertyValue(mdl_property),
-                               SDMDLValueCall):
+                    isValueCall(sd_node.getPropertyValue(mdl_property)):
                 count += 1
         return count
 
@@ -646,8 +639,6 @@ def _bindMaterial(sd_node,
             logger.warning('Unsupported value call, setting empty value')
             return None
 
-    from sd.api.mdl.sdmdlvaluecall import SDMDLValueCall
-
     # sd_node = sd_node.getDefinition().getId()
     mtlx_name, mtlx_return, _ = _getMtlxNameAndType(sd_node,
                                                     mtlx_document,
@@ -658,7 +649,7 @@ def _bindMaterial(sd_node,
     mtlx_shaderref.setAttribute("node", mtlx_name)
 
     bound_input_count = _getBoundInputCount(sd_node)
-    for mdl_property in sd_node.getProperties(SDPropertyCategory.Input):
+    for mdl_property in sd_node.getProperties(PropertyCategory.Input):
         property_val = sd_node.getPropertyValue(mdl_property)
         property_connections = sd_node.getPropertyConnections(mdl_property)
         input_name = mdl_property.getId()
@@ -682,7 +673,7 @@ def _bindMaterial(sd_node,
             # Bind the output to the surface shader
             mtlx_bind.setOutputString(mtlx_output.getName())
             mtlx_bind.setNodeGraphString(mtlx_graph.getName())
-        elif isinstance(property_val, SDMDLValueCall):
+        elif isValueCall(property_val):
             # This is a value calle, instantiate the node and connect it
             # TODO: Share more code with the connected code path
             new_node = _instantiateValueCall(property_val, mdl2mtlx_caches)
@@ -717,7 +708,6 @@ def _addMaterialXNode(mtlx_graph,
                       sd_package,
                       resource_root,
                       mdl2mtlx_caches):
-    from sd.api.sdproperty import SDPropertyCategory
     if __isIgnoredNode(sd_node_id):
         # This node has special treatment and is dealt with by the node
         # referencing it
@@ -729,7 +719,7 @@ def _addMaterialXNode(mtlx_graph,
     mtlx_node = mtlx_graph.addNode(
         mtlx_name, _getUniqueNodeName(mdl2mtlx_caches, sd_node), mtlx_return)
     for idx, input_property in enumerate(
-            sd_node.getProperties(SDPropertyCategory.Input)):
+            sd_node.getProperties(PropertyCategory.Input)):
         mdl_input_type = input_property.getType().getId()
         # Workaround for unconnected pin with multiple possible types
         if mdl_input_type is '':
@@ -757,9 +747,9 @@ def _addMaterialXNode(mtlx_graph,
         # detect whether we are connecting a param or node
         if not "attr_" in mdl_input_name:
             if idx >= len(parameter_modifiers):
-                sd_size = len(sd_node.getProperties(SDPropertyCategory.Input))
+                sd_size = len(sd_node.getProperties(PropertyCategory.Input))
                 for idx, input_property in enumerate(
-                        sd_node.getProperties(SDPropertyCategory.Input)):
+                        sd_node.getProperties(PropertyCategory.Input)):
                     logger.warning(input_property.getId())
                 raise MDLToMaterialXException(
                     'Inconsistent parameter list length for '
@@ -799,7 +789,7 @@ def _addMaterialXNode(mtlx_graph,
                         # connect a constant node to it. Note, some assumptions
                         # here break if we support non identity constructors
                         child_properties = child_node.getProperties(
-                            SDPropertyCategory.Input)
+                            PropertyCategory.Input)
                         if len(child_properties) != 1:
                             raise MDLToMaterialXException('Expected strictly '
                                                           'one input property '
@@ -851,17 +841,37 @@ def _addMaterialXNode(mtlx_graph,
 
 
 def _addDisplayNameAndGroup(sd_node, mtlx_element):
-    from sd.api.sdproperty import SDPropertyCategory
     in_group = sd_node.getPropertyValueFromId(
-        'in_group', SDPropertyCategory.Annotation)
+        'in_group', PropertyCategory.Annotation)
     if in_group and in_group.get() != '':
         mtlx_element.setAttribute("uifolder", in_group.get())
     display_name = sd_node.getPropertyValueFromId(
-        'display_name', SDPropertyCategory.Annotation)
+        'display_name', PropertyCategory.Annotation)
     if display_name and display_name.get() != '':
         mtlx_element.setAttribute("uiname", display_name.get())
 
 
+def _setInterfaceProxyValue(mtlx_element,
+                            mtlx_node_name,
+                            mtlx_return,
+                            sd_node,
+                            sd_package,
+                            resource_root):
+    '''
+    Sets the value and ui attributes of a node def input or parameter from
+    the sd node exposing it
+    '''
+    value = sd_node.getPropertyValueFromId('v', PropertyCategory.Input)
+    if not value:
+        # This is an mdl constructor. Get the property using the node name
+        value = sd_node.getPropertyValueFromId(
+            mtlx_node_name, PropertyCategory.Input)
+    mtlx_value_string = _sdValueToString(value)
+    _setMtlxValue(value, mtlx_element, sd_package, resource_root)
+    _addDisplayNameAndGroup(sd_node, mtlx_element)
+    _setMinMax(mtlx_element, mtlx_return, mtlx_value_string, sd_node)
+
+
 def _addParameterProxyNode(mtlx_node_def,
                            mtlx_node_graph,
                            mtlx_return,
@@ -869,21 +879,11 @@ def _addParameterProxyNode(mtlx_node_def,
                            sd_package,
                            resource_root,
                            force_root):
-    from sd.api.sdproperty import SDPropertyCategory
     # Parameter node case
     mtlx_node_name = _getInterfaceName(sd_node)
-    value = sd_node.getPropertyValueFromId('v', SDPropertyCategory.Input)
-    if not value:
-        # This is an mdl constructor. Get the property using the node name
-        value = sd_node.getPropertyValueFromId(
-            mtlx_node_name, SDPropertyCategory.Input)
-
     mtlx_parameter = mtlx_node_def.addParameter(mtlx_node_name, mtlx_return)
-    mtlx_value_string = _sdValueToString(value)
-    _setMtlxValue(value, mtlx_parameter, sd_package, resource_root)
-    _addDisplayNameAndGroup(sd_node, mtlx_parameter)
-
-    _setMinMax(mtlx_parameter, mtlx_return, mtlx_value_string, sd_node)
+    _setInterfaceProxyValue(mtlx_parameter, mtlx_node_name, mtlx_return,
+                            sd_node, sd_package, resource_root)
     if force_root is not None:
         mtlx_node = mtlx_node_graph.addNode('dot', mtlx_node_name)
         mtlx_node.setType(mtlx_return)
@@ -919,20 +919,11 @@ def _addInputProxyNode(mtlx_node_def,
                        sd_package,
                        resource_root,
                        force_root):
-    from sd.api.sdproperty import SDPropertyCategory
     # Input node case
     mtlx_node_name = _getInterfaceName(sd_node)
-    value = sd_node.getPropertyValueFromId('v', SDPropertyCategory.Input)
-    if not value:
-        # This is an mdl constructor. Get the property using the node name
-        value = sd_node.getPropertyValueFromId(
-            mtlx_node_name, SDPropertyCategory.Input)
     mtlx_input = mtlx_node_def.addInput(mtlx_node_name, mtlx_return)
-    mtlx_value_string = _sdValueToString(value)
-    # mtlx_input.setValueString(mtlx_value_string)
-    _setMtlxValue(value, mtlx_input, sd_package, resource_root)
-    _addDisplayNameAndGroup(sd_node, mtlx_input)
-    _setMinMax(mtlx_input, mtlx_return, mtlx_value_string, sd_node)
+    _setInterfaceProxyValue(mtlx_input, mtlx_node_name, mtlx_return,
+                            sd_node, sd_package, resource_root)
 
     if force_root is not None:
         mtlx_node = mtlx_node_graph.addNode('dot', mtlx_node_name)
@@ -945,9 +936,8 @@ def _addInputProxyNode(mtlx_node_def,
 
 
 def __apply_gamma(sd_node, file_param, mtlx_return):
-    from sd.api.sdproperty import SDPropertyCategory
     gamma_prop = sd_node.getPropertyFromId('gamma_type',
-                                           SDPropertyCategory.Annotation)
+                                           PropertyCategory.Annotation)
     is_color_type = mtlx_return in mtlxColorTypes
     if gamma_prop and is_color_type:
         # Set color space according to gamma for color
@@ -999,7 +989,6 @@ def _addSubgraphOutput(mtlx_graph,
     :param sd_node:
     :return:
     '''
-    from sd.api.sdproperty import SDPropertyCategory
     output_count = len(mtlx_graph.getOutputs())
     output_name = format('output_{}'.format(output_count))
     output = mtlx_node_def.addOutput(output_name)
@@ -1007,7 +996,7 @@ def _addSubgraphOutput(mtlx_graph,
 
     new_output = mtlx_graph.addOutput(output_name, mtlx_return)
     for idx, input_property in \
-            enumerate(sd_node.getProperties(SDPropertyCategory.Input)):
+            enumerate(sd_node.getProperties(PropertyCategory.Input)):
         property_connections = sd_node.getPropertyConnections(
             input_property)
         if len(property_connections) != 0:
@@ -1118,8 +1107,32 @@ def forwardOutputs(material_name, mtlx_document, mtlx_graph, mtlx_node_def):
             bi.setNodeGraphString(entry_graph.getName())
 
 
+class _ConvertedNodeKind:
+    ROOT = 'root'
+    SUBGRAPH_OUTPUT = 'subgraph_output'
+    INPUT_PROXY = 'input_proxy'
+    PARAMETER_PROXY = 'parameter_proxy'
+    SAMPLER_PROXY = 'sampler_proxy'
+    TEXTURED_INPUT_PROXY = 'textured_input_proxy'
+    NODE = 'node'
+    IGNORED = 'ignored'
+
+
+class _ConvertedNode:
+    '''
+    Records what a single sd node was converted to
+    '''
+
+    def __init__(self, kind, mtlx_name, mtlx_return, interface_name=None):
+        self.kind = kind
+        self.mtlx_name = mtlx_name
+        self.mtlx_return = mtlx_return
+        self.interface_name = interface_name
+
+
 def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
-              resource_root, sd_graph, sd_package, force_root=None):
+              resource_root, sd_graph, sd_package, force_root=None,
+              mdl2mtlx_caches=None, node_records=None):
     '''
     :param material_name:
     :param mtlx_document:
@@ -1131,17 +1144,26 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
     :param sd_package:
     :param force_root: A node forced to be the output
     :type force_root: sd.api.mdl.sdmdlnode.SDMDLNode
+    :param mdl2mtlx_caches: Caches to use for the conversion. A new set is
+    created if None
+    :type mdl2mtlx_caches: _Mdl2MtlxCaches
+    :param node_records: If not None, filled with a _ConvertedNode per sd node
+    identifier
+    :type node_records: dict
     :return:
     '''
 
-    mdl2mtlx_caches = _Mdl2MtlxCaches()
+    if mdl2mtlx_caches is None:
+        mdl2mtlx_caches = _Mdl2MtlxCaches()
 
     # Always include stdlib since there are situations where
     # nodes are introduced without checking for its presence causing
     # issues
-    importMtlxDocsForModule('stdlib', mtlx_document)
+    _importModule('stdlib', mtlx_document, mdl2mtlx_caches)
 
     outputs = []
+    # Looked up on the first surface shader
+    root_identifier = None
     for sd_node in sd_graph.getNodes():
         # Expecting valid nodes. matx_* nodes and special primitive nodes
         if sd_node.getDefinition() is None:
@@ -1157,10 +1179,15 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
         is_selected = sd_node.getIdentifier() == force_root.getIdentifier() \
             if force_root else False
         is_root = False
+        kind = _ConvertedNodeKind.NODE
+        interface_name = None
         if mtlx_return == 'surfaceshader':
+            kind = _ConvertedNodeKind.ROOT
             # Export if it's the selection and we are forcing the root
             # or we are not forcing root and it's the root
-            is_root = _isRoot(sd_node, sd_graph)
+            if root_identifier is None:
+                root_identifier = _getRootIdentifier(sd_graph)
+            is_root = sd_node.getIdentifier() == root_identifier
             if (is_selected and force_root) or (is_root and not force_root):
                 outputs.append(_bindMaterial(sd_node,
                                              material_name,
@@ -1171,6 +1198,7 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
                                              resource_root,
                                              mdl2mtlx_caches))
         elif _isSubgraphOutputProxyNode(sd_node_id, mtlx_name):
+            kind = _ConvertedNodeKind.SUBGRAPH_OUTPUT
             # Only bind subgraph if we are not forcing a root
             if not force_root:
                 outputs.append(_addSubgraphOutput(mtlx_graph,
@@ -1180,6 +1208,8 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
                                                   mtlx_document,
                                                   mdl2mtlx_caches))
         elif _isInputProxyNode(sd_node_id, mtlx_name):
+            kind = _ConvertedNodeKind.INPUT_PROXY
+            interface_name = _getInterfaceName(sd_node)
             new_mtlx_node = _addInputProxyNode(mtlx_node_def,
                                                mtlx_graph,
                                                mtlx_return,
@@ -1188,6 +1218,8 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
                                                resource_root,
                                                force_root)
         elif _isParameterProxyNode(sd_node_id, mtlx_name):
+            kind = _ConvertedNodeKind.PARAMETER_PROXY
+            interface_name = _getInterfaceName(sd_node)
             new_mtlx_node = _addParameterProxyNode(mtlx_node_def,
                                                    mtlx_graph,
                                                    mtlx_return,
@@ -1196,10 +1228,12 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
                                                    resource_root,
                                                    force_root)
         elif _isSamplerProxyNode(sd_node_id, mtlx_name):
+            kind = _ConvertedNodeKind.SAMPLER_PROXY
             # Ignore, everything related to this is done
             # when adding the image node in _addMaterialXNode
             new_mtlx_node = None
         elif _isTexturedInputProxyNode(sd_node_id, mtlx_name):
+            kind = _ConvertedNodeKind.TEXTURED_INPUT_PROXY
             new_mtlx_node = _addTexturedInputProxyNode(
                 mtlx_graph, mtlx_return, sd_node, mdl2mtlx_caches)
         elif mtlx_return is None:
@@ -1216,6 +1250,8 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
                                               sd_package,
                                               resource_root,
                                               mdl2mtlx_caches)
+            if new_mtlx_node is None:
+                kind = _ConvertedNodeKind.IGNORED
         # If we are forcing the root and this is the selection, make sure we
         # append a surface shader unless it's an surface shader, then it has
         # already been exported
@@ -1227,18 +1263,36 @@ def _mdl2mtlx(material_name, mtlx_document, mtlx_graph, mtlx_node_def,
                                                   new_mtlx_node, mtlx_document,
                                                   material_name)
             outputs.append(output_material)
+        if node_records is not None:
+            node_records[sd_node.getIdentifier()] = _ConvertedNode(
+                kind, mtlx_name, mtlx_return, interface_name)
     return outputs
 
 
-def _isRoot(sd_node, sd_graph):
+def _getRootIdentifier(sd_graph):
     output_nodes = sd_graph.getOutputNodes()
     if len(output_nodes) < 1:
         raise MDLToMaterialXException('No output node defined in the graph')
     if len(output_nodes) > 1:
         raise MDLToMaterialXException('Multiple output nodes defined in the '
                                       'graph')
-    output_node = output_nodes[0]
-    return output_node.getIdentifier() == sd_node.getIdentifier()
+    return output_nodes[0].getIdentifier()
+
+
+def _snapshotForConversion(sd_graph, sd_package):
+    '''
+    Snapshots a live SD graph so the conversion reads every fact from the SD
+    API once. Snapshots are returned as is
+    :return: Tuple of graph and package to convert
+    '''
+    if isSnapshot(sd_graph):
+        return sd_graph, sd_package
+    api_call = SDApiCallCounter()
+    graph = snapshotGraph(sd_graph, api_call)
+    package = snapshotPackage(sd_package, graph, api_call)
+    logger.info('Read graph {} with {} SD API calls'.format(
+        graph.getIdentifier(), api_call.count))
+    return graph, package
 
 
 def _hasBoundInput(material):
@@ -1273,6 +1327,25 @@ def mdl2mtlx_material(sd_graph,
 
     logger.info('Converting MDL to Mtlx')
 
+    sd_graph, sd_package = _snapshotForConversion(sd_graph, sd_package)
+    mtlx_document, _, _, _ = _convertMaterial(sd_graph,
+                                              material_name,
+                                              sd_package,
+                                              resource_root)
+    return mtlx_document
+
+
+def _convertMaterial(sd_graph,
+                     material_name,
+                     sd_package,
+                     resource_root,
+                     mdl2mtlx_caches=None,
+                     node_records=None):
+    '''
+    Converts a material graph
+    :return: The document, graph and node def along with a bool telling if
+    the graph and node def were kept in the document
+    '''
     mtlx_document = mtx.createDocument()
 
     # TODO: Make the naming of the nodedef based on the shader name
@@ -1285,7 +1358,8 @@ def mdl2mtlx_material(sd_graph,
     mtlx_graph.setNodeDef(mtlx_node_def)
     outputs = _mdl2mtlx(material_name, mtlx_document, mtlx_graph,
                         mtlx_node_def, resource_root, sd_graph,
-                        sd_package)
+                        sd_package, mdl2mtlx_caches=mdl2mtlx_caches,
+                        node_records=node_records)
     # Pick the first output of material type
     mat = next(iter([o for o in outputs if isinstance(o, mtx.Material)]), None)
     # Special case when no nodes are bound to any material
@@ -1296,7 +1370,8 @@ def mdl2mtlx_material(sd_graph,
     if len(outputs) > 1:
         logger.warning('Warning, multiple outputs found in graph, using '
                        '{node_name}'.format(node_name=mat.getName()))
-    if _hasBoundInput(mat):
+    has_bound_input = _hasBoundInput(mat)
+    if has_bound_input:
         forwardOutputs(material_name, mtlx_document, mtlx_graph, mtlx_node_def)
     else:
         mtlx_document.removeNodeGraph(mtlx_graph.getName())
@@ -1305,6 +1380,179 @@ def mdl2mtlx_material(sd_graph,
     validation_result, validation_log = mtlx_document.validate()
     if not validation_result:
         logger.warning(validation_log)
+    return mtlx_document, mtlx_graph, mtlx_node_def, has_bound_input
+
+
+class IncrementalExportState:
+    '''
+    Keeps the result of a material conversion so later conversions of the
+    same graph can patch the document rather than rebuilding it
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.key = None
+        self.mtlx_document = None
+        self.mtlx_graph = None
+        self.mtlx_node_def = None
+        self.mdl2mtlx_caches = None
+        self.node_records = None
+
+    def isValid(self, key):
+        return self.mtlx_document is not None and self.key == key
+
+
+# Nodes whose conversion is copied into the nodes consuming them rather than
+# connected by name
+def _isForwardedNode(record):
+    return record.kind in {_ConvertedNodeKind.SAMPLER_PROXY,
+                           _ConvertedNodeKind.IGNORED} or \
+        record.mtlx_name == CONSTANT_PROXY
+
+
+def _findConsumers(sd_nodes, node_identifiers):
+    consumers = set()
+    for sd_node in sd_nodes:
+        for p in sd_node.getProperties(PropertyCategory.Input):
+            for c in sd_node.getPropertyConnections(p):
+                if c.getInputPropertyNode().getIdentifier() in \
+                        node_identifiers:
+                    consumers.add(sd_node.getIdentifier())
+    return consumers
+
+
+def _patchMaterial(export_state, sd_graph, dirty_nodes, sd_package,
+                   resource_root):
+    '''
+    Reconverts the dirty nodes in the document kept by the export state
+    :return: False if the change can't be patched and needs a full conversion
+    '''
+    records = export_state.node_records
+    mtlx_document = export_state.mtlx_document
+    mtlx_graph = export_state.mtlx_graph
+    mtlx_node_def = export_state.mtlx_node_def
+    caches = export_state.mdl2mtlx_caches
+
+    sd_nodes = {n.getIdentifier(): n for n in sd_graph.getNodes()}
+    if set(sd_nodes.keys()) != set(records.keys()):
+        # Nodes were added or removed
+        return False
+    to_convert = set(dirty_nodes)
+    forwarded = {i for i in to_convert if _isForwardedNode(records[i])}
+    while forwarded:
+        consumers = _findConsumers(sd_nodes.values(), forwarded) - to_convert
+        to_convert.update(consumers)
+        forwarded = {i for i in consumers if _isForwardedNode(records[i])}
+
+    # Make sure every node converts to the same kind of element before
+    # touching the document
+    patchable_kinds = {_ConvertedNodeKind.NODE,
+                       _ConvertedNodeKind.INPUT_PROXY,
+                       _ConvertedNodeKind.PARAMETER_PROXY,
+                       _ConvertedNodeKind.SAMPLER_PROXY,
+                       _ConvertedNodeKind.IGNORED,
+                       _ConvertedNodeKind.TEXTURED_INPUT_PROXY}
+    conversions = []
+    for i in sorted(to_convert):
+        record = records[i]
+        if record.kind not in patchable_kinds:
+            return False
+        sd_node = sd_nodes[i]
+        mtlx_name, mtlx_return, parameter_modifiers = _getMtlxNameAndType(
+            sd_node, mtlx_document, caches)
+        if mtlx_name != record.mtlx_name or mtlx_return != record.mtlx_return:
+            return False
+        if record.interface_name is not None and \
+                _getInterfaceName(sd_node) != record.interface_name:
+            return False
+        conversions.append((record, sd_node, parameter_modifiers))
+
+    for record, sd_node, parameter_modifiers in conversions:
+        if record.kind == _ConvertedNodeKind.NODE:
+            mtlx_graph.removeNode(_getUniqueNodeName(caches, sd_node))
+            _addMaterialXNode(mtlx_graph,
+                              record.mtlx_name,
+                              record.mtlx_return,
+                              sd_node,
+                              sd_node.getDefinition().getId(),
+                              parameter_modifiers,
+                              mtlx_document,
+                              sd_package,
+                              resource_root,
+                              caches)
+        elif record.kind == _ConvertedNodeKind.TEXTURED_INPUT_PROXY:
+            mtlx_graph.removeNode(_getUniqueNodeName(caches, sd_node))
+            _addTexturedInputProxyNode(mtlx_graph, record.mtlx_return,
+                                       sd_node, caches)
+        elif record.kind in {_ConvertedNodeKind.INPUT_PROXY,
+                             _ConvertedNodeKind.PARAMETER_PROXY}:
+            if record.kind == _ConvertedNodeKind.INPUT_PROXY:
+                mtlx_element = mtlx_node_def.getInput(record.interface_name)
+            else:
+                mtlx_element = mtlx_node_def.getParameter(
+                    record.interface_name)
+            for attr in ['uiname', 'uifolder', 'uimin', 'uimax',
+                         'uisoftmin', 'uisoftmax']:
+                mtlx_element.removeAttribute(attr)
+            _setInterfaceProxyValue(mtlx_element, record.interface_name,
+                                    record.mtlx_return, sd_node, sd_package,
+                                    resource_root)
+    logger.debug('Patched {} nodes in {}'.format(len(conversions),
+                                                 mtlx_document.getName()))
+    return True
+
+
+def mdl2mtlx_material_incremental(sd_graph,
+                                  material_name,
+                                  sd_package,
+                                  materialx_searchpaths,
+                                  export_state,
+                                  dirty_nodes=None,
+                                  resource_root=None):
+    '''
+    Same as mdl2mtlx_material but patches the document from the previous
+    call with the same export state when possible. Only the dirty nodes, and
+    the nodes their values are forwarded into, are converted again. Any
+    change that can't be patched falls back to a full conversion
+    :type sd_graph: sd.api.SDGraph
+    :param export_state: State kept between calls
+    :type export_state: IncrementalExportState
+    :param dirty_nodes: Identifiers of the sd nodes changed since the previous
+    call. None forces a full conversion
+    :type dirty_nodes: None or set
+    :return: mx.Document owned by the export state. Copy it before modifying
+    it
+    '''
+    sd_graph, sd_package = _snapshotForConversion(sd_graph, sd_package)
+    key = (sd_graph.getIdentifier(), material_name, materialx_searchpaths,
+           resource_root)
+    if dirty_nodes is not None and export_state.isValid(key):
+        try:
+            if _patchMaterial(export_state, sd_graph, dirty_nodes,
+                              sd_package, resource_root):
+                return export_state.mtlx_document
+        except BaseException:
+            # The document may be partially patched
+            export_state.reset()
+            raise
+
+    export_state.reset()
+    logger.info('Converting MDL to Mtlx')
+    caches = _Mdl2MtlxCaches()
+    records = {}
+    mtlx_document, mtlx_graph, mtlx_node_def, has_bound_input = \
+        _convertMaterial(sd_graph, material_name, sd_package, resource_root,
+                         mdl2mtlx_caches=caches, node_records=records)
+    if has_bound_input:
+        # Without a bound graph there is nothing to patch
+        export_state.key = key
+        export_state.mtlx_document = mtlx_document
+        export_state.mtlx_graph = mtlx_graph
+        export_state.mtlx_node_def = mtlx_node_def
+        export_state.mdl2mtlx_caches = caches
+        export_state.node_records = records
     return mtlx_document
 
 
@@ -1337,6 +1585,7 @@ def mdl2mtlx_subgraph(sd_graph,
 
     logger.info('Converting MDL to Mtlx')
 
+    sd_graph, sd_package = _snapshotForConversion(sd_graph, sd_package)
     mtlx_document = mtx.createDocument()
 
     mtlx_node_def = mtlx_document.addNodeDef("ND_" + node_name)
@@ -1384,6 +1633,9 @@ def mdl2mtlx_custom_root(sd_graph,
 
     logger.info('Converting MDL to Mtlx')
 
+    if not isSnapshot(sd_graph):
+        sd_graph, sd_package = _snapshotForConversion(sd_graph, sd_package)
+        custom_root = sd_graph.getNodeFromId(custom_root.getIdentifier())
     mtlx_document = mtx.createDocument()
 
     mtlx_node_def = mtlx_document.addNodeDef("ND_" + node_name)
@@ -1396,8 +1648,7 @@ def mdl2mtlx_custom_root(sd_graph,
     # Move custom root to parent if we are on a subgraph output
     if custom_root.getDefinition().getId().startswith(
             'mdl::mtlx::shared::subgraph_output'):
-        from sd.api.sdproperty import SDPropertyCategory
-        p = custom_root.getPropertyFromId('p', SDPropertyCategory.Input)
+        p = custom_root.getPropertyFromId('p', PropertyCategory.Input)
         connections = custom_root.getPropertyConnections(p)
         if len(connections) > 0:
             custom_root = connections[0].getInputPropertyNode()
@@ -1444,10 +1695,85 @@ def _findFilenames(mtlx_document):
     return all_paths
 
 
+class DependencyExportMode(enum.Enum):
+    COPY = 1
+    # Fall back to copying when linking isn't supported for the destination
+    HARDLINK = 2
+    REFLINK = 3
+
+
+# Some file systems, such as FAT and network shares backed by it, store
+# modification times with two second resolution
+_MTIME_TOLERANCE = 2.0
+
+
+def _isSameFile(src_path, dest_path):
+    '''
+    Checks if the destination is up to date with the source. Files are
+    exported with the modification time of their source so matching size
+    and modification time mean the destination is current
+    '''
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    src_stat = os.stat(src_path)
+    if os.path.samestat(src_stat, dest_stat):
+        return True
+    return src_stat.st_size == dest_stat.st_size and \
+        abs(src_stat.st_mtime - dest_stat.st_mtime) <= _MTIME_TOLERANCE
+
+
+def _reflinkFile(src_path, dest_path):
+    # FICLONE ioctl, copy on write clone on file systems supporting it
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+
+
+def _exportFile(src_path, dest_path, mode):
+    # Remove first so a linked destination never writes through to its source
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+    if mode == DependencyExportMode.HARDLINK:
+        try:
+            os.link(src_path, dest_path)
+            return
+        except OSError:
+            pass
+    elif mode == DependencyExportMode.REFLINK:
+        try:
+            _reflinkFile(src_path, dest_path)
+            shutil.copystat(src_path, dest_path)
+            return
+        except (ImportError, OSError):
+            if os.path.lexists(dest_path):
+                os.remove(dest_path)
+    # Keeps the modification time _isSameFile compares
+    shutil.copy2(src_path, dest_path)
+
+
 def exportDependentFiles(target_directory,
                          mtlx_document,
                          mtlx_search_path,
-                         ignore_modules=set()):
+                         ignore_modules=set(),
+                         mode=DependencyExportMode.COPY,
+                         max_workers=None):
+    '''
+    Exports the module documents a document depends on. Files already up to
+    date at the destination are skipped and the rest are exported in parallel
+    :param target_directory: Directory to export the modules to
+    :param mtlx_document: The document to export the dependencies of
+    :type mtlx_document: mtx.Document
+    :param mtlx_search_path: Search path string to resolve modules in
+    :param ignore_modules: Modules not to export
+    :param mode: How to export the files
+    :type mode: DependencyExportMode
+    :param max_workers: Number of export threads, None for the default
+    :return: list of the exported files
+    '''
+    from concurrent.futures import ThreadPoolExecutor
     # Find all potentially dependent uri's
     src_uris = set()
     for element in mtlx_document.getChildren():
@@ -1455,16 +1781,34 @@ def exportDependentFiles(target_directory,
         if uri != '':
             src_uris.add(os.path.dirname(uri))
 
-    # Copy all documents associated with uri's except explicitly ignored modules
+    # Collect all documents associated with uri's except explicitly ignored
+    # modules
+    files = {}
     for uri in src_uris.difference(ignore_modules):
-        docs = getMtlxModuleDocs(uri, mtlx_search_path, absolute=True)
-        for doc_path in docs:
-            dest_path = os.path.join(target_directory, uri)
-            if not os.path.isdir(dest_path):
-                os.makedirs(dest_path)
-            logger.info('Copying: {src}, {dest}'.format(
-                src=doc_path, dest=dest_path))
-            shutil.copy(doc_path, dest_path)
+        dest_path = os.path.join(target_directory, uri)
+        for doc_path in getMtlxModuleDocs(uri, mtlx_search_path,
+                                          absolute=True):
+            files[os.path.join(dest_path, os.path.basename(doc_path))] = \
+                doc_path
+    for dest_dir in set(os.path.dirname(f) for f in files.keys()):
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir)
+
+    def _export(dest_file):
+        src_file = files[dest_file]
+        if _isSameFile(src_file, dest_file):
+            return None
+        logger.debug('Exporting: {src}, {dest}'.format(
+            src=src_file, dest=dest_file))
+        _exportFile(src_file, dest_file, mode)
+        return dest_file
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        exported = [f for f in executor.map(_export, sorted(files.keys()))
+                    if f is not None]
+    logger.info('Exported {} of {} dependent files to {}'.format(
+        len(exported), len(files), target_directory))
+    return exported
 
 
 def findImageNodes(mtlx_document):
@@ -1499,53 +1843,47 @@ def convertSRGBToLinear(mtlx_document, mtlx_search_path):
     :return:
     '''
 
-    def _addSrgbToLinearConversion(mtlx_node, mtlx_document, mtlx_search_path):
+    def _findConsumers(parent):
+        '''
+        Indexes the inputs and outputs of a node graph by the name of the
+        node connected to them
+        :type parent: mtx.NodeGraph
+        :return: dict of node name to list of mtx.Input or mtx.Output
+        '''
+        consumers = {}
+        for n in parent.getNodes():
+            for input in n.getInputs():
+                node_name = input.getNodeName()
+                if node_name:
+                    consumers.setdefault(node_name, []).append(input)
+        for o in parent.getOutputs():
+            node_name = o.getNodeName()
+            if node_name:
+                consumers.setdefault(node_name, []).append(o)
+        return consumers
+
+    def _addSrgbToLinearConversion(mtlx_node, consumers):
         '''
         Adds srgb output node and changes all input filename properties to be
         in colorspace linear
         :param mtlx_node: the node to do the conversion for
         :type mtlx_node: mtx.Node
-        :param mtlx_document: The document the node lives in
-        :type mtlx_document: mtx.Document
+        :param consumers: Index of the inputs and outputs in the node's graph
+        from _findConsumers
         :return:
         '''
-        # Find all connected nodes
-        # Note, this is a pretty expensive operation looking at all nodes in
-        # the graph and identifies if it has an upstream connection to the
-        # node we are operating on.
-        # TODO: Is there a faster way of doing this?
         parent = mtlx_node.getParent()
-        assert (isinstance(parent, mtx.NodeGraph))
-        affected_nodes = []
-        for n in parent.getNodes():
-            edge_count = n.getUpstreamEdgeCount()
-            for idx in range(0, edge_count):
-                e = n.getUpstreamEdge(None, idx)
-                upstream = e.getUpstreamElement()
-                if upstream == mtlx_node:
-                    affected_nodes.append(n)
-                    continue
-
         # Create correction node
-        if not mtlxDocContainsModule('alglib', mtlx_document):
-            importMtlxDocsForModule('alglib', mtlx_document, mtlx_search_path)
         correction_node = parent.addNode('algsrgb_to_linear',
                                          'correct_cs_' + mtlx_node.getName())
         correction_node.setConnectedNode('in', mtlx_node)
 
-        # Find all nodes connected to the current node's output
-        for node in affected_nodes:
-            for input in node.getInputs():
-                if input.getConnectedNode() == mtlx_node:
-                    input.setConnectedNode(correction_node)
-
-        # Find all outputs connected to the affected node
-        for o in parent.getOutputs():
-            if o.getConnectedNode() == mtlx_node:
-                o.setConnectedNode(correction_node)
+        # Connect everything using the node to the correction node instead
+        for consumer in consumers.get(mtlx_node.getName(), []):
+            consumer.setConnectedNode(correction_node)
 
         # Change the color space setting for filenames on the node to linear
-        for p in image.getParameters():
+        for p in mtlx_node.getParameters():
             if p.getType() != 'filename':
                 # Skip non-filename paramters
                 continue
@@ -1553,6 +1891,7 @@ def convertSRGBToLinear(mtlx_document, mtlx_search_path):
             if cs == 'srgb_texture':
                 p.setColorSpace('linear')
 
+    images_to_convert = []
     all_image_nodes = findImageNodes(mtlx_document)
     for image in all_image_nodes:
         if image.getNamespace() != '':
@@ -1577,10 +1916,27 @@ def convertSRGBToLinear(mtlx_document, mtlx_search_path):
                                image.getName()))
             continue
         if needs_conversion:
-            _addSrgbToLinearConversion(image, mtlx_document, mtlx_search_path)
+            images_to_convert.append(image)
+
+    if not images_to_convert:
+        return
+    if not mtlxDocContainsModule('alglib', mtlx_document):
+        importMtlxDocsForModule('alglib', mtlx_document, mtlx_search_path)
+
+    # The consumers are indexed before adding any correction node so the
+    # correction nodes themselves are not rewired
+    consumers_by_graph = {}
+    for image in images_to_convert:
+        parent = image.getParent()
+        assert (isinstance(parent, mtx.NodeGraph))
+        graph_path = parent.getNamePath()
+        if graph_path not in consumers_by_graph:
+            consumers_by_graph[graph_path] = _findConsumers(parent)
+        _addSrgbToLinearConversion(image, consumers_by_graph[graph_path])
 
 
 def findRootNode(sd_graph):
+    root_identifier = _getRootIdentifier(sd_graph)
     for sd_node in sd_graph.getNodes():
-        if _isRoot(sd_node, sd_graph):
+        if sd_node.getIdentifier() == root_identifier:
             return sd_node
@@ -19,12 +19,16 @@
 # module would have the following layout in MaterialX coming out of the system
 # fruit/apple/*.mtlx meaning all files in the apple directory constitutes the
 # apple module.
+import fnmatch
 import logging
 import os
+import pickle
+import threading
 
 import MaterialX as mx
 from .paths import getMatxSearchPathList, \
     getMatxSearchPathString, \
+    getTempDirectory, \
     makeConsistentPath
 import mx_utils 
 
@@ -53,71 +57,378 @@ def _getMtlxSearchPathList(search_path):
         return getMatxSearchPathList()
 
 
-def getMtlxModuleDocs(module, mtlx_search_path=None, absolute=False):
-    import glob
+def _lookupKey(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def _isMtlxDocName(file_name):
+    # Same filter as glob with *.mtlx, hidden files are skipped
+    return not file_name.startswith('.') and \
+        fnmatch.fnmatch(file_name, '*.mtlx')
+
+
+class ModuleCatalog:
+    '''
+    Index of the materialx documents in a list of search paths. The search
+    paths are scanned once and the index is rescanned when the modification
+    time of a directory it covers changes.
+    '''
+
+    def __init__(self, search_path_list):
+        '''
+        :param search_path_list: Search paths in shadowing order
+        :type search_path_list: [str]
+        '''
+        self.search_path_list = list(search_path_list)
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _scan(self):
+        # For each search path a dict of lookup key to the module path
+        # relative to the search path and the file names in it
+        self._directories = []
+        # Lookup key of every scanned directory, and each search path, to
+        # its modification time. None for missing search paths
+        self._directory_mtimes = {}
+        for search_path in self.search_path_list:
+            directories = {}
+            self._directory_mtimes[_lookupKey(search_path)] = \
+                self._getMtime(search_path)
+            for root, dirs, files in os.walk(search_path):
+                relative_path = os.path.relpath(root, search_path)
+                directories[_lookupKey(relative_path)] = (
+                    makeConsistentPath(relative_path), sorted(files))
+                self._directory_mtimes[_lookupKey(root)] = \
+                    self._getMtime(root)
+            self._directories.append(directories)
+
+    @staticmethod
+    def _getMtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _isModuleCurrent(self, module):
+        for search_path in self.search_path_list:
+            module_dir = os.path.join(search_path, module)
+            if self._directory_mtimes.get(_lookupKey(module_dir), None) != \
+                    self._getMtime(module_dir):
+                return False
+        return True
+
+    def _isCurrent(self):
+        for directory, mtime in self._directory_mtimes.items():
+            if mtime != self._getMtime(directory):
+                return False
+        return True
+
+    def getModuleDocs(self, module, absolute=False):
+        '''
+        Finds the documents of a module. Documents in a search path shadow
+        documents with the same name in later search paths
+        :param module: The module path
+        :param absolute: Return absolute paths instead of include paths
+        :return: sorted list of paths
+        '''
+        with self._lock:
+            if not self._isModuleCurrent(module):
+                self._scan()
+            result = set()
+            result_abs = set()
+            key = _lookupKey(module)
+            for search_path, directories in zip(self.search_path_list,
+                                                self._directories):
+                _, files = directories.get(key, (None, []))
+                for f in files:
+                    if not _isMtlxDocName(f):
+                        continue
+                    # Produce the include relative filename for the document
+                    p = makeConsistentPath(os.path.join(module, f))
+                    if p not in result:
+                        # Skip documents shadowed by a document earlier in the
+                        # search path
+                        result.add(p)
+                        abs_path = makeConsistentPath(
+                            os.path.join(search_path, p))
+                        result_abs.add(abs_path)
+        if absolute:
+            return sorted(result_abs)
+        else:
+            return sorted(result)
+
+    def getAllModules(self):
+        '''
+        :return: sorted list of all module paths containing documents
+        '''
+        with self._lock:
+            if not self._isCurrent():
+                self._scan()
+            all_modules = set()
+            for directories in self._directories:
+                for module_path, files in directories.values():
+                    if any([os.path.splitext(f)[1] == '.mtlx'
+                            for f in files]):
+                        all_modules.add(module_path)
+        return sorted(all_modules)
+
+
+_module_catalogs = {}
+_module_catalogs_lock = threading.Lock()
+
+
+def getModuleCatalog(mtlx_search_path=None):
+    '''
+    Gets the catalog for a search path string, shared by the process
+    :return: ModuleCatalog
+    '''
     if mtlx_search_path == None:
         mtlx_search_path = getMatxSearchPathString()
-    mtlx_search_path_list = _getMtlxSearchPathList(mtlx_search_path)
-    result = set()
-    result_abs = set()
-    for search_path in mtlx_search_path_list:
-        matching_files = glob.glob1(os.path.join(search_path, module),
-                                    '*.mtlx')
-        for f in matching_files:
-            # Produce the include relative filename for the document
-            p = makeConsistentPath(os.path.join(module,
-                                                os.path.basename(f)))
-            if p not in result:
-                # Check if the file is known before adding to avoid adding
-                # absolute paths shadowed by a file earlier in the search path
-                result.add(p)
-                abs_path = makeConsistentPath(os.path.join(search_path, p))
-                result_abs.add(abs_path)
-
-    if absolute:
-        return sorted(result_abs)
-    else:
-        return sorted(result)
+    with _module_catalogs_lock:
+        catalog = _module_catalogs.get(mtlx_search_path, None)
+        if catalog is None:
+            catalog = ModuleCatalog(_getMtlxSearchPathList(mtlx_search_path))
+            _module_catalogs[mtlx_search_path] = catalog
+        return catalog
 
 
-def importMtlxDocsForModule(module,
-                            mtlx_document,
-                            mtlx_search_path=None):
+def getMtlxModuleDocs(module, mtlx_search_path=None, absolute=False):
     if mtlx_search_path == None:
         mtlx_search_path = getMatxSearchPathString()
-    module_docs = getMtlxModuleDocs(module,
-                                    mtlx_search_path)
-    for module_doc in module_docs:
+    return getModuleCatalog(mtlx_search_path).getModuleDocs(module, absolute)
+
+
+# Parsed module libraries shared by all exports in the process.
+# Maps (module, search path) to (fingerprint, document) where the fingerprint
+# identifies the state of the source files the document was parsed from
+_library_cache = {}
+_library_cache_lock = threading.Lock()
+
+
+def _getModuleFingerprint(module, mtlx_search_path):
+    '''
+    Identifies the current state of the documents making up a module
+    without reading them
+    :return: tuple of (path, modification time, size) for each document
+    '''
+    fingerprint = []
+    for doc_path in getMtlxModuleDocs(module, mtlx_search_path,
+                                      absolute=True):
+        try:
+            st = os.stat(doc_path)
+            fingerprint.append((doc_path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            fingerprint.append((doc_path, None, None))
+    return tuple(fingerprint)
+
+
+def _loadModuleLibrary(module, mtlx_search_path):
+    library = mx.createDocument()
+    for module_doc in getMtlxModuleDocs(module, mtlx_search_path):
         doc = mx.createDocument()
         mx.readFromXmlFile(doc,
                            module_doc,
                            mtlx_search_path)
-        mx_utils.importSkipConflicting(mtlx_document, doc)
+        mx_utils.importSkipConflicting(library, doc)
+    return library
+
+
+def getModuleLibrary(module, mtlx_search_path=None):
+    '''
+    Gets a document with the content of all documents in a module. The
+    document is parsed once and reused until any of its source documents
+    change on disk. The returned document is shared and must not be modified
+    :param module: The module to load
+    :param mtlx_search_path: Search path string to resolve the module in
+    :return: mx.Document
+    '''
+    if mtlx_search_path == None:
+        mtlx_search_path = getMatxSearchPathString()
+    key = (module, mtlx_search_path)
+    fingerprint = _getModuleFingerprint(module, mtlx_search_path)
+    with _library_cache_lock:
+        cached = _library_cache.get(key, None)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        logger.debug('Loading MaterialX library for module {}'.format(module))
+        library = _loadModuleLibrary(module, mtlx_search_path)
+        _library_cache[key] = (fingerprint, library)
+        return library
+
+
+def clearModuleLibraryCache():
+    with _library_cache_lock:
+        _library_cache.clear()
+
+
+def importMtlxDocsForModule(module,
+                            mtlx_document,
+                            mtlx_search_path=None):
+    if mtlx_search_path == None:
+        mtlx_search_path = getMatxSearchPathString()
+    library = getModuleLibrary(module, mtlx_search_path)
+    mx_utils.importSkipConflicting(mtlx_document, library)
+
+
+# Size of the blocks read when hashing documents
+_HASH_CHUNK_SIZE = 1 << 20
+
+# Maps (module, search path) to (fingerprint, digest)
+_module_hash_cache = {}
+_module_hash_cache_lock = threading.Lock()
+
+
+def _hashDocument(doc_path, hasher):
+    '''
+    Hashes a document with its line endings normalized to LF so the digest is
+    the same on all platforms
+    '''
+    pending_cr = False
+    with open(doc_path, 'rb') as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            if pending_cr:
+                chunk = b'\r' + chunk
+            # A \r at the end of the chunk may be the start of a \r\n
+            pending_cr = chunk.endswith(b'\r')
+            if pending_cr:
+                chunk = chunk[:-1]
+            hasher.update(chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n'))
+    if pending_cr:
+        hasher.update(b'\n')
 
 
 def hashMtlxDocsForModule(module,
                           mtlx_search_path=None):
+    '''
+    Hashes the content of the documents of a module. Only the documents
+    resolved through the search path are hashed, not the ones they shadow.
+    The digest is cached until any of the documents change on disk
+    :return: str
+    '''
     if mtlx_search_path == None:
         mtlx_search_path = getMatxSearchPathString()
-    module_docs = getMtlxModuleDocs(module,
-                                    mtlx_search_path)
+    key = (module, mtlx_search_path)
+    fingerprint = _getModuleFingerprint(module, mtlx_search_path)
+    with _module_hash_cache_lock:
+        cached = _module_hash_cache.get(key, None)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
     import hashlib
     hasher = hashlib.md5()
-    for module_doc in module_docs:
-        found_doc = False
-        for p in _getMtlxSearchPathList(mtlx_search_path):
-            try:
-                with open(os.path.join(p, module_doc), 'r') as f:
-                    for l in f.readlines():
-                        hasher.update(l.encode())
-                    found_doc = True
-                    continue
-            except FileNotFoundError:
-                # Ignore invalid search path
-                pass
-        if not found_doc:
-            raise ModuleError('Can\'t find source doucment for {} when hashing contents'.format(module_doc))
-    return hasher.hexdigest()
+    for doc_path, mtime, size in fingerprint:
+        if mtime is None:
+            raise ModuleError('Can\'t find source doucment for {} when hashing contents'.format(doc_path))
+        _hashDocument(doc_path, hasher)
+    digest = hasher.hexdigest()
+    with _module_hash_cache_lock:
+        _module_hash_cache[key] = (fingerprint, digest)
+    return digest
+
+
+# Bumped whenever the layout of the nodedef index changes so stale pickles
+# are ignored
+_NODEDEF_INDEX_VERSION = 1
+
+# Maps (module, search path) to (fingerprint, index)
+_nodedef_index_cache = {}
+_nodedef_index_cache_lock = threading.Lock()
+
+
+def _buildNodeDefIndex(library):
+    index = {}
+    for nd in library.getNodeDefs():
+        all_types = tuple(i.getType() for i in nd.getInputs() +
+                          nd.getParameters())
+        entry = (nd.getName(), nd.getType(), len(nd.getInputs()),
+                 len(nd.getParameters()))
+        signatures = index.setdefault(nd.getNodeString(), {})
+        signatures[(nd.getType(), all_types)] = entry
+        # In certain circumstances we have a non output
+        # This should be safe since it implies nothing is connected
+        signatures[(None, all_types)] = entry
+    return index
+
+
+def _getNodeDefIndexFile(module, mtlx_search_path):
+    digest = hashMtlxDocsForModule(module, mtlx_search_path)
+    return os.path.join(getTempDirectory(), 'nodedef_index',
+                        '{}_v{}.pickle'.format(digest,
+                                                _NODEDEF_INDEX_VERSION))
+
+
+def _loadNodeDefIndex(index_file):
+    try:
+        with open(index_file, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except BaseException as e:
+        logger.warning('Failed to read nodedef index {}: {}'.format(
+            index_file, str(e)))
+        return None
+
+
+def _saveNodeDefIndex(index_file, index):
+    try:
+        index_dir = os.path.dirname(index_file)
+        if not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        tmp_file = '{}.{}.tmp'.format(index_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(index, f)
+        os.replace(tmp_file, index_file)
+    except BaseException as e:
+        logger.warning('Failed to write nodedef index {}: {}'.format(
+            index_file, str(e)))
+
+
+def getModuleNodeDefIndex(module, mtlx_search_path=None, persistent=True):
+    '''
+    Gets an index of the nodedefs of a module by signature. The index is
+    built once for the content of the module and reused until any of its
+    documents change on disk.
+    The index maps node names to a dict from (output type, tuple of input and
+    parameter types) to (nodedef name, output type, input count,
+    parameter count). The output type None matches any output type.
+    When several nodedefs of the module share a signature the last one in
+    the module wins, like when scanning the document
+    :param module: The module to index
+    :param mtlx_search_path: Search path string to resolve the module in
+    :param persistent: Store the index in the temp directory so it survives
+    between sessions
+    :return: dict
+    '''
+    if mtlx_search_path == None:
+        mtlx_search_path = getMatxSearchPathString()
+    key = (module, mtlx_search_path)
+    fingerprint = _getModuleFingerprint(module, mtlx_search_path)
+    with _nodedef_index_cache_lock:
+        cached = _nodedef_index_cache.get(key, None)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+    index = None
+    index_file = None
+    if persistent:
+        try:
+            index_file = _getNodeDefIndexFile(module, mtlx_search_path)
+        except BaseException as e:
+            # Only the in memory index is used then
+            logger.warning('Failed to locate nodedef index for module '
+                           '{}: {}'.format(module, str(e)))
+    if index_file:
+        index = _loadNodeDefIndex(index_file)
+    if index is None:
+        logger.debug('Indexing nodedefs for module {}'.format(module))
+        index = _buildNodeDefIndex(getModuleLibrary(module,
+                                                    mtlx_search_path))
+        if index_file:
+            _saveNodeDefIndex(index_file, index)
+    with _nodedef_index_cache_lock:
+        _nodedef_index_cache[key] = (fingerprint, index)
+    return index
 
 
 def loadMtlxDocsForModule(module,
@@ -139,15 +450,9 @@ def getMdlNamespaceForModule(module):
 
 
 def getAllMtlxModules(search_path=None):
-    mtlx_search_path_list = _getMtlxSearchPathList(search_path)
-    allMtlxModules = set()
-    for p in mtlx_search_path_list:
-        for root, dirs, files in os.walk(p):
-            if any([os.path.splitext(p)[1] == '.mtlx' for p in files]):
-                module_path = os.path.relpath(root, p)
-                allMtlxModules.add(makeConsistentPath(module_path))
-    # Sort result to make result deterministic
-    return sorted(allMtlxModules)
+    if not search_path:
+        search_path = getMatxSearchPathString()
+    return getModuleCatalog(search_path).getAllModules()
 
 
 def getMdlModulePathFromMtlxElement(element):
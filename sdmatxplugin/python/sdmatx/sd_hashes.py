@@ -67,6 +67,20 @@ def hash_type(type, hash):
     if type:
         hash.update(type.getId().encode('utf-8'))
 
+def hash_connection(connection, hash):
+    '''
+    Hashes the node and output a connection comes from
+    :param connection: the connection to hash
+    :type connection: sd.api.sdconnection.SDConnection
+    :return: the identifier of the connected node
+    '''
+    id = connection.getInputPropertyNode().getIdentifier()
+    hash.update(id.encode('utf-8'))
+    # The output matters for nodes with several outputs
+    hash.update(connection.getInputProperty().getId().encode('utf-8'))
+    return id
+
+
 def hash_property(property, node, hash):
     '''
     :param property: the property to hash
@@ -91,6 +105,21 @@ def hash_property(property, node, hash):
         hash_value(property.getDefaultValue(), hash)
 
 
+def _hash_node_property(property, node, hash):
+    '''
+    Hashes a node property like hash_property but includes the output each
+    connection comes from. Kept apart so hash_graph digests don't change
+    '''
+    hash.update(property.getId().encode('utf-8'))
+    hash_type(property.getType(), hash)
+    connections = node.getPropertyConnections(property)
+    if len(connections) > 0:
+        for c in connections:
+            hash_connection(c, hash)
+    else:
+        hash_value(node.getPropertyValue(property), hash)
+
+
 def hash_graph(graph, hash):
     '''
     :param graph: the graph to hash
@@ -100,7 +129,267 @@ def hash_graph(graph, hash):
     hash.update(graph.getIdentifier().encode('utf-8'))
     for n in graph.getNodes():
         hash_node(n, hash)
+    _hash_graph_interface(graph, hash)
+
+
+def _hash_graph_interface(graph, hash):
     for p in _get_all_properties(graph):
         hash_property(p, None, hash)
     for o in graph.getOutputNodes():
         hash.update(o.getIdentifier().encode('utf-8'))
+
+
+def hash_graph_interface(graph, hash):
+    '''
+    Hashes everything in the graph except its nodes
+    :param graph: the graph to hash
+    :type graph: sd.api.mdl.sdmdlgraph.SDMDLGraph
+    :return:
+    '''
+    hash.update(graph.getIdentifier().encode('utf-8'))
+    _hash_graph_interface(graph, hash)
+
+
+def _get_referenced_resource(node):
+    get_referenced_resource = getattr(node, 'getReferencedResource', None)
+    if not callable(get_referenced_resource):
+        return None
+    return get_referenced_resource()
+
+
+def _hash_referenced_resource(resource, hash, visited):
+    from sd.api.sbs.sdsbscompgraph import SDSBSCompGraph
+    import os
+    url = resource.getUrl()
+    hash.update(url.encode('utf-8'))
+    if isinstance(resource, SDSBSCompGraph):
+        # Instanced graphs are hashed by content so unsaved edits to them
+        # are noticed
+        if url not in visited:
+            _hash_comp_graph(resource, hash, visited)
+        return
+    get_file_path = getattr(resource, 'getFilePath', None)
+    if callable(get_file_path):
+        # Resources linking to files such as bitmaps
+        file_path = get_file_path()
+        if file_path:
+            hash.update(file_path.encode('utf-8'))
+            if os.path.isfile(file_path):
+                hash.update(str(os.stat(file_path).st_mtime_ns).encode(
+                    'utf-8'))
+
+
+def _hash_comp_graph(graph, hash, visited):
+    from sd.api.sdproperty import SDPropertyCategory
+    visited.add(graph.getUrl())
+    hash.update(graph.getIdentifier().encode('utf-8'))
+    for n in graph.getNodes():
+        hash.update(n.getIdentifier().encode('utf-8'))
+        definition = n.getDefinition()
+        if definition:
+            hash.update(definition.getId().encode('utf-8'))
+        resource = _get_referenced_resource(n)
+        if resource is not None:
+            _hash_referenced_resource(resource, hash, visited)
+        for category in [SDPropertyCategory.Input,
+                         SDPropertyCategory.Annotation]:
+            for p in n.getProperties(category):
+                _hash_node_property(p, n, hash)
+    # Graph inputs such as the output size
+    for p in graph.getProperties(SDPropertyCategory.Input):
+        hash.update(p.getId().encode('utf-8'))
+        hash_value(graph.getPropertyValue(p), hash)
+    for o in graph.getOutputNodes():
+        hash.update(o.getIdentifier().encode('utf-8'))
+
+
+def hash_comp_graph(graph, hash):
+    '''
+    Hashes what the textures computed by a compositing graph depend on,
+    including the graphs and resources its nodes instance. Output values are
+    skipped since they hold the computed textures
+    :param graph: the graph to hash
+    :type graph: sd.api.sbs.sdsbscompgraph.SDSBSCompGraph
+    :return:
+    '''
+    _hash_comp_graph(graph, hash, set())
+
+
+def _hash_node_local(node, hash):
+    '''
+    Hashes the node like hash_node but also returns the identifiers of the
+    nodes connected to its inputs
+    :param node: the node to hash
+    :type node: sd.api.mdl.sdmdlnode.SDMDLNode
+    :return: list of upstream node identifiers
+    '''
+    from sd.api.sdproperty import SDPropertyCategory
+    hash.update(node.getIdentifier().encode('utf-8'))
+    upstream = []
+    for category in [SDPropertyCategory.Input,
+                     SDPropertyCategory.Output,
+                     SDPropertyCategory.Annotation]:
+        for p in node.getProperties(category):
+            hash.update(p.getId().encode('utf-8'))
+            hash_type(p.getType(), hash)
+            connections = node.getPropertyConnections(p)
+            if len(connections) > 0:
+                for c in connections:
+                    id = hash_connection(c, hash)
+                    if category == SDPropertyCategory.Input:
+                        upstream.append(id)
+            else:
+                hash_value(node.getPropertyValue(p), hash)
+    return upstream
+
+
+def hash_graph_nodes(graph, hash_factory=sha3_256):
+    '''
+    Hashes every node of the graph on its own. Since connections are hashed
+    by the identifier of the connected node a digest only changes when the
+    node itself is edited
+    :param graph: the graph to hash
+    :type graph: sd.api.mdl.sdmdlgraph.SDMDLGraph
+    :param hash_factory: creates a new hash object
+    :return: dict mapping node identifiers to hex digests
+    '''
+    digests = {}
+    for n in graph.getNodes():
+        hash = hash_factory()
+        _hash_node_local(n, hash)
+        digests[n.getIdentifier()] = hash.hexdigest()
+    return digests
+
+
+class MerkleGraphHasher:
+    '''
+    Hashes a graph node by node. The digest of a node combines its own
+    properties with the digests of the nodes connected to its inputs so a
+    change propagates to every node downstream of it. Digests are kept
+    between calls to update to report what changed. The digest of a node is
+    only combined again when the node or a node upstream of it changed.
+    Every update still reads every node and property through the SD API
+    since it has no way of telling which nodes were edited.
+    '''
+
+    def __init__(self, hash_factory=sha3_256):
+        self._hash_factory = hash_factory
+        self.reset()
+
+    def reset(self):
+        self.graph_identifier = None
+        self.root_digest = None
+        # Digest of the node itself, ignoring upstream nodes
+        self.local_digests = {}
+        # Digest of the node and everything upstream of it
+        self.node_digests = {}
+        # Identifiers of the nodes connected to the inputs of each node
+        self._upstream = {}
+        # Nodes whose own properties or connections changed in the last update
+        self.modified_nodes = set()
+        # Nodes whose digest changed in the last update, meaning they or
+        # anything upstream of them changed
+        self.changed_nodes = set()
+        self.interface_changed = True
+        self._interface_digest = None
+
+    def update(self, graph):
+        '''
+        Hashes the graph and updates the changed node sets. Everything is
+        reported as changed if the graph differs from the last update
+        :param graph: the graph to hash
+        :type graph: sd.api.mdl.sdmdlgraph.SDMDLGraph
+        :return: the digest of the whole graph
+        '''
+        graph_identifier = graph.getIdentifier()
+        if graph_identifier != self.graph_identifier:
+            self.reset()
+            self.graph_identifier = graph_identifier
+
+        interface_hash = self._hash_factory()
+        hash_graph_interface(graph, interface_hash)
+        interface_digest = interface_hash.hexdigest()
+        self.interface_changed = interface_digest != self._interface_digest
+        self._interface_digest = interface_digest
+
+        local_digests = {}
+        upstream = {}
+        for n in graph.getNodes():
+            hash = self._hash_factory()
+            upstream_ids = _hash_node_local(n, hash)
+            id = n.getIdentifier()
+            local_digests[id] = hash.hexdigest()
+            upstream[id] = upstream_ids
+
+        node_digests = self._combineDigests(local_digests, upstream)
+
+        self.modified_nodes = {
+            i for i, d in local_digests.items()
+            if self.local_digests.get(i) != d}
+        self.modified_nodes.update(
+            set(self.local_digests.keys()) - set(local_digests.keys()))
+        self.changed_nodes = {
+            i for i, d in node_digests.items()
+            if self.node_digests.get(i) != d}
+        self.changed_nodes.update(
+            set(self.node_digests.keys()) - set(node_digests.keys()))
+        self.local_digests = local_digests
+        self.node_digests = node_digests
+        self._upstream = upstream
+
+        root_hash = self._hash_factory()
+        root_hash.update(interface_digest.encode('utf-8'))
+        for i in sorted(node_digests.keys()):
+            root_hash.update(node_digests[i].encode('utf-8'))
+        self.root_digest = root_hash.hexdigest()
+        return self.root_digest
+
+    def _combineDigests(self, local_digests, upstream):
+        # Post order traversal so upstream digests are known before the nodes
+        # using them
+        node_digests = {}
+        in_progress = set()
+        for start in local_digests.keys():
+            if start in node_digests:
+                continue
+            stack = [(start, False)]
+            while stack:
+                id, expanded = stack.pop()
+                if id in node_digests:
+                    continue
+                if not expanded:
+                    if id in in_progress:
+                        continue
+                    in_progress.add(id)
+                    stack.append((id, True))
+                    for u in upstream[id]:
+                        # Ignore unknown nodes and cycles
+                        if u in local_digests and u not in node_digests \
+                                and u not in in_progress:
+                            stack.append((u, False))
+                    continue
+                in_progress.discard(id)
+                if self._isUnchanged(id, local_digests, upstream,
+                                     node_digests):
+                    node_digests[id] = self.node_digests[id]
+                    continue
+                hash = self._hash_factory()
+                hash.update(local_digests[id].encode('utf-8'))
+                for u in upstream[id]:
+                    hash.update(node_digests.get(u, u).encode('utf-8'))
+                node_digests[id] = hash.hexdigest()
+        return node_digests
+
+    def _isUnchanged(self, id, local_digests, upstream, node_digests):
+        '''
+        :return: True if the node and the nodes upstream of it are the same as
+        in the last update so its previous digest can be reused
+        '''
+        if id not in self.node_digests or \
+                self.local_digests.get(id) != local_digests[id] or \
+                self._upstream.get(id) != upstream[id]:
+            return False
+        for u in upstream[id]:
+            if node_digests.get(u, u) != self.node_digests.get(u, u):
+                return False
+        return True
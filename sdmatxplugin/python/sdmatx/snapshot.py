@@ -0,0 +1,638 @@
+#Copyright 2020 Adobe. All rights reserved.
+#This file is licensed to you under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License. You may obtain a copy
+#of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software distributed under
+#the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+#OF ANY KIND, either express or implied. See the License for the specific language
+#governing permissions and limitations under the License.
+
+'''
+Plain python copies of the parts of an SD graph used when converting it to
+MaterialX. The SD API can only be used on the main thread so the graph is
+copied there and the copy can be converted on any thread.
+The classes implement the subset of the SD API used by mdl2mtlx.
+
+Snapshots can be saved to JSON with saveGraphSnapshot and loaded with
+loadGraphSnapshot, which makes it possible to convert graphs outside of
+Designer. The format is:
+
+{
+  "format": "sdmatx_graph",
+  "version": 1,
+  "graph": {
+    "identifier": "Shader",
+    "output_nodes": ["1234"],
+    "nodes": [
+      {
+        "identifier": "1234",
+        "definition": "mdl::mtlx::stdlib::add(float,float)",
+        "exposed_constant": false,
+        "properties": {
+          "Input": [{"id": "in1", "type": {"id": "float", "uniform": false}}],
+          "Output": [...],
+          "Annotation": [...]
+        },
+        "values": {
+          "in1": {"type": {"id": "float", "uniform": false},
+                  "value": 0.5,
+                  "value_string": "0.5",
+                  "call": null}
+        },
+        "connections": {"in1": ["5678"]}
+      }
+    ]
+  },
+  "package": {"resources": {"pkg:///texture": "/path/to/texture.png"}}
+}
+
+- definition is null for nodes without a definition.
+- properties lists the properties of each category in order.
+- values maps property ids to their value, null when the property has no
+  value. value is the python value when it is a bool, number or string and
+  its string form otherwise. value_string is the MaterialX value string,
+  null when the value can't be converted. call is the value of value calls
+  and null for other values.
+- connections maps the ids of the input properties to the identifiers of
+  the nodes connected to them.
+- package maps the package urls used by the graph to file paths.
+'''
+
+import enum
+import json
+import logging
+
+logger = logging.getLogger("SDMaterialX")
+
+GRAPH_SNAPSHOT_FORMAT = 'sdmatx_graph'
+GRAPH_SNAPSHOT_VERSION = 1
+
+
+class GraphSnapshotException(BaseException):
+    pass
+
+
+class PropertyCategory(enum.Enum):
+    '''
+    Same names as sd.api.sdproperty.SDPropertyCategory so snapshots can be
+    queried without the SD API
+    '''
+    Annotation = 0
+    Input = 1
+    Output = 2
+
+
+def _categoryKey(category):
+    return category.name
+
+
+class SDApiCallCounter:
+    '''
+    Makes SD API calls and counts them
+    '''
+    __slots__ = ('count',)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, method, *args):
+        self.count += 1
+        return method(*args)
+
+
+def _callDirect(method, *args):
+    return method(*args)
+
+
+def sdApiValueToString(sdValue, api_call=None):
+    '''
+    Converts an SD value to a MaterialX value string using the SD API
+    :param sdValue: The value to convert
+    :type sdValue: sd.api.sdvalue.SDValue
+    :param api_call: Used to make the SD API calls, for instance a
+    SDApiCallCounter
+    :return: str
+    '''
+    call = api_call or _callDirect
+    # expect values in the form of: "1.0, 2.0, 3.0" or "foobar"
+
+    # Hack to return something from constructors we don't understand
+    # Specifically added to support texture_2d constructor with parameters
+    value_strings = []
+    sd_type = call(sdValue.getType)
+    full_type_name = call(sd_type.getId)
+    type_name = full_type_name.split('::')[-1]
+    if type_name in ['color2', 'color3', 'color4', 'ColorRGB']:
+
+        if 'SDTypeStruct' in str(sd_type):
+            fields = ['r', 'g', 'b', 'a']
+            for field in fields:
+                member = call(sdValue.getPropertyValueFromId, field)
+                if member:
+                    value_strings.append(str(call(member.get)))
+                else:
+                    break
+        else:
+            # TODO verify standard color/color3
+            # string coming in is: r: ..., g: ..., etc...
+            tokens = str(call(sdValue.get)).split(',')
+            for token in tokens:
+                value_strings.append(token.split(":")[-1])
+    elif type_name in ['float2', 'float3', 'float4']:
+        # string coming in is: x: ..., y: ..., etc...
+        tokens = str(call(sdValue.get)).split(',')
+        for token in tokens:
+            value_strings.append(token.split(":")[-1])
+    elif type_name == 'bool':
+        value_strings = [str(call(sdValue.get)).lower()]
+    elif type_name == 'texture_2d':
+        # If there is a string, set it as filename
+        return call(sdValue.getValue)
+    elif type_name.startswith('matrix'):
+        # Matrices are in row major order
+        values = []
+        for r in range(call(sdValue.getRowCount)):
+            for c in range(call(sdValue.getColumnCount)):
+                # Todo: are row and column swapped in getItem?
+                values.append(str(call(call(sdValue.getItem, r, c).get)))
+        return ','.join(values)
+    else:
+        value_strings = str(call(sdValue.get)).split(';')
+
+    if 'color' in type_name or 'float' in type_name:
+        for i in range(len(value_strings)):
+            # ensure this is a decimal
+            if not '.' in value_strings[i]:
+                value_strings[i] += ".0"
+
+    return ','.join(value_strings)
+
+
+class SnapshotType:
+    __slots__ = ('id', 'is_uniform')
+
+    def __init__(self, id, is_uniform=False):
+        self.id = id
+        self.is_uniform = is_uniform
+
+    def getId(self):
+        return self.id
+
+
+class SnapshotValue:
+    '''
+    A value along with its MaterialX value string
+    '''
+    __slots__ = ('type', 'value', 'value_string', 'is_call', 'call_value')
+
+    def __init__(self, type, value, value_string, is_call=False,
+                 call_value=None):
+        self.type = type
+        self.value = value
+        self.value_string = value_string
+        self.is_call = is_call
+        self.call_value = call_value
+
+    def getType(self):
+        return self.type
+
+    def get(self):
+        return self.value
+
+    def getValue(self):
+        # Value calls and texture references
+        if self.is_call:
+            return self.call_value
+        return self.value_string
+
+
+class SnapshotProperty:
+    __slots__ = ('id', 'type')
+
+    def __init__(self, id, type):
+        self.id = id
+        self.type = type
+
+    def getId(self):
+        return self.id
+
+    def getType(self):
+        return self.type
+
+
+class SnapshotConnection:
+    __slots__ = ('_graph', 'node_identifier')
+
+    def __init__(self, graph, node_identifier):
+        self._graph = graph
+        self.node_identifier = node_identifier
+
+    def getInputPropertyNode(self):
+        return self._graph.getNodeFromId(self.node_identifier)
+
+
+class SnapshotDefinition:
+    __slots__ = ('id',)
+
+    def __init__(self, id):
+        self.id = id
+
+    def getId(self):
+        return self.id
+
+
+class SnapshotNode:
+    __slots__ = ('identifier', 'definition', 'is_exposed_constant',
+                 'properties', 'values', 'connections')
+
+    def __init__(self, identifier, definition, is_exposed_constant):
+        self.identifier = identifier
+        self.definition = definition
+        self.is_exposed_constant = is_exposed_constant
+        # Category name to list of properties
+        self.properties = {}
+        # Property id to value and connections
+        self.values = {}
+        self.connections = {}
+
+    def getIdentifier(self):
+        return self.identifier
+
+    def getDefinition(self):
+        return self.definition
+
+    def isExposed(self):
+        return self.is_exposed_constant
+
+    def getProperties(self, category):
+        return self.properties.get(_categoryKey(category), [])
+
+    def getPropertyFromId(self, id, category):
+        for p in self.getProperties(category):
+            if p.getId() == id:
+                return p
+        return None
+
+    def getPropertyValue(self, property):
+        return self.values.get(property.getId())
+
+    def getPropertyValueFromId(self, id, category):
+        p = self.getPropertyFromId(id, category)
+        if p is None:
+            return None
+        return self.getPropertyValue(p)
+
+    def getPropertyConnections(self, property):
+        return self.connections.get(property.getId(), [])
+
+
+class SnapshotGraph:
+    __slots__ = ('identifier', 'nodes', 'output_node_identifiers',
+                 '_node_map', 'api_call_count')
+
+    def __init__(self, identifier):
+        self.identifier = identifier
+        self.nodes = []
+        self.output_node_identifiers = []
+        self._node_map = {}
+        # SD API calls made to take the snapshot
+        self.api_call_count = 0
+
+    def addNode(self, node):
+        self.nodes.append(node)
+        self._node_map[node.getIdentifier()] = node
+
+    def getIdentifier(self):
+        return self.identifier
+
+    def getNodes(self):
+        return self.nodes
+
+    def getNodeFromId(self, identifier):
+        return self._node_map.get(identifier)
+
+    def getOutputNodes(self):
+        return [self._node_map[i] for i in self.output_node_identifiers
+                if i in self._node_map]
+
+
+class SnapshotResource:
+    __slots__ = ('file_path',)
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def getFilePath(self):
+        return self.file_path
+
+
+class SnapshotPackage:
+    '''
+    Resolves the package urls referenced by a graph snapshot
+    '''
+    __slots__ = ('resources',)
+
+    def __init__(self, resources=None):
+        # Url to file path
+        self.resources = resources or {}
+
+    def findResourceFromUrl(self, url):
+        file_path = self.resources.get(url)
+        if file_path is None:
+            return None
+        return SnapshotResource(file_path)
+
+
+def _snapshotType(sd_type, call):
+    if not sd_type:
+        return None
+    is_uniform = False
+    get_modifier = getattr(sd_type, 'getModifier', None)
+    if get_modifier is not None:
+        from sd.api.mdl.sdmdltype import SDTypeModifier
+        is_uniform = call(get_modifier) is SDTypeModifier.Uniform
+    return SnapshotType(call(sd_type.getId), is_uniform)
+
+
+def _snapshotValue(sd_value, call):
+    from sd.api.mdl.sdmdlvaluecall import SDMDLValueCall
+    if not sd_value:
+        return None
+    value_type = _snapshotType(call(sd_value.getType), call)
+    if isinstance(sd_value, SDMDLValueCall):
+        return SnapshotValue(value_type, None, None, is_call=True,
+                             call_value=call(sd_value.getValue))
+    try:
+        value_string = sdApiValueToString(sd_value, call)
+    except BaseException:
+        # Not every value type is convertible, this only fails if the
+        # value is used when converting
+        value_string = None
+    get = getattr(sd_value, 'get', None)
+    value = None
+    if get is not None:
+        try:
+            value = call(get)
+        except BaseException:
+            value = None
+    return SnapshotValue(value_type, value, value_string)
+
+
+def snapshotGraph(sd_graph, api_call=None):
+    '''
+    Copies the graph so it can be converted without using the SD API. Every
+    fact used by the conversion is read once
+    :param sd_graph: The graph to copy
+    :type sd_graph: sd.api.mdl.sdmdlgraph.SDMDLGraph
+    :param api_call: Counter for the SD API calls. A new one is used if None
+    :type api_call: SDApiCallCounter
+    :return: SnapshotGraph
+    '''
+    from sd.api.sdproperty import SDPropertyCategory
+    from sd.api.mdl.sdmdlconstantnode import SDMDLConstantNode
+    call = api_call if api_call is not None else SDApiCallCounter()
+    start_count = call.count
+    categories = [SDPropertyCategory.Input,
+                  SDPropertyCategory.Output,
+                  SDPropertyCategory.Annotation]
+    graph = SnapshotGraph(call(sd_graph.getIdentifier))
+    for sd_node in call(sd_graph.getNodes):
+        sd_definition = call(sd_node.getDefinition)
+        definition = SnapshotDefinition(call(sd_definition.getId)) \
+            if sd_definition is not None else None
+        is_exposed_constant = isinstance(sd_node, SDMDLConstantNode) and \
+            call(sd_node.isExposed)
+        node = SnapshotNode(call(sd_node.getIdentifier), definition,
+                            is_exposed_constant)
+        for category in categories:
+            properties = []
+            for p in call(sd_node.getProperties, category):
+                property = SnapshotProperty(call(p.getId),
+                                            _snapshotType(call(p.getType),
+                                                          call))
+                properties.append(property)
+                node.values[property.id] = _snapshotValue(
+                    call(sd_node.getPropertyValue, p), call)
+                if category == SDPropertyCategory.Input:
+                    node.connections[property.id] = [
+                        SnapshotConnection(
+                            graph,
+                            call(call(c.getInputPropertyNode).getIdentifier))
+                        for c in call(sd_node.getPropertyConnections, p)]
+            node.properties[_categoryKey(category)] = properties
+        graph.addNode(node)
+    graph.output_node_identifiers = [
+        call(o.getIdentifier) for o in call(sd_graph.getOutputNodes)]
+    graph.api_call_count = call.count - start_count
+    logger.debug('Snapshot of graph {} made {} SD API calls'.format(
+        graph.identifier, graph.api_call_count))
+    return graph
+
+
+def snapshotPackage(sd_package, graph, api_call=None):
+    '''
+    Resolves all package urls used in a graph snapshot
+    :param sd_package: The package the graph lives in
+    :type sd_package: sd.api.sdpackage.SDPackage
+    :param graph: The graph snapshot
+    :type graph: SnapshotGraph
+    :param api_call: Counter for the SD API calls
+    :type api_call: SDApiCallCounter
+    :return: SnapshotPackage
+    '''
+    call = api_call or _callDirect
+    resources = {}
+    if sd_package is None:
+        return SnapshotPackage(resources)
+    for node in graph.getNodes():
+        for value in node.values.values():
+            if value is None or value.value_string is None:
+                continue
+            url = value.value_string.strip()
+            if url.startswith('pkg://') and url not in resources:
+                resource = call(sd_package.findResourceFromUrl, url)
+                if resource is not None:
+                    resources[url] = call(resource.getFilePath)
+    return SnapshotPackage(resources)
+
+
+def isSnapshot(graph):
+    '''
+    Checks if a graph is a snapshot rather than a live SD graph
+    '''
+    return isinstance(graph, SnapshotGraph)
+
+
+def _serializableValue(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _typeToDict(type):
+    if type is None:
+        return None
+    return {'id': type.id, 'uniform': type.is_uniform}
+
+
+def _typeFromDict(data):
+    if data is None:
+        return None
+    return SnapshotType(data['id'], data.get('uniform', False))
+
+
+def _valueToDict(value):
+    if value is None:
+        return None
+    return {'type': _typeToDict(value.type),
+            'value': _serializableValue(value.value),
+            'value_string': value.value_string,
+            'call': value.call_value if value.is_call else None}
+
+
+def _valueFromDict(data):
+    if data is None:
+        return None
+    call_value = data.get('call', None)
+    return SnapshotValue(_typeFromDict(data.get('type', None)),
+                         data.get('value', None),
+                         data.get('value_string', None),
+                         is_call=call_value is not None,
+                         call_value=call_value)
+
+
+def graphSnapshotToDict(graph, package=None):
+    '''
+    Converts a graph snapshot to plain python types, see the module
+    documentation for the layout
+    :type graph: SnapshotGraph
+    :type package: SnapshotPackage
+    :return: dict
+    '''
+    nodes = []
+    for node in graph.getNodes():
+        nodes.append({
+            'identifier': node.identifier,
+            'definition': node.definition.id
+            if node.definition is not None else None,
+            'exposed_constant': node.is_exposed_constant,
+            'properties': {
+                category: [{'id': p.id, 'type': _typeToDict(p.type)}
+                           for p in properties]
+                for category, properties in node.properties.items()},
+            'values': {id: _valueToDict(v) for id, v in node.values.items()},
+            'connections': {
+                id: [c.node_identifier for c in connections]
+                for id, connections in node.connections.items()}
+        })
+    return {
+        'format': GRAPH_SNAPSHOT_FORMAT,
+        'version': GRAPH_SNAPSHOT_VERSION,
+        'graph': {
+            'identifier': graph.identifier,
+            'output_nodes': list(graph.output_node_identifiers),
+            'nodes': nodes
+        },
+        'package': {
+            'resources': dict(package.resources) if package else {}
+        }
+    }
+
+
+def graphSnapshotFromDict(data):
+    '''
+    Creates a graph snapshot from the result of graphSnapshotToDict
+    :type data: dict
+    :return: Tuple of SnapshotGraph and SnapshotPackage
+    '''
+    if data.get('format', None) != GRAPH_SNAPSHOT_FORMAT:
+        raise GraphSnapshotException('Not a graph snapshot')
+    version = data.get('version', None)
+    if version != GRAPH_SNAPSHOT_VERSION:
+        raise GraphSnapshotException(
+            'Unsupported graph snapshot version {}'.format(version))
+    graph_data = data['graph']
+    graph = SnapshotGraph(graph_data['identifier'])
+    for node_data in graph_data['nodes']:
+        definition_id = node_data.get('definition', None)
+        node = SnapshotNode(node_data['identifier'],
+                            SnapshotDefinition(definition_id)
+                            if definition_id is not None else None,
+                            node_data.get('exposed_constant', False))
+        for category, properties in node_data['properties'].items():
+            node.properties[category] = [
+                SnapshotProperty(p['id'], _typeFromDict(p.get('type', None)))
+                for p in properties]
+        for id, value in node_data.get('values', {}).items():
+            node.values[id] = _valueFromDict(value)
+        for id, identifiers in node_data.get('connections', {}).items():
+            node.connections[id] = [SnapshotConnection(graph, i)
+                                    for i in identifiers]
+        graph.addNode(node)
+    graph.output_node_identifiers = list(graph_data.get('output_nodes', []))
+    package = SnapshotPackage(
+        dict(data.get('package', {}).get('resources', {})))
+    return graph, package
+
+
+def saveGraphSnapshot(file_path, graph, package=None):
+    '''
+    Saves a graph to a JSON file that can be converted without Designer
+    :param file_path: The file to write
+    :param graph: A snapshot or a live graph, live graphs are snapshot first
+    :type graph: SnapshotGraph or sd.api.mdl.sdmdlgraph.SDMDLGraph
+    :param package: The package of the graph, live or from a snapshot
+    '''
+    if not isSnapshot(graph):
+        api_call = SDApiCallCounter()
+        graph = snapshotGraph(graph, api_call)
+        package = snapshotPackage(package, graph, api_call)
+    with open(file_path, 'w') as f:
+        json.dump(graphSnapshotToDict(graph, package), f, indent=1,
+                  sort_keys=True)
+
+
+def loadGraphSnapshot(file_path):
+    '''
+    Loads a graph saved with saveGraphSnapshot
+    :return: Tuple of SnapshotGraph and SnapshotPackage
+    '''
+    with open(file_path, 'r') as f:
+        return graphSnapshotFromDict(json.load(f))
+
+
+def isValueCall(value):
+    '''
+    Checks if a value, live or from a snapshot, is a value call
+    '''
+    if isinstance(value, SnapshotValue):
+        return value.is_call
+    if value is None:
+        return False
+    from sd.api.mdl.sdmdlvaluecall import SDMDLValueCall
+    return isinstance(value, SDMDLValueCall)
+
+
+def isExposedConstant(node):
+    '''
+    Checks if a node, live or from a snapshot, is an exposed constant
+    '''
+    if isinstance(node, SnapshotNode):
+        return node.is_exposed_constant
+    if node is None:
+        return False
+    from sd.api.mdl.sdmdlconstantnode import SDMDLConstantNode
+    return isinstance(node, SDMDLConstantNode) and node.isExposed()
+
+
+def isUniformType(type):
+    '''
+    Checks if a type, live or from a snapshot, has the uniform modifier
+    '''
+    if isinstance(type, SnapshotType):
+        return type.is_uniform
+    if type is None:
+        return False
+    from sd.api.mdl.sdmdltype import SDTypeModifier
+    return type.getModifier() is SDTypeModifier.Uniform
@@ -61,19 +61,64 @@ def getGLSLFXOutputFiles(materialx_document):
     return surface_types[referenced_shader]
 
 
+# Url of every resource in the loaded packages to the package it lives in,
+# rebuilt when the loaded packages change
+_package_index = {}
+_package_index_signature = None
+
+
+def __getPackageIdentity(package):
+    # getPackages returns new wrappers on every call so the handle of the
+    # underlying package identifies it. Unsaved packages all have an empty
+    # file path
+    handle = getattr(package, 'mHandle', None)
+    if handle is None:
+        return id(package)
+    return getattr(handle, 'value', handle)
+
+
+def __getPackagesSignature(packages):
+    # Identifies the set of loaded packages
+    return tuple((__getPackageIdentity(p), p.getFilePath()) for p in packages)
+
+
+def __indexPackages(packages):
+    index = {}
+    for p in packages:
+        # Recursive so nested resources are found too
+        for r in p.getChildrenResources(True):
+            index[r.getUrl()] = p
+    return index
+
+
+def clearPackageIndex():
+    global _package_index
+    global _package_index_signature
+    _package_index = {}
+    _package_index_signature = None
+
+
 def getPackageFromResource(resource):
     """
     Finds the package a resource lives in
-    TODO: Is this really this hard?
     """
+    global _package_index
+    global _package_index_signature
+    if __isCallable(resource, 'getPackage'):
+        package = resource.getPackage()
+        if package is not None:
+            return package
     import sd
     url = resource.getUrl()
     pkg_manager = sd.getContext().getSDApplication().getPackageMgr()
-    for p in pkg_manager.getPackages():
-        for r in p.getChildrenResources(False):
-            if r.getUrl() == url:
-                return p
-    return None
+    packages = pkg_manager.getPackages()
+    signature = __getPackagesSignature(packages)
+    if signature == _package_index_signature and url in _package_index:
+        return _package_index[url]
+    # Packages were loaded or unloaded, or the resource is new
+    _package_index = __indexPackages(packages)
+    _package_index_signature = signature
+    return _package_index.get(url, None)
 
 
 def __isCallable(o, method_name):
@@ -87,14 +132,23 @@ def setErrorViewport(target_path):
                              'reset.glslfx'), target_path)
 
 
-def reloadViewport(glslfx_file):
+def reloadViewport(glslfx_file, reset_shader=True):
+    '''
+    Loads the GLSLFX file in the viewport
+    :param glslfx_file: The file to load
+    :param reset_shader: Load the reset shader first so the viewport switches
+    shaders. Skip it when only the uniforms of the file changed to avoid
+    compiling the shader again
+    :type reset_shader: bool
+    '''
     import sd
 
     # Avoid issue if running on SD without loadShader support
     if __isCallable(sd.getContext().getSDApplication(), 'loadShader'):
-        # Hack to reset shader parameters
-        reset_path = os.path.join(getShaderDirectory(), 'reset.glslfx')
-        sd.getContext().getSDApplication().loadShader(reset_path)
+        if reset_shader:
+            # Hack to reset shader parameters
+            reset_path = os.path.join(getShaderDirectory(), 'reset.glslfx')
+            sd.getContext().getSDApplication().loadShader(reset_path)
 
         sd.getContext().getSDApplication().loadShader(glslfx_file)
 
@@ -103,11 +157,24 @@ def extractReferenceUid(url):
     return url.split('=')[-1]
 
 
+# Graph url to a tuple of node count and classification
+_mtlx_graph_cache = {}
+
+
+def __isMtlxNode(n):
+    if n is None:
+        return False
+    definition = n.getDefinition()
+    return definition is not None and \
+        definition.getId().startswith('mdl::mtlx::')
+
+
 def isMtlxGraph(sd_graph):
     '''
     We have no exact way to figure out whether a graph is a materialx graph
     or not so we have to use heuristics. It's neither fool proof nor without
     false positives at this point.
+    The result is cached until the number of nodes in the graph changes
     :param sd_graph: The graph to check
     :type sd_graph: sd.api.sdgraph.SDGraph
     :return:
@@ -116,12 +183,17 @@ def isMtlxGraph(sd_graph):
     if not isinstance(sd_graph, SDMDLGraph):
         # Early out for non-mdl graphs
         return False
-    for n in sd_graph.getNodes():
-        if n is not None:
-            def_id = n.getDefinition().getId()
-            if def_id.startswith('mdl::mtlx::'):
-                return True
-    return False
+    nodes = sd_graph.getNodes()
+    node_count = len(nodes)
+    key = sd_graph.getUrl()
+    cached = _mtlx_graph_cache.get(key, None)
+    if cached and cached[0] == node_count:
+        return cached[1]
+    # The output node is the most likely to be a materialx node
+    result = any(__isMtlxNode(n) for n in sd_graph.getOutputNodes()) or \
+        any(__isMtlxNode(n) for n in nodes)
+    _mtlx_graph_cache[key] = (node_count, result)
+    return result
 
 
 def isKnownMDLIssue(e):
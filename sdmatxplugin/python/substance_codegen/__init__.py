@@ -9,5 +9,7 @@
 #governing permissions and limitations under the License.
 
 from .glslgen import MTLX2GLSLException
-from .mtlx2glslfx import mtlx2GLSLFX, MTLX2GLSLFXException
-from .mtlx2painterglsl import mtlx2PainterGLSL, MTLXPainterGLSLException
+from .mtlx2glslfx import mtlx2GLSLFX, MTLX2GLSLFXException, DesignerTarget
+from .mtlx2painterglsl import mtlx2PainterGLSL, MTLXPainterGLSLException, PainterTarget
+from .exporttargets import export_targets, MtlxTarget
+from .shadercache import ShaderCache, get_shader_cache, set_shader_cache_directory, hash_document
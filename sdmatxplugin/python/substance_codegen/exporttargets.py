@@ -0,0 +1,75 @@
+# Copyright 2020 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+
+# Exports a MaterialX document to several targets generating the shader only
+# once. A target has two steps:
+#   prepare(doc, session, root_material, cache) is called on every target
+#   before anything is generated and returns True if the target is done,
+#   for example because its outputs were cached.
+#   emit(generated, cache) is called on the remaining targets with the
+#   GeneratedShader to post process.
+import MaterialX as mx
+from substance_codegen.glslgen import get_codegen_session, generate_pixel_shader
+from substance_codegen.shadercache import get_shader_cache
+import logging
+
+logger = logging.getLogger("SDMaterialX")
+
+
+class MtlxTarget:
+    '''
+    Export target writing the MaterialX document itself, without the
+    implementation libraries imported for generating shaders
+    '''
+
+    def __init__(self, output_mtlx):
+        self.output_mtlx = output_mtlx
+
+    def prepare(self, doc, session, root_material, cache):
+        logger.info('Creating MaterialX file: %s' % self.output_mtlx)
+        mx.writeToXmlFile(doc, self.output_mtlx)
+        return True
+
+    def emit(self, generated, cache):
+        pass
+
+
+def export_targets(doc,
+                   targets,
+                   matx_doc_paths,
+                   root_material,
+                   use_cache=True):
+    '''
+    Exports doc to every target, generating the pixel shader at most once
+    :param doc:
+    :type doc: mx.Document
+    :param targets: Targets to export to, like DesignerTarget, PainterTarget
+    or MtlxTarget
+    :param matx_doc_paths: List of paths the materialx tool should look in
+    for definition documents
+    :type matx_doc_paths: [str]
+    :param root_material:
+    :type root_material: str
+    :param use_cache: Reuse the outputs generated before from an identical
+    document with the same options
+    :type use_cache: bool
+    :return:
+    '''
+    session = get_codegen_session(matx_doc_paths)
+    cache = get_shader_cache() if use_cache else None
+    # Every target is prepared before generating since generating imports
+    # the libraries into the document
+    pending = [t for t in targets
+               if not t.prepare(doc, session, root_material, cache)]
+    if not pending:
+        return
+    generated = generate_pixel_shader(doc, session, root_material)
+    for t in pending:
+        t.emit(generated, cache)
@@ -8,12 +8,18 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 
+import io
 import os
+import re
+import threading
 
 import MaterialX as mx
 import MaterialX.PyMaterialXGenShader as mxgen
+import MaterialX.PyMaterialXGenGlsl as mxglslgen
 import mx_utils
 
+DEFAULT_IMPL_LIBRARIES = ('stdlib', 'pbrlib', 'bxdf')
+
 
 class MTLX2GLSLException(BaseException):
     pass
@@ -52,16 +58,99 @@ def load_impl_libraries_rec(library_names,
     :type doc: mx.Document
     :return:
     '''
+    for full_path in _find_impl_libraries(library_names, search_path):
+        new_doc = mx.createDocument()
+        mx.readFromXmlFile(new_doc, full_path)
+        mx_utils.importSkipConflicting(doc, new_doc)
+
+
+def _find_impl_libraries(library_names, search_path):
     for library in library_names:
         library_path = os.path.join(search_path, library)
         for dir, subdir_list, file_list in os.walk(library_path):
             for f in file_list:
                 if os.path.splitext(f)[1] == '.mtlx':
                     if 'impl' in f:
-                        new_doc = mx.createDocument()
-                        full_path = os.path.join(dir, f)
-                        mx.readFromXmlFile(new_doc, full_path)
-                        mx_utils.importSkipConflicting(doc, new_doc)
+                        yield os.path.join(dir, f)
+
+
+def _impl_libraries_fingerprint(library_names, matx_doc_paths):
+    fingerprint = []
+    for p in matx_doc_paths:
+        for full_path in _find_impl_libraries(library_names, p):
+            st = os.stat(full_path)
+            fingerprint.append((full_path, st.st_mtime_ns, st.st_size))
+    return tuple(fingerprint)
+
+
+class GLSLCodegenSession:
+    '''
+    Owns the GLSL generator, its color management system and the loaded
+    implementation libraries so they can be reused between code generations.
+    Use the lock when generating since the generator isn't thread safe.
+    '''
+
+    def __init__(self, matx_doc_paths, library_names, fingerprint):
+        '''
+        :param matx_doc_paths: List of paths the materialx tool should look in
+        for definition documents
+        :type matx_doc_paths: [str]
+        :param library_names: Libraries to load implementations from
+        :type library_names: [str]
+        :param fingerprint: Describes the implementation files loaded
+        '''
+        self.matx_doc_paths = list(matx_doc_paths)
+        self.fingerprint = fingerprint
+        self.lock = threading.RLock()
+        self.generator = mxglslgen.GlslShaderGenerator()
+        language = self.generator.getLanguage()
+        self.color_management = \
+            mxgen.DefaultColorManagementSystem.create(language)
+        self.generator.setColorManagementSystem(self.color_management)
+        self.depend_lib = mx.createDocument()
+
+        # Load dependedent libraries
+        for p in self.matx_doc_paths:
+            load_impl_libraries_rec(library_names, p, self.depend_lib)
+
+        self.color_management.loadLibrary(self.depend_lib)
+
+    def create_context(self):
+        '''
+        Creates a context for a single generation. The context caches node
+        implementations by name, including the ones of the graphs being
+        generated, so it's not reused across documents
+        :return: mxgen.GenContext
+        '''
+        context = mxgen.GenContext(self.generator)
+        for p in self.matx_doc_paths:
+            context.registerSourceCodeSearchPath(p)
+        return context
+
+
+_codegen_sessions = {}
+_codegen_sessions_lock = threading.Lock()
+
+
+def get_codegen_session(matx_doc_paths,
+                        library_names=DEFAULT_IMPL_LIBRARIES):
+    '''
+    Returns a codegen session for the search paths. The session is reused
+    until the implementation files in the search paths change
+    :param matx_doc_paths: List of paths the materialx tool should look in
+    for definition documents
+    :type matx_doc_paths: [str]
+    :return: GLSLCodegenSession
+    '''
+    key = (tuple(matx_doc_paths), tuple(library_names))
+    fingerprint = _impl_libraries_fingerprint(library_names, matx_doc_paths)
+    with _codegen_sessions_lock:
+        session = _codegen_sessions.get(key)
+        if session is None or session.fingerprint != fingerprint:
+            session = GLSLCodegenSession(matx_doc_paths, library_names,
+                                         fingerprint)
+            _codegen_sessions[key] = session
+        return session
 
 
 def get_bound_node_graph_and_def(shader_ref, doc):
@@ -173,6 +262,80 @@ def generate_node(element_name,
     return shader
 
 
+class GeneratedShader:
+    '''
+    Pixel stage generated for the first shader ref of a material along with
+    the elements it was generated from. Shared by every target post
+    processing it.
+    '''
+    __slots__ = ('doc', 'shader_ref', 'surface_shader_node_def', 'node_graph',
+                 'node_def', 'imp_node_graph', 'shader', 'glsl')
+
+    def __init__(self, doc, shader_ref, surface_shader_node_def, node_graph,
+                 node_def, imp_node_graph, shader, glsl):
+        self.doc = doc
+        self.shader_ref = shader_ref
+        self.surface_shader_node_def = surface_shader_node_def
+        self.node_graph = node_graph
+        self.node_def = node_def
+        self.imp_node_graph = imp_node_graph
+        # None if no graph is bound to the shader ref
+        self.shader = shader
+        self.glsl = glsl
+
+
+def generate_pixel_shader(doc, session, root_material):
+    '''
+    Generates the pixel stage of the graph bound to the material. Imports the
+    implementation libraries of the session into doc
+    :param doc:
+    :type doc: mx.Document
+    :param session:
+    :type session: GLSLCodegenSession
+    :param root_material: Name of the material to generate
+    :type root_material: str
+    :return: GeneratedShader
+    '''
+    glsl_gen = session.generator
+    context = session.create_context()
+    doc.importLibrary(session.depend_lib)
+    material = doc.getMaterial(root_material)
+
+    # Questionable to just take the first shader ref
+    shader_ref = material.getShaderRefs()[0]
+    surface_shader_node_def = shader_ref.getNodeDef()
+    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
+        shader_ref, doc)
+    shader = None
+    glsl_stream = io.StringIO()
+    if node_graph:
+        # This path is for when there is a graph connected to the
+        # shader ref
+        if not node_def:
+            raise MTLX2GLSLException(
+                'Failed to find node def for graph to generate')
+        target_node = node_graph.getOutputs()[0]
+        name_path = node_def.getNamePath()
+        # skipping path replacement for now
+
+        element_name = mx.createValidName(name_path)
+        with session.lock:
+            shader = generate_node(element_name,
+                                   glsl_gen,
+                                   node_def,
+                                   context,
+                                   target_node,
+                                   glsl_stream)
+    return GeneratedShader(doc,
+                           shader_ref,
+                           surface_shader_node_def,
+                           node_graph,
+                           node_def,
+                           imp_node_graph,
+                           shader,
+                           glsl_stream.getvalue())
+
+
 def replace_symbols(input_stream, output_stream, symbols_to_replace):
     '''
     :param input_stream:
@@ -181,10 +344,11 @@ def replace_symbols(input_stream, output_stream, symbols_to_replace):
     :type output_stream: TextIO
     :return:
     '''
-    indata = input_stream.getvalue()
-    for k, v in symbols_to_replace.items():
-        indata = indata.replace(k, v)
-    output_stream.write(indata)
+    GLSLLineTransformer(symbols_to_replace,
+                        strip_main=False,
+                        strip_version=False,
+                        strip_vertex_data=False).transform(input_stream,
+                                                           output_stream)
 
 
 def remove_main(input_stream, output_stream):
@@ -195,10 +359,10 @@ def remove_main(input_stream, output_stream):
     :type output_stream: TextIO
     :return:
     '''
-    for line in input_stream.readlines():
-        if line.startswith('void main()'):
-            break
-        output_stream.write(line)
+    GLSLLineTransformer(strip_main=True,
+                        strip_version=False,
+                        strip_vertex_data=False).transform(input_stream,
+                                                           output_stream)
 
 
 def remove_version(input_stream, output_stream):
@@ -209,10 +373,10 @@ def remove_version(input_stream, output_stream):
     :type output_stream: TextIO
     :return:
     '''
-    for line in input_stream.readlines():
-        if line.startswith('#version'):
-            continue
-        output_stream.write(line)
+    GLSLLineTransformer(strip_main=False,
+                        strip_version=True,
+                        strip_vertex_data=False).transform(input_stream,
+                                                           output_stream)
 
 
 def remove_vertex_data(input_stream, output_stream):
@@ -223,15 +387,77 @@ def remove_vertex_data(input_stream, output_stream):
     :type output_stream: TextIO
     :return:
     '''
-    scope_started = False
-    for line in input_stream.readlines():
-        if line.startswith('in VertexData'):
-            scope_started = True
-        if scope_started:
-            if line.startswith('}'):
-                scope_started = False
-            continue
-        output_stream.write(line)
+    GLSLLineTransformer(strip_main=False,
+                        strip_version=False,
+                        strip_vertex_data=True).transform(input_stream,
+                                                          output_stream)
+
+
+class GLSLLineTransformer:
+    '''
+    Strips the main function, the #version directive and the VertexData
+    block and replaces symbols in a single pass over the lines of the
+    generated code. remove_main, remove_version, remove_vertex_data and
+    replace_symbols run one of these passes on its own.
+    All symbols are replaced at once, preferring the longest symbol when
+    several match at the same position
+    '''
+
+    def __init__(self,
+                 symbols_to_replace=None,
+                 strip_main=True,
+                 strip_version=True,
+                 strip_vertex_data=True,
+                 line_hook=None):
+        '''
+        :param symbols_to_replace: dict of symbol to replacement
+        :param strip_main: Drop everything from the main function on
+        :param strip_version: Drop the #version directive
+        :param strip_vertex_data: Drop the VertexData block
+        :param line_hook: Called with every line after the replacements,
+        returns the text to write in its place
+        '''
+        self.symbols_to_replace = dict(symbols_to_replace or {})
+        self.strip_main = strip_main
+        self.strip_version = strip_version
+        self.strip_vertex_data = strip_vertex_data
+        self.line_hook = line_hook
+        self._pattern = None
+        if self.symbols_to_replace:
+            symbols = sorted(self.symbols_to_replace.keys(), key=len,
+                             reverse=True)
+            self._pattern = re.compile('|'.join(re.escape(k)
+                                                for k in symbols))
+
+    def _replace(self, match):
+        return self.symbols_to_replace[match.group(0)]
+
+    def transform(self, input_stream, output_stream):
+        '''
+        :param input_stream:
+        :type input_stream: TextIO
+        :param output_stream:
+        :type output_stream: TextIO
+        :return:
+        '''
+        scope_started = False
+        for line in input_stream:
+            if self.strip_main and line.startswith('void main()'):
+                break
+            if self.strip_version and line.startswith('#version'):
+                continue
+            if self.strip_vertex_data:
+                if line.startswith('in VertexData'):
+                    scope_started = True
+                if scope_started:
+                    if line.startswith('}'):
+                        scope_started = False
+                    continue
+            if self._pattern is not None:
+                line = self._pattern.sub(self._replace, line)
+            if self.line_hook is not None:
+                line = self.line_hook(line)
+            output_stream.write(line)
 
 
 _tab_str = '    '
@@ -10,14 +10,19 @@
 
 import MaterialX as mx
 import MaterialX.PyMaterialXGenShader as mxgen
-import MaterialX.PyMaterialXGenGlsl as mxglslgen
+import hashlib
 import io
+import json
+import os
+import threading
 import xml.etree.ElementTree as ET
 from typing import TextIO
-import shutil
-from substance_codegen.glslgen import load_impl_libraries_rec, get_bound_node_graph_and_def, MTLX2GLSLException, generate_node, \
-    remove_main, remove_version, remove_vertex_data, replace_symbols, call_node_graph, generate_signature, GLSLScope, subtract_prefix, \
+from substance_codegen.exporttargets import export_targets
+from substance_codegen.glslgen import get_bound_node_graph_and_def, MTLX2GLSLException, \
+    GLSLLineTransformer, call_node_graph, generate_signature, GLSLScope, subtract_prefix, \
     get_graph_prefix
+from substance_codegen.shadercache import make_shader_key, write_cached_outputs
+from substance_codegen.templates import load_xml_template, write_pretty_xml
 import logging
 
 logger = logging.getLogger("SDMaterialX")
@@ -29,16 +34,13 @@ class MTLX2GLSLFXException(MTLX2GLSLException):
     pass
 
 
-def _append_designer_entry_point(input_stream,
-                                 output_stream,
+def _append_designer_entry_point(output_stream,
                                  parallax_support,
                                  shader,
                                  root_node_def,
                                  shader_ref,
                                  surface_shader_node_def):
     '''
-    :param input_stream:
-    :type input_stream: TextIO
     :param output_stream:
     :type output_stream: TextIO
     :param parallax_support:
@@ -53,8 +55,6 @@ def _append_designer_entry_point(input_stream,
     :type surface_shader_node_def: mx.NodeDef
     :return:
     '''
-    # First copy the original data to the output so we can append to the end
-    shutil.copyfileobj(input_stream, output_stream)
     generate_signature(output_stream, surface_shader_node_def)
     tab_level = [0]
     with GLSLScope(output_stream, tab_level):
@@ -75,7 +75,6 @@ def _post_process_designer_glsl(input_stream,
                                 root_node_def,
                                 shader_ref,
                                 surface_shader_node_def):
-    import functools
     symbols_to_replace = {
         'vd.texcoord_0': 'iFS_UV',
         'vd.positionObject': 'vec3(inverse(worldMatrix) * vec4(iFS_PointWS, 1.0))',
@@ -87,31 +86,20 @@ def _post_process_designer_glsl(input_stream,
         'vd.tangentWorld': 'iFS_Tangent',
         'vd.bitangentWorld': 'iFS_Binormal'
     }
-    operations = [remove_main,
-                  remove_version,
-                  remove_vertex_data,
-                  functools.partial(replace_symbols,
-                                    symbols_to_replace=symbols_to_replace),
-                  functools.partial(_append_designer_entry_point,
-                                    parallax_support=True,
-                                    shader=shader,
-                                    root_node_def=root_node_def,
-                                    shader_ref=shader_ref,
-                                    surface_shader_node_def=surface_shader_node_def)
-                  ]
-    next_input = input_stream
-    for o in operations:
-        new_output = io.StringIO()
-        o(next_input, new_output)
-        next_input = new_output
-        next_input.seek(0)
-    shutil.copyfileobj(next_input, output_stream)
-
-
-def _append_sampler(sampler_port, node, tree):
+    transformer = GLSLLineTransformer(symbols_to_replace)
+    transformer.transform(input_stream, output_stream)
+    _append_designer_entry_point(output_stream,
+                                 parallax_support=True,
+                                 shader=shader,
+                                 root_node_def=root_node_def,
+                                 shader_ref=shader_ref,
+                                 surface_shader_node_def=surface_shader_node_def)
+
+
+def _append_sampler(sampler_name, node, tree):
     '''
-    :param sampler_port:
-    :type sampler_port: mxgen.ShaderPort
+    :param sampler_name:
+    :type sampler_name: str
     :param node:
     :type node: mx.Element
     :param tree:
@@ -125,37 +113,21 @@ def _append_sampler(sampler_port, node, tree):
     if not root.tag == 'glslfx':
         raise MTLX2GLSLFXException('No glslfx tag found in glslfx document')
     sampler = ET.Element('sampler')
-    sampler.set('name', sampler_port.getName())
+    sampler.set('name', sampler_name)
     sampler.set('usage', usage)
     root.append(sampler)
 
 
-def _remove_whitespace_XML(tree):
-    for elem in tree.getroot().iter('*'):
-        if elem.text is not None:
-            elem.text = elem.text.strip()
-        if elem.tail is not None:
-            elem.tail = elem.tail.strip()
-
-
-def _pretty_write_XML(output_stream, tree):
-    import xml.dom.minidom as minidom
-    _remove_whitespace_XML(tree)
-    unformatted_xml = io.StringIO()
-    tree.write(unformatted_xml, encoding='unicode')
-    unformatted_xml.seek(0)
-    formatted_tree = minidom.parse(unformatted_xml)
-    output_stream.write(formatted_tree.toprettyxml())
-
-
 def _convert_matx_constant_to_glslfx(parameter_string):
     return ';'.join(parameter_string.split(','))
 
 
-def _append_uniform(uniform_port, node, tree, force_constant):
+def _append_uniform(uniform_name, value_string, node, tree, force_constant):
     '''
-    :param uniform_port:
-    :type uniform_port: mxgen.ShaderPort
+    :param uniform_name:
+    :type uniform_name: str
+    :param value_string: MaterialX value string of the default
+    :type value_string: str
     :param node:
     :type node: mx.TypedElement
     :param tree:
@@ -168,7 +140,7 @@ def _append_uniform(uniform_port, node, tree, force_constant):
     if not root.tag == 'glslfx':
         raise MTLX2GLSLFXException('No glslfx tag found in glslfx document')
     uniform = ET.Element('uniform')
-    uniform.set('name', uniform_port.getName())
+    uniform.set('name', uniform_name)
     if node.hasAttribute('uiname'):
         uniform.set('guiName', node.getAttribute('uiname'))
     else:
@@ -181,8 +153,7 @@ def _append_uniform(uniform_port, node, tree, force_constant):
     else:
         uniform.set('guiWidget', 'slider')
 
-    default_constant_value = _convert_matx_constant_to_glslfx(
-        uniform_port.getValue().getValueString())
+    default_constant_value = _convert_matx_constant_to_glslfx(value_string)
     uniform.set('default', default_constant_value)
 
     if force_constant:
@@ -213,32 +184,41 @@ def _append_uniform(uniform_port, node, tree, force_constant):
     root.append(uniform)
 
 
-def _generate_designer_glslfx(output_glslfx_stream,
-                              glslfx_template,
-                              shader_ref,
-                              shader,
-                              doc,
-                              force_constants):
+class _GLSLFXBinding:
+    '''
+    Ties a public uniform of the generated shader to the element it was
+    generated for
+    '''
+    __slots__ = ('kind', 'name', 'element_name', 'value_string')
+    SAMPLER = 'sampler'
+    UNIFORM = 'uniform'
+
+    def __init__(self, kind, name, element_name, value_string=None):
+        self.kind = kind
+        self.name = name
+        self.element_name = element_name
+        self.value_string = value_string
+
+
+def _bindings_to_string(bindings):
+    return json.dumps([[b.kind, b.name, b.element_name, b.value_string]
+                       for b in bindings])
+
+
+def _bindings_from_string(bindings_string):
+    return [_GLSLFXBinding(*b) for b in json.loads(bindings_string)]
+
+
+def _get_designer_glslfx_bindings(shader, node_graph, node_def,
+                                  imp_node_graph):
     '''
-    :param output_glslfx_stream:
-    :type output_glslfx_stream: TextIO
-    :param glslfx_template:
-    :type glslfx_template: str
-    :param shader_ref:
-    :type shader_ref: mx.ShaderRef
     :param shader:
     :type shader: mxgen.Shader
-    :param doc:
-    :type shader: mx.Document
-    :param force_constants: Force constants to have min and max values set to default to trigger a change in designer
-    :type force_constants: bool
-    :return:
+    :return: [_GLSLFXBinding]
     '''
-    tree = ET.parse(glslfx_template)
-    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
-        shader_ref, doc)
     if not shader:
         raise MTLX2GLSLFXException('No shader found when generating GLSLFX')
+    bindings = []
     if node_graph:
         # Generate index of nodes
         graph_prefix = get_graph_prefix(node_graph)
@@ -257,16 +237,260 @@ def _generate_designer_glslfx(output_glslfx_stream,
                 if not node:
                     raise MTLX2GLSLFXException(
                         'Texture sampler not associated with any node: {}'.format(cropped_name))
-                _append_sampler(i, node, tree)
+                bindings.append(_GLSLFXBinding(_GLSLFXBinding.SAMPLER,
+                                               name,
+                                               cropped_name))
             else:
                 separated_name = subtract_prefix(
                     name, graph_prefix)
                 if separated_name not in exposed_nodes:
                     raise MTLX2GLSLFXException(
                         'Exposed parameter not associated with any node: {}'.format(separated_name))
-                _append_uniform(
-                    i, exposed_nodes[separated_name], tree, force_constants)
-    _pretty_write_XML(output_glslfx_stream, tree)
+                bindings.append(_GLSLFXBinding(_GLSLFXBinding.UNIFORM,
+                                               name,
+                                               separated_name,
+                                               i.getValue().getValueString()))
+    return bindings
+
+
+def _generate_designer_glslfx(output_glslfx_stream,
+                              glslfx_template,
+                              bindings,
+                              node_def,
+                              imp_node_graph,
+                              force_constants,
+                              use_current_values=False):
+    '''
+    :param output_glslfx_stream:
+    :type output_glslfx_stream: TextIO
+    :param glslfx_template:
+    :type glslfx_template: str
+    :param bindings: Public uniforms of the shader
+    :type bindings: [_GLSLFXBinding]
+    :param node_def: Node def of the bound graph
+    :type node_def: mx.NodeDef
+    :param imp_node_graph: Implementation of the bound graph
+    :type imp_node_graph: mx.NodeGraph
+    :param force_constants: Force constants to have min and max values set to default to trigger a change in designer
+    :type force_constants: bool
+    :param use_current_values: Take the uniform defaults from node_def rather
+    than from the generated shader
+    :type use_current_values: bool
+    :return:
+    '''
+    tree = load_xml_template(glslfx_template)
+    exposed_nodes = {
+        i.getName(): i for i in node_def.getActiveValueElements()
+    } if node_def else {}
+    for b in bindings:
+        if b.kind == _GLSLFXBinding.SAMPLER:
+            _append_sampler(b.name, imp_node_graph.getNode(b.element_name),
+                            tree)
+        else:
+            exposed_node = exposed_nodes[b.element_name]
+            value_string = b.value_string
+            if use_current_values:
+                value_string = exposed_node.getValueString()
+            _append_uniform(b.name, value_string, exposed_node, tree,
+                            force_constants)
+    write_pretty_xml(output_glslfx_stream, tree)
+
+
+class _DesignerExport:
+    '''
+    What the last export to a GLSLFX file was generated from
+    '''
+
+    def __init__(self, structure_key, output_shader, glsl_digest, bindings):
+        self.structure_key = structure_key
+        self.output_shader = output_shader
+        # Digest of the GLSL written with the GLSLFX file
+        self.glsl_digest = glsl_digest
+        self.bindings = bindings
+
+
+def _digest_glsl(glsl):
+    return hashlib.sha1(glsl.encode('utf-8')).hexdigest()
+
+
+def _read_glsl_digest(output_shader):
+    try:
+        with open(output_shader, 'r') as f:
+            return _digest_glsl(f.read())
+    except OSError:
+        return None
+
+
+# GLSLFX file to the _DesignerExport that wrote it
+_designer_exports = {}
+_designer_exports_lock = threading.Lock()
+
+
+def _remember_designer_export(output_glslfx, export):
+    '''
+    Records what was written to a GLSLFX file, None when the export can't be
+    patched
+    '''
+    with _designer_exports_lock:
+        if export is None:
+            _designer_exports.pop(os.path.abspath(output_glslfx), None)
+        else:
+            _designer_exports[os.path.abspath(output_glslfx)] = export
+
+
+def _patch_designer_glslfx(doc,
+                           structure_key,
+                           output_shader,
+                           output_glslfx,
+                           glslfx_template,
+                           root_material,
+                           force_constants):
+    '''
+    Rewrites the uniforms of the GLSLFX file when only values of the exposed
+    parameters changed since the last export to it. The GLSL is left as is
+    since Designer takes the uniform values from the GLSLFX file
+    :return: True if the file was patched, False if the shader has to be
+    generated
+    '''
+    with _designer_exports_lock:
+        previous = _designer_exports.get(os.path.abspath(output_glslfx))
+    if previous is None or previous.structure_key != structure_key or \
+            previous.output_shader != output_shader:
+        return False
+    # The GLSL file may have been written by another export since
+    if _read_glsl_digest(output_shader) != previous.glsl_digest:
+        return False
+    material = doc.getMaterial(root_material)
+    shader_ref = material.getShaderRefs()[0]
+    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
+        shader_ref, doc)
+    glslfx_stream = io.StringIO()
+    _generate_designer_glslfx(glslfx_stream,
+                              glslfx_template,
+                              previous.bindings,
+                              node_def,
+                              imp_node_graph,
+                              force_constants,
+                              use_current_values=True)
+    write_cached_outputs({'glslfx': glslfx_stream.getvalue()},
+                         {'glslfx': output_glslfx})
+    return True
+
+
+class DesignerTarget:
+    '''
+    Export target writing the GLSL and GLSLFX files for Designer's viewport
+    '''
+
+    def __init__(self,
+                 output_shader,
+                 output_glslfx,
+                 glslfx_template,
+                 force_constants=False,
+                 allow_parameter_fast_path=False):
+        '''
+        :param output_shader:
+        :param output_glslfx:
+        :param glslfx_template:
+        :param force_constants: Force constants to have min and max values set to default to trigger a change in designer
+        :type force_constants: bool
+        :param allow_parameter_fast_path: Only rewrite the uniforms of the
+        GLSLFX file if nothing but the values of exposed parameters changed
+        since the last export to the same files
+        :type allow_parameter_fast_path: bool
+        '''
+        self.output_shader = output_shader
+        self.output_glslfx = output_glslfx
+        self.glslfx_template = glslfx_template
+        self.force_constants = force_constants
+        self.allow_parameter_fast_path = allow_parameter_fast_path
+        # Set if prepare only rewrote the uniforms of the GLSLFX file
+        self.parameters_only = False
+        self._key = None
+        self._structure_key = None
+
+    def _output_files(self):
+        return {'glsl': self.output_shader, 'glslfx': self.output_glslfx}
+
+    def _remember(self, outputs):
+        # Every write to the files replaces what a later parameter only
+        # export could patch
+        export = None
+        if self._structure_key:
+            export = _DesignerExport(
+                self._structure_key,
+                self.output_shader,
+                _digest_glsl(outputs['glsl']),
+                _bindings_from_string(outputs['bindings']))
+        _remember_designer_export(self.output_glslfx, export)
+
+    def prepare(self, doc, session, root_material, cache):
+        '''
+        Writes the outputs if they don't need a generated shader
+        :return: True if the outputs were written
+        '''
+        logger.info('Creating GLSLFX file: %s' % self.output_glslfx)
+        options = {'root_material': root_material,
+                   'matx_doc_paths': session.matx_doc_paths,
+                   'impl_libraries': session.fingerprint}
+        if self.allow_parameter_fast_path:
+            self._structure_key = make_shader_key(
+                doc, 'designer_glsl', options, ignore_interface_values=True,
+                search_paths=session.matx_doc_paths)
+            if _patch_designer_glslfx(doc,
+                                      self._structure_key,
+                                      self.output_shader,
+                                      self.output_glslfx,
+                                      self.glslfx_template,
+                                      root_material,
+                                      self.force_constants):
+                logger.debug('Only updated parameters of %s' % root_material)
+                self.parameters_only = True
+                return True
+        if cache:
+            options['force_constants'] = self.force_constants
+            self._key = make_shader_key(doc, 'designer_glslfx', options,
+                                        [self.glslfx_template],
+                                        search_paths=session.matx_doc_paths)
+            outputs = cache.get(self._key, ['glsl', 'glslfx', 'bindings'])
+            if outputs is not None:
+                logger.debug('Using cached shader for %s' % root_material)
+                write_cached_outputs(outputs, self._output_files())
+                self._remember(outputs)
+                return True
+        return False
+
+    def emit(self, generated, cache):
+        '''
+        Post processes the generated shader into the outputs
+        :type generated: GeneratedShader
+        '''
+        out_glsl_stream = io.StringIO()
+        _post_process_designer_glsl(io.StringIO(generated.glsl),
+                                    out_glsl_stream,
+                                    generated.shader,
+                                    generated.node_def
+                                    if generated.shader else None,
+                                    generated.shader_ref,
+                                    generated.surface_shader_node_def)
+        bindings = _get_designer_glslfx_bindings(generated.shader,
+                                                 generated.node_graph,
+                                                 generated.node_def,
+                                                 generated.imp_node_graph)
+        glslfx_stream = io.StringIO()
+        _generate_designer_glslfx(glslfx_stream,
+                                  self.glslfx_template,
+                                  bindings,
+                                  generated.node_def,
+                                  generated.imp_node_graph,
+                                  self.force_constants)
+        outputs = {'glsl': out_glsl_stream.getvalue(),
+                   'glslfx': glslfx_stream.getvalue(),
+                   'bindings': _bindings_to_string(bindings)}
+        if cache and self._key:
+            cache.put(self._key, outputs)
+        write_cached_outputs(outputs, self._output_files())
+        self._remember(outputs)
 
 
 def mtlx2GLSLFX(doc,
@@ -275,7 +499,9 @@ def mtlx2GLSLFX(doc,
                 glslfx_template,
                 matx_doc_paths,
                 root_material,
-                force_constants=False):
+                force_constants=False,
+                use_cache=True,
+                allow_parameter_fast_path=False):
     '''
 
     :param doc:
@@ -288,82 +514,24 @@ def mtlx2GLSLFX(doc,
     :param root_material:
     :param force_constants: Force constants to have min and max values set to default to trigger a change in designer
     :type force_constants: bool
-    :return:
+    :param use_cache: Reuse the outputs generated before from an identical
+    document with the same options
+    :type use_cache: bool
+    :param allow_parameter_fast_path: Only rewrite the uniforms of the GLSLFX
+    file if nothing but the values of exposed parameters changed since the
+    last export to the same files
+    :type allow_parameter_fast_path: bool
+    :return: True if only the uniforms of the GLSLFX file were rewritten and
+    the GLSL file is unchanged
     '''
-    logger.info('Creating GLSLFX file: %s' % output_glslfx)
-    glsl_gen = mxglslgen.GlslShaderGenerator()
-    language = glsl_gen.getLanguage()
-    color_management = mxgen.DefaultColorManagementSystem.create(language)
-    glsl_gen.setColorManagementSystem(color_management)
-    depend_lib = mx.createDocument()
-
-    # Load dependedent libraries
-    for p in matx_doc_paths:
-        load_impl_libraries_rec(['stdlib', 'pbrlib', 'bxdf'], p, depend_lib)
-
-    color_management.loadLibrary(depend_lib)
-
-    context = mxgen.GenContext(glsl_gen)
-    gen_options = context.getOptions()
-    for p in matx_doc_paths:
-        context.registerSourceCodeSearchPath(p)
-    doc.importLibrary(depend_lib)
-    material = doc.getMaterial(root_material)
-
-    # Questionable to just take the first shader ref
-    shader_ref = material.getShaderRefs()[0]
-    surface_shader_node_def = shader_ref.getNodeDef()
-    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
-        shader_ref, doc)
-
-    with open(output_shader, 'w') as out_glsl_file:
-        if node_graph:
-            # This path is for when there is a graph connected to the
-            # shader ref
-            if not node_def:
-                raise MTLX2GLSLFXException(
-                    'Failed to find node def for graph to generate')
-            node_name = node_def.getNodeString()
-            target_node = node_graph.getOutputs()[0]
-            name_path = node_def.getNamePath()
-            # skipping path replacement for now
-
-            element_name = mx.createValidName(name_path)
-            glsl_stream = io.StringIO()
-            shader = generate_node(element_name,
-                                   glsl_gen,
-                                   node_def,
-                                   context,
-                                   target_node,
-                                   glsl_stream)
-            glsl_stream.seek(0)
-            _post_process_designer_glsl(glsl_stream,
-                                        out_glsl_file,
-                                        shader,
-                                        node_def,
-                                        shader_ref,
-                                        surface_shader_node_def)
-
-            with open(output_glslfx, 'w') as glslfx_stream:
-                _generate_designer_glslfx(glslfx_stream,
-                                          glslfx_template,
-                                          shader_ref,
-                                          shader,
-                                          doc,
-                                          force_constants)
-        else:
-            # No inputs bound
-            glsl_stream = io.StringIO()
-            _post_process_designer_glsl(glsl_stream,
-                                        out_glsl_file,
-                                        None,
-                                        None,
-                                        shader_ref,
-                                        surface_shader_node_def)
-            with open(output_glslfx, 'w') as glslfx_stream:
-                _generate_designer_glslfx(glslfx_stream,
-                                          glslfx_template,
-                                          shader_ref,
-                                          None,
-                                          doc,
-                                          force_constants)
+    target = DesignerTarget(output_shader,
+                            output_glslfx,
+                            glslfx_template,
+                            force_constants,
+                            allow_parameter_fast_path)
+    export_targets(doc,
+                   [target],
+                   matx_doc_paths,
+                   root_material,
+                   use_cache)
+    return target.parameters_only
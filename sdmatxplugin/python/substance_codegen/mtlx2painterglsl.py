@@ -10,12 +10,13 @@
 
 import MaterialX as mx
 import MaterialX.PyMaterialXGenShader as mxgen
-import MaterialX.PyMaterialXGenGlsl as mxglslgen
 import io
 import os
-import shutil
-from substance_codegen.glslgen import load_impl_libraries_rec, get_bound_node_graph_and_def, MTLX2GLSLException, generate_node, \
-    remove_main, remove_version, remove_vertex_data, replace_symbols, call_node_graph, GLSLScope, get_graph_prefix, subtract_prefix
+from substance_codegen.exporttargets import export_targets
+from substance_codegen.glslgen import get_bound_node_graph_and_def, MTLX2GLSLException, \
+    GLSLLineTransformer, call_node_graph, GLSLScope, get_graph_prefix, subtract_prefix
+from substance_codegen.shadercache import make_shader_key, write_cached_outputs
+from substance_codegen.templates import load_text_template
 import logging
 
 logger = logging.getLogger("SDMaterialX")
@@ -81,13 +82,7 @@ _usage_mapping = {
 }
 
 
-def _rename_painter_samplers(input_stream,
-                             output_stream,
-                             shader_ref,
-                             shader,
-                             mtlx_doc):
-    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
-        shader_ref, mtlx_doc)
+def _get_painter_sampler_symbols(shader, imp_node_graph):
     all_samplers = _find_all_samplers(shader, imp_node_graph)
     symbols_to_replace = {}
     for node, usage in all_samplers:
@@ -95,7 +90,7 @@ def _rename_painter_samplers(input_stream,
         if sampler:
             symbols_to_replace["sampler2D " + node] = "SamplerSparse " + node
             symbols_to_replace["(" + node] = "(" + node + ".tex"
-    replace_symbols(input_stream, output_stream, symbols_to_replace)
+    return symbols_to_replace
 
 
 def _get_painter_sampler_name(usage):
@@ -148,29 +143,14 @@ def _get_painter_metadata_line(line, shader, node_graph, prefix):
         return result + '}'
 
 
-def _append_painter_uniform_metadata(input_stream,
-                                     output_stream,
-                                     shader_ref,
-                                     shader,
-                                     mtlx_doc):
-    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
-        shader_ref, mtlx_doc)
-    for line in input_stream.readlines():
-        if line.startswith('uniform '):
-            metadata_line = _get_painter_metadata_line(
-                line, shader, imp_node_graph, get_graph_prefix(node_graph)) + '\n'
-            output_stream.write(metadata_line)
-        output_stream.write(line)
+def _add_painter_uniform_metadata(line, shader, node_graph, imp_node_graph):
+    if line.startswith('uniform '):
+        return _get_painter_metadata_line(
+            line, shader, imp_node_graph, get_graph_prefix(node_graph)) + '\n' + line
+    return line
 
 
-def _append_painter_entry_point(input_stream,
-                                output_stream,
-                                parallax_support,
-                                shader,
-                                root_node_def,
-                                shader_ref,
-                                surface_shader_node_def,
-                                painter_template_directory):
+def _write_painter_header(output_stream):
     # TODO: Split out strings as data
     output_stream.writelines(l + '\n' for l in [
         'import lib-sampler.glsl',
@@ -181,7 +161,15 @@ def _append_painter_entry_point(input_stream,
         '//: param auto scene_original_radius',
         'uniform float scene_original_radius;',
     ])
-    shutil.copyfileobj(input_stream, output_stream)
+
+
+def _append_painter_entry_point(output_stream,
+                                parallax_support,
+                                shader,
+                                root_node_def,
+                                shader_ref,
+                                surface_shader_node_def,
+                                painter_template_directory):
     output_stream.write('void shade(V2F inputs)\n')
     tab_level = [0]
     with GLSLScope(output_stream, tab_level):
@@ -193,8 +181,7 @@ def _append_painter_entry_point(input_stream,
         if not os.path.isfile(template_file_path):
             raise MTLXPainterGLSLException(
                 'Can\'t find template for surface shader: {}, explected {}'.format(node_string, template_file_path))
-        with open(template_file_path, 'r') as template_file:
-            shutil.copyfileobj(template_file, output_stream)
+        output_stream.write(load_text_template(template_file_path))
 
 
 def _post_process_painter_glsl(input_stream,
@@ -205,7 +192,6 @@ def _post_process_painter_glsl(input_stream,
                                surface_shader_node_def,
                                mtlx_doc,
                                painter_template_directory):
-    import functools
     symbols_to_replace = {
         'vd.texcoord_0': 'var_tex_coord0',
         # transform
@@ -218,41 +204,92 @@ def _post_process_painter_glsl(input_stream,
         'vd.tangentWorld': 'var_tangent',
         'vd.bitangentWorld': 'var_bitangent'
     }
-    operations = [remove_main,
-                  remove_version,
-                  remove_vertex_data,
-                  functools.partial(replace_symbols,
-                                    symbols_to_replace=symbols_to_replace),
-                  functools.partial(_rename_painter_samplers,
-                                    shader_ref=shader_ref,
-                                    shader=shader,
-                                    mtlx_doc=mtlx_doc),
-                  functools.partial(_append_painter_uniform_metadata,
-                                    shader_ref=shader_ref,
-                                    shader=shader,
-                                    mtlx_doc=mtlx_doc),
-                  functools.partial(_append_painter_entry_point,
-                                    parallax_support=True,
-                                    shader=shader,
-                                    root_node_def=root_node_def,
-                                    shader_ref=shader_ref,
-                                    surface_shader_node_def=surface_shader_node_def,
-                                    painter_template_directory=painter_template_directory)
-                  ]
-    next_input = input_stream
-    for o in operations:
-        new_output = io.StringIO()
-        o(next_input, new_output)
-        next_input = new_output
-        next_input.seek(0)
-    shutil.copyfileobj(next_input, output_stream)
+    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
+        shader_ref, mtlx_doc)
+    symbols_to_replace.update(
+        _get_painter_sampler_symbols(shader, imp_node_graph))
+    transformer = GLSLLineTransformer(
+        symbols_to_replace,
+        line_hook=lambda line: _add_painter_uniform_metadata(
+            line, shader, node_graph, imp_node_graph))
+    _write_painter_header(output_stream)
+    transformer.transform(input_stream, output_stream)
+    _append_painter_entry_point(output_stream,
+                                parallax_support=True,
+                                shader=shader,
+                                root_node_def=root_node_def,
+                                shader_ref=shader_ref,
+                                surface_shader_node_def=surface_shader_node_def,
+                                painter_template_directory=painter_template_directory)
+
+
+def _get_painter_template_files(painter_template_directory):
+    if not os.path.isdir(painter_template_directory):
+        return []
+    return [os.path.join(painter_template_directory, f)
+            for f in sorted(os.listdir(painter_template_directory))
+            if f.endswith('_template.glsl')]
+
+
+class PainterTarget:
+    '''
+    Export target writing a Painter shader
+    '''
+
+    def __init__(self, output_glsl, painter_template_directory):
+        self.output_glsl = output_glsl
+        self.painter_template_directory = painter_template_directory
+        self._key = None
+
+    def prepare(self, doc, session, root_material, cache):
+        '''
+        Writes the output if it doesn't need a generated shader
+        :return: True if the output was written
+        '''
+        logger.info('Creating Python GLSL file: %s' % self.output_glsl)
+        if cache:
+            self._key = make_shader_key(
+                doc,
+                'painter_glsl',
+                {'root_material': root_material,
+                 'matx_doc_paths': session.matx_doc_paths,
+                 'impl_libraries': session.fingerprint},
+                _get_painter_template_files(self.painter_template_directory),
+                search_paths=session.matx_doc_paths)
+            outputs = cache.get(self._key, ['glsl'])
+            if outputs is not None:
+                logger.debug('Using cached shader for %s' % root_material)
+                write_cached_outputs(outputs, {'glsl': self.output_glsl})
+                return True
+        return False
+
+    def emit(self, generated, cache):
+        '''
+        Post processes the generated shader into the output
+        :type generated: GeneratedShader
+        '''
+        out_glsl_stream = io.StringIO()
+        _post_process_painter_glsl(io.StringIO(generated.glsl),
+                                   out_glsl_stream,
+                                   generated.shader,
+                                   generated.node_def
+                                   if generated.shader else None,
+                                   generated.shader_ref,
+                                   generated.surface_shader_node_def,
+                                   generated.doc,
+                                   self.painter_template_directory)
+        outputs = {'glsl': out_glsl_stream.getvalue()}
+        if cache and self._key:
+            cache.put(self._key, outputs)
+        write_cached_outputs(outputs, {'glsl': self.output_glsl})
 
 
 def mtlx2PainterGLSL(doc,
                      output_glsl,
                      matx_doc_paths,
                      root_material,
-                     painter_template_directory):
+                     painter_template_directory,
+                     use_cache=True):
     '''
 
     :param doc:
@@ -262,71 +299,13 @@ def mtlx2PainterGLSL(doc,
     :param matx_doc_paths: List of paths the materialx tool should look in
     for definition documents
     :param root_material:
+    :param use_cache: Reuse the output generated before from an identical
+    document with the same options
+    :type use_cache: bool
     :return:
     '''
-    logger.info('Creating Python GLSL file: %s' % output_glsl)
-    glsl_gen = mxglslgen.GlslShaderGenerator()
-    language = glsl_gen.getLanguage()
-    color_management = mxgen.DefaultColorManagementSystem.create(language)
-    glsl_gen.setColorManagementSystem(color_management)
-    depend_lib = mx.createDocument()
-
-    # Load dependedent libraries
-    for p in matx_doc_paths:
-        load_impl_libraries_rec(['stdlib', 'pbrlib', 'bxdf'], p, depend_lib)
-
-    color_management.loadLibrary(depend_lib)
-
-    context = mxgen.GenContext(glsl_gen)
-    gen_options = context.getOptions()
-    for p in matx_doc_paths:
-        context.registerSourceCodeSearchPath(p)
-    doc.importLibrary(depend_lib)
-    material = doc.getMaterial(root_material)
-
-    # Questionable to just take the first shader ref
-    shader_ref = material.getShaderRefs()[0]
-    surface_shader_node_def = shader_ref.getNodeDef()
-    node_graph, node_def, imp_node_graph = get_bound_node_graph_and_def(
-        shader_ref, doc)
-    with open(output_glsl, 'w') as out_glsl_file:
-        if node_graph:
-            # This path is for when there is a graph connected to the
-            # shader ref
-            # node_def = node_graph.getNodeDef()
-            if not node_def:
-                raise MTLXPainterGLSLException(
-                    'Failed to find node def for graph to generate')
-            node_name = node_def.getNodeString()
-            target_node = node_graph.getOutputs()[0]
-            name_path = node_def.getNamePath()
-            # skipping path replacement for now
-
-            element_name = mx.createValidName(name_path)
-            glsl_stream = io.StringIO()
-            shader = generate_node(element_name,
-                                   glsl_gen,
-                                   node_def,
-                                   context,
-                                   target_node,
-                                   glsl_stream)
-            glsl_stream.seek(0)
-            _post_process_painter_glsl(glsl_stream,
-                                       out_glsl_file,
-                                       shader,
-                                       node_def,
-                                       shader_ref,
-                                       surface_shader_node_def,
-                                       doc,
-                                       painter_template_directory)
-
-        else:
-            # No inputs bound
-            glsl_stream = io.StringIO()
-            _post_process_painter_glsl(glsl_stream,
-                                       out_glsl_file,
-                                       None,
-                                       None,
-                                       shader_ref,
-                                       surface_shader_node_def,
-                                       doc)
+    export_targets(doc,
+                   [PainterTarget(output_glsl, painter_template_directory)],
+                   matx_doc_paths,
+                   root_material,
+                   use_cache)
@@ -0,0 +1,337 @@
+# Copyright 2020 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+
+# Cache of generated shaders keyed by the content of the MaterialX document
+# they were generated from so switching back to a material doesn't run the
+# generator again
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+import logging
+
+logger = logging.getLogger("SDMaterialX")
+
+# Bump when the generated output changes for the same input
+SHADER_CACHE_VERSION = 2
+DEFAULT_MAX_MEMORY_ENTRIES = 32
+DEFAULT_MAX_DISK_ENTRIES = 256
+# Attributes of exposed parameters that only end up in the uniform defaults
+# and ui hints rather than in the generated code
+INTERFACE_VALUE_ATTRIBUTES = frozenset(['value', 'uiname', 'uifolder',
+                                        'uimin', 'uimax',
+                                        'uisoftmin', 'uisoftmax'])
+
+
+def _update_string(hasher, s):
+    # Length prefixed so concatenations can't collide
+    data = s.encode('utf-8')
+    hasher.update(str(len(data)).encode('utf-8'))
+    hasher.update(b':')
+    hasher.update(data)
+
+
+def _hash_file_stat(hasher, file_path):
+    _update_string(hasher, file_path)
+    if os.path.isfile(file_path):
+        st = os.stat(file_path)
+        _update_string(hasher, '{}:{}'.format(st.st_mtime_ns, st.st_size))
+
+
+def _resolve_source_uri(uri, search_paths):
+    '''
+    Finds the file a source uri was read from. Libraries are read through
+    the search path so their uris are usually relative to one of its paths
+    :return: The path of the file or uri if it isn't found
+    '''
+    if os.path.isabs(uri):
+        return uri
+    for search_path in search_paths:
+        file_path = os.path.join(search_path, uri)
+        if os.path.isfile(file_path):
+            return file_path
+    return uri
+
+
+def _is_library_element(element, document_uri):
+    return element.hasSourceUri() and \
+        element.getSourceUri() != document_uri
+
+
+def _is_interface_value(element, parent_category):
+    return parent_category == 'nodedef' and \
+        element.getCategory() in {'input', 'parameter'} and \
+        element.getAttribute('type') != 'filename'
+
+
+def _hash_element(hasher, element, document_uri, library_uris,
+                  ignore_interface_values, parent_category=''):
+    '''
+    Hashes an element and its children with attributes and children sorted
+    so the result doesn't depend on the order they were added in
+    '''
+    category = element.getCategory()
+    _update_string(hasher, category)
+    _update_string(hasher, element.getName())
+    attribute_names = sorted(element.getAttributeNames())
+    if ignore_interface_values and \
+            _is_interface_value(element, parent_category):
+        attribute_names = [a for a in attribute_names
+                           if a not in INTERFACE_VALUE_ATTRIBUTES]
+    hasher.update(str(len(attribute_names)).encode('utf-8'))
+    for name in attribute_names:
+        _update_string(hasher, name)
+        _update_string(hasher, element.getAttribute(name))
+    children = []
+    for child in element.getChildren():
+        if _is_library_element(child, document_uri):
+            # Identified by the file they come from rather than the content
+            library_uris.add(child.getSourceUri())
+        else:
+            children.append(child)
+    children.sort(key=lambda c: (c.getCategory(), c.getName()))
+    hasher.update(str(len(children)).encode('utf-8'))
+    for child in children:
+        _hash_element(hasher, child, document_uri, library_uris,
+                      ignore_interface_values, category)
+
+
+def hash_document(doc, hasher, ignore_interface_values=False,
+                  search_paths=()):
+    '''
+    Hashes a MaterialX document independently of the order of its elements
+    and attributes. Elements imported from libraries are hashed by the path
+    and modification time of the file they were read from.
+    :param doc: The document to hash
+    :type doc: mx.Document
+    :param hasher: hashlib hash object to update
+    :param ignore_interface_values: Leave out the values and ui hints of the
+    exposed parameters of node defs so documents only differing in those
+    hash the same
+    :type ignore_interface_values: bool
+    :param search_paths: Paths relative library uris are resolved in, in
+    the order MaterialX searches them
+    :type search_paths: [str]
+    '''
+    document_uri = doc.getSourceUri() if doc.hasSourceUri() else ''
+    library_uris = set()
+    _hash_element(hasher, doc, document_uri, library_uris,
+                  ignore_interface_values)
+    for uri in sorted(library_uris):
+        _update_string(hasher, uri)
+        _hash_file_stat(hasher, _resolve_source_uri(uri, search_paths))
+
+
+def hash_files(hasher, file_paths):
+    '''
+    Hashes files by path, modification time and size
+    '''
+    for file_path in file_paths:
+        _hash_file_stat(hasher, file_path)
+
+
+def make_shader_key(doc, generator_name, options, file_dependencies=(),
+                    ignore_interface_values=False, search_paths=()):
+    '''
+    Creates the cache key for a shader generated from doc
+    :param doc: The document the shader is generated from
+    :type doc: mx.Document
+    :param generator_name: Name identifying the kind of shader generated
+    :type generator_name: str
+    :param options: Options affecting the generated output
+    :type options: dict
+    :param file_dependencies: Files read by the generator, like templates
+    :type file_dependencies: [str]
+    :param ignore_interface_values: See hash_document
+    :type ignore_interface_values: bool
+    :param search_paths: See hash_document
+    :type search_paths: [str]
+    :return: str
+    '''
+    hasher = hashlib.sha1()
+    _update_string(hasher, '{}:{}'.format(SHADER_CACHE_VERSION,
+                                          generator_name))
+    for name in sorted(options.keys()):
+        _update_string(hasher, name)
+        _update_string(hasher, repr(options[name]))
+    hash_files(hasher, file_dependencies)
+    hash_document(doc, hasher, ignore_interface_values, search_paths)
+    return hasher.hexdigest()
+
+
+class ShaderCache:
+    '''
+    Maps keys to the generated output files, keeping the most recently used
+    entries in memory and on disk.
+    Outputs are dicts of output name to file content.
+    '''
+
+    def __init__(self, directory=None,
+                 max_memory_entries=DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        '''
+        :param directory: Directory to store entries in, memory only if None
+        :type directory: str
+        :param max_memory_entries: Number of entries to keep in memory
+        :type max_memory_entries: int
+        :param max_disk_entries: Number of entries to keep on disk
+        :type max_disk_entries: int
+        '''
+        self.directory = directory
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry_directory(self, key):
+        return os.path.join(self.directory, key)
+
+    def _remember(self, key, outputs):
+        with self._lock:
+            self._entries[key] = outputs
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_memory_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key, output_names):
+        entry_directory = self._entry_directory(key)
+        outputs = {}
+        try:
+            for name in output_names:
+                with open(os.path.join(entry_directory, name), 'r') as f:
+                    outputs[name] = f.read()
+        except OSError:
+            return None
+        return outputs
+
+    def _touch(self, key):
+        # The modification time of an entry tells when it was last used
+        try:
+            os.utime(self._entry_directory(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        '''
+        Removes the least recently used entries on disk past max_disk_entries
+        '''
+        entries = []
+        try:
+            for name in os.listdir(self.directory):
+                entry_directory = os.path.join(self.directory, name)
+                if os.path.isdir(entry_directory):
+                    entries.append((os.stat(entry_directory).st_mtime,
+                                    entry_directory))
+        except OSError:
+            return
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort()
+        for mtime, entry_directory in \
+                entries[:len(entries) - self.max_disk_entries]:
+            shutil.rmtree(entry_directory, ignore_errors=True)
+
+    def _store(self, key, outputs):
+        entry_directory = self._entry_directory(key)
+        try:
+            if not os.path.isdir(entry_directory):
+                os.makedirs(entry_directory)
+            for name, content in outputs.items():
+                target = os.path.join(entry_directory, name)
+                # Written next to the target and moved in place so readers
+                # never see a partial file
+                temp_file = '{}.{}.tmp'.format(target, threading.get_ident())
+                with open(temp_file, 'w') as f:
+                    f.write(content)
+                os.replace(temp_file, target)
+            self._touch(key)
+        except OSError as e:
+            logger.warning('Failed storing shader cache entry {}: {}'.format(
+                key, str(e)))
+        self._evict()
+
+    def get(self, key, output_names):
+        '''
+        :param key: Key created with make_shader_key
+        :param output_names: Outputs the entry is expected to have
+        :return: dict of output name to content or None on a miss
+        '''
+        with self._lock:
+            outputs = self._entries.get(key)
+            if outputs is not None:
+                self._entries.move_to_end(key)
+        if outputs is None and self.directory:
+            outputs = self._load(key, output_names)
+            if outputs is not None:
+                self._remember(key, outputs)
+        if outputs is None or any(n not in outputs for n in output_names):
+            return None
+        if self.directory:
+            self._touch(key)
+        return outputs
+
+    def put(self, key, outputs):
+        '''
+        :param key: Key created with make_shader_key
+        :param outputs: dict of output name to content
+        '''
+        self._remember(key, dict(outputs))
+        if self.directory:
+            self._store(key, outputs)
+
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_shader_cache = None
+_shader_cache_lock = threading.Lock()
+
+
+def get_default_shader_cache_directory():
+    return os.path.join(tempfile.gettempdir(), 'substance_codegen_shader_cache')
+
+
+def get_shader_cache():
+    '''
+    Returns the shader cache shared by the generators, stored in the system
+    temp directory unless set_shader_cache_directory was called
+    :return: ShaderCache
+    '''
+    global _shader_cache
+    with _shader_cache_lock:
+        if _shader_cache is None:
+            _shader_cache = ShaderCache(get_default_shader_cache_directory())
+        return _shader_cache
+
+
+def set_shader_cache_directory(directory):
+    '''
+    Replaces the shared shader cache with one stored in directory
+    :param directory: Directory to store entries in, memory only if None
+    :type directory: str
+    '''
+    global _shader_cache
+    with _shader_cache_lock:
+        _shader_cache = ShaderCache(directory)
+
+
+def write_cached_outputs(outputs, output_files):
+    '''
+    Writes cached outputs to their target files
+    :param outputs: dict of output name to content
+    :param output_files: dict of output name to the file to write
+    '''
+    for name, file_path in output_files.items():
+        with open(file_path, 'w') as f:
+            f.write(outputs[name])
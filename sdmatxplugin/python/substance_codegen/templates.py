@@ -0,0 +1,131 @@
+# Copyright 2020 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+
+# Templates the shaders are generated from, read once and reused until the
+# files change
+import os
+import threading
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+_XML_HEADER = '<?xml version="1.0" ?>\n'
+_ATTRIBUTE_ENTITIES = {'"': '&quot;'}
+
+# Template path to a tuple of the file stat and the parsed content
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def _file_signature(file_path):
+    st = os.stat(file_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_cached(file_path, load_function):
+    signature = _file_signature(file_path)
+    key = (os.path.abspath(file_path), load_function)
+    with _templates_lock:
+        cached = _templates.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    content = load_function(file_path)
+    with _templates_lock:
+        _templates[key] = (signature, content)
+    return content
+
+
+def _parse_xml(file_path):
+    root = ET.parse(file_path).getroot()
+    # Whitespace is dropped since the output is indented when written
+    for elem in root.iter('*'):
+        if elem.text is not None:
+            elem.text = elem.text.strip()
+        if elem.tail is not None:
+            elem.tail = elem.tail.strip()
+    return root
+
+
+def _read_text(file_path):
+    with open(file_path, 'r') as f:
+        return f.read()
+
+
+def _clone_element(element):
+    clone = ET.Element(element.tag, dict(element.attrib))
+    clone.text = element.text
+    clone.tail = element.tail
+    clone.extend(_clone_element(child) for child in element)
+    return clone
+
+
+def load_xml_template(file_path):
+    '''
+    Returns a copy of the parsed XML template that can be modified freely.
+    The file is only parsed again when it changes
+    :param file_path: The template to load
+    :type file_path: str
+    :return: xml.etree.ElementTree.ElementTree
+    '''
+    return ET.ElementTree(_clone_element(_load_cached(file_path, _parse_xml)))
+
+
+def load_text_template(file_path):
+    '''
+    Returns the content of a text template. The file is only read again when
+    it changes
+    :param file_path: The template to load
+    :type file_path: str
+    :return: str
+    '''
+    return _load_cached(file_path, _read_text)
+
+
+def clear_templates():
+    with _templates_lock:
+        _templates.clear()
+
+
+def _write_element(output_stream, element, indent, level):
+    prefix = indent * level
+    output_stream.write('{}<{}'.format(prefix, element.tag))
+    for name, value in element.attrib.items():
+        output_stream.write(' {}="{}"'.format(
+            name, escape(value, _ATTRIBUTE_ENTITIES)))
+    children = list(element)
+    text = element.text
+    if not children and not text:
+        output_stream.write('/>\n')
+    elif not children:
+        output_stream.write('>{}</{}>\n'.format(escape(text), element.tag))
+    else:
+        output_stream.write('>\n')
+        if text:
+            output_stream.write('{}{}{}\n'.format(prefix, indent,
+                                                  escape(text)))
+        for child in children:
+            _write_element(output_stream, child, indent, level + 1)
+            if child.tail:
+                output_stream.write('{}{}{}\n'.format(prefix, indent,
+                                                      escape(child.tail)))
+        output_stream.write('{}</{}>\n'.format(prefix, element.tag))
+
+
+def write_pretty_xml(output_stream, tree, indent='\t'):
+    '''
+    Writes an XML tree with one element per line indented by depth
+    :param output_stream:
+    :type output_stream: TextIO
+    :param tree:
+    :type tree: xml.etree.ElementTree.ElementTree
+    :param indent: String to indent each level with
+    :type indent: str
+    '''
+    output_stream.write(_XML_HEADER)
+    _write_element(output_stream, tree.getroot(), indent, 0)
@@ -0,0 +1,22 @@
+#Copyright 2020 Adobe. All rights reserved.
+#This file is licensed to you under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License. You may obtain a copy
+#of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software distributed under
+#the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+#OF ANY KIND, either express or implied. See the License for the specific language
+#governing permissions and limitations under the License.
+
+# Makes the plugin modules and MaterialX importable the same way the plugin
+# does. Tests needing MaterialX are skipped when it can't be loaded
+import os
+import sys
+
+_python_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_materialx_dir = os.path.join(_python_dir, '..', 'MaterialX', 'python')
+if not os.path.isdir(_materialx_dir) and os.getenv('MATERIALX_ROOT'):
+    _materialx_dir = os.path.join(os.getenv('MATERIALX_ROOT'), 'python')
+
+sys.path.insert(0, _python_dir)
+sys.path.append(os.path.abspath(_materialx_dir))
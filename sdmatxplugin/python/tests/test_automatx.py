@@ -0,0 +1,63 @@
+#Copyright 2020 Adobe. All rights reserved.
+#This file is licensed to you under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License. You may obtain a copy
+#of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software distributed under
+#the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+#OF ANY KIND, either express or implied. See the License for the specific language
+#governing permissions and limitations under the License.
+
+import os
+
+import pytest
+
+mx = pytest.importorskip('MaterialX')
+ax = pytest.importorskip('automatx')
+
+STDLIB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
+                                           '..', 'MaterialX', 'libraries',
+                                           'stdlib'))
+
+
+@pytest.fixture(scope='module')
+def lib():
+    std_lib = mx.createDocument()
+    mx.readFromXmlFile(std_lib, filename='stdlib_defs.mtlx',
+                       searchPath=STDLIB_PATH)
+    return ax.Library(std_lib, hashConsing=True)
+
+
+def _makeGraph():
+    doc = mx.createDocument()
+    return doc.addNodeGraph('test_graph')
+
+
+def test_operators_fold_into_constant(lib):
+    graph = _makeGraph()
+    result = (lib.constant(graph, value=1.0) + 2.0) * 3.0
+    assert result.node.getCategory() == 'constant'
+    assert result.node.getParameterValue('value') == 9.0
+    categories = set(n.getCategory() for n in graph.getNodes())
+    assert categories == {'constant'}
+
+
+def test_edited_constant_is_not_folded_with_stale_value(lib):
+    graph = _makeGraph()
+    a = lib.constant(graph, value=1.0)
+    a.node.setParameterValue('value', 5.0)
+    result = a + 2.0
+    assert result.node.getParameterValue('value') == 7.0
+
+
+def test_nodes_shared_per_document(lib):
+    first = _makeGraph()
+    second = _makeGraph()
+    a = lib.constant(first, value=1.0)
+    # Same graph and node name in another document
+    other = second.addNode('constant', a.node.getName(), 'float')
+    other.setParameterValue('value', 4.0)
+    b = lib.constant(second, value=1.0)
+    assert b.node.getName() != other.getName()
+    assert b.node.getParameterValue('value') == 1.0
+    assert lib.constant(first, value=1.0).node.getName() == a.node.getName()
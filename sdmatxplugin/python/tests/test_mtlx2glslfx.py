@@ -0,0 +1,102 @@
+#Copyright 2020 Adobe. All rights reserved.
+#This file is licensed to you under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License. You may obtain a copy
+#of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+#Unless required by applicable law or agreed to in writing, software distributed under
+#the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+#OF ANY KIND, either express or implied. See the License for the specific language
+#governing permissions and limitations under the License.
+
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+mx = pytest.importorskip('MaterialX')
+mtlx2glslfx = pytest.importorskip('substance_codegen.mtlx2glslfx')
+
+ROOT_MATERIAL = 'test_material'
+STRUCTURE_KEY = 'structure'
+
+
+def _makeDocument(roughness):
+    doc = mx.createDocument()
+    node_def = doc.addNodeDef('ND_test_graph', 'float', 'test_graph')
+    parameter = node_def.addParameter('roughness', 'float')
+    parameter.setValue(roughness)
+    parameter.setAttribute('uimin', '0.0')
+    parameter.setAttribute('uisoftmin', '0.0')
+    parameter.setAttribute('uimax', '1.0')
+    parameter.setAttribute('uisoftmax', '1.0')
+    imp_graph = doc.addNodeGraph('NG_test_graph')
+    imp_graph.setNodeDefString(node_def.getName())
+    imp_graph.addOutput('out', 'float')
+    bind_graph = doc.addNodeGraph('test_bind_graph')
+    node = bind_graph.addNode('test_graph', 'test_graph_instance', 'float')
+    bind_graph.addOutput('out', 'float').setConnectedNode(node)
+    material = doc.addMaterial(ROOT_MATERIAL)
+    shader_ref = material.addShaderRef('test_shader_ref', 'test_graph')
+    bind_input = shader_ref.addBindInput('base', 'float')
+    bind_input.setNodeGraphString(bind_graph.getName())
+    bind_input.setOutputString('out')
+    return doc
+
+
+def _export(tmpdir, glsl):
+    output_shader = str(tmpdir.join('test.glsl'))
+    output_glslfx = str(tmpdir.join('test.glslfx'))
+    glslfx_template = str(tmpdir.join('template.glslfx'))
+    with open(glslfx_template, 'w') as f:
+        f.write('<glslfx version="1.0.0"/>\n')
+    with open(output_shader, 'w') as f:
+        f.write(glsl)
+    bindings = [mtlx2glslfx._GLSLFXBinding(mtlx2glslfx._GLSLFXBinding.UNIFORM,
+                                           'u_roughness',
+                                           'roughness',
+                                           '0.5')]
+    mtlx2glslfx._remember_designer_export(
+        output_glslfx,
+        mtlx2glslfx._DesignerExport(STRUCTURE_KEY,
+                                    output_shader,
+                                    mtlx2glslfx._digest_glsl(glsl),
+                                    bindings))
+    return output_shader, output_glslfx, glslfx_template
+
+
+def _uniformDefaults(glslfx_file):
+    root = ET.parse(glslfx_file).getroot()
+    return {u.get('name'): u.get('default') for u in root.iter('uniform')}
+
+
+@pytest.mark.parametrize('roughness,expected', [(0.0, '0'), (0.25, '0.25')])
+def test_patch_writes_current_values(tmpdir, roughness, expected):
+    output_shader, output_glslfx, glslfx_template = _export(tmpdir,
+                                                            'void main(){}')
+    doc = _makeDocument(roughness)
+    assert mtlx2glslfx._patch_designer_glslfx(doc,
+                                              STRUCTURE_KEY,
+                                              output_shader,
+                                              output_glslfx,
+                                              glslfx_template,
+                                              ROOT_MATERIAL,
+                                              False)
+    default = _uniformDefaults(output_glslfx)['u_roughness']
+    assert default == doc.getNodeDef('ND_test_graph').getParameter(
+        'roughness').getValueString()
+    assert float(default) == float(expected)
+
+
+def test_patch_skipped_when_glsl_was_replaced(tmpdir):
+    output_shader, output_glslfx, glslfx_template = _export(tmpdir,
+                                                            'void main(){}')
+    with open(output_shader, 'w') as f:
+        f.write('void main(){ /* another material */ }')
+    assert not mtlx2glslfx._patch_designer_glslfx(_makeDocument(0.5),
+                                                  STRUCTURE_KEY,
+                                                  output_shader,
+                                                  output_glslfx,
+                                                  glslfx_template,
+                                                  ROOT_MATERIAL,
+                                                  False)
+    assert not os.path.isfile(output_glslfx)